@@ -15,11 +15,34 @@ class Action(ABC):
     Base class of action.
     """
 
+    # bytes of the load file sent by the last run, for throughput results
+    size = None
+    # seconds of the last run spent in T=0 GET RESPONSE exchanges
+    overhead = 0.0
+    # time of each exchange of the last run
+    hops = ()
+
     @abstractmethod
     def run(self, ctx: Context) -> float:
         pass
 
 
+def _log_load(stats):
+    log.debug(f"{stats}: {stats.throughput / 1024:.02f} KB/s, slowest block "
+              f"{max(stats.times) * 1000:.02f} ms")
+
+
+def _security_domain(ctx):
+    """
+    Security domain of `ctx` with its secure channel open, so the time of an
+    action does not depend on whether the channel is reused.
+    """
+    sd = ctx.security_domain
+    if not sd.is_prepared():
+        sd.prepare()
+    return sd
+
+
 class LoadAndInstall(Action):
     def __init__(self, json_file, cap_file):
         if Path(cap_file).is_absolute():
@@ -29,19 +52,28 @@ class LoadAndInstall(Action):
 
     def run(self, ctx: Context) -> float:
         log.debug(f"load CAP and install applet: {self.__cap_file}")
-        cap = sc.CapFile(self.__cap_file)
-        sd = sc.SecurityDomain(ctx.reader)
+        cap = sc.open_cap(self.__cap_file)
+        sd = ctx.security_domain
 
         try:
             sd.remove(cap.pkg_aid)
         except sc.RspError:
             pass
 
-        t = time.perf_counter()
+        sd = _security_domain(ctx)
+        stats = sd.load_cap(cap)
 
-        sd.load_cap(cap)
-        sd.install_applet(cap.pkg_aid, cap.app_aids[0])
-        return time.perf_counter() - t
+        t = time.perf_counter_ns()
+        # a package of a batch holds the applets of several cases
+        for app_aid in cap.app_aids:
+            sd.install_applet(cap.pkg_aid, app_aid)
+        t = (time.perf_counter_ns() - t) * 1e-9
+        self.size = stats.size
+        _log_load(stats)
+        # the transfer as LoadCap, the commands are wrapped before, and the
+        # installs
+        return ctx.calibration.net(stats.elapsed + t,
+                                   len(stats.times) + len(cap.app_aids))
 
 
 class Remove(Action):
@@ -50,10 +82,10 @@ class Remove(Action):
 
     def run(self, ctx: Context) -> float:
         log.debug(f"remove: {self.__aid}")
-        sd = sc.SecurityDomain(ctx.reader)
-        t = time.perf_counter()
+        sd = _security_domain(ctx)
+        t = time.perf_counter_ns()
         sd.remove(self.__aid)
-        return time.perf_counter() - t
+        return ctx.calibration.net((time.perf_counter_ns() - t) * 1e-9)
 
 
 class LoadCap(Action):
@@ -65,16 +97,18 @@ class LoadCap(Action):
 
     def run(self, ctx: Context) -> float:
         log.debug(f"load CAP file: {self.__cap_file}")
-        cap = sc.CapFile(self.__cap_file)
-        sd = sc.SecurityDomain(ctx.reader)
+        cap = sc.open_cap(self.__cap_file)
+        sd = ctx.security_domain
         try:
             sd.remove(cap.pkg_aid)
         except sc.RspError:
             pass
 
-        t = time.perf_counter()
-        sd.load_cap(cap)
-        return time.perf_counter() - t
+        stats = sd.load_cap(cap)
+        self.size = stats.size
+        _log_load(stats)
+        # the transfer only, the commands are wrapped before
+        return ctx.calibration.net(stats.elapsed, len(stats.times))
 
 
 class InstallApplet(Action):
@@ -84,33 +118,51 @@ class InstallApplet(Action):
 
     def run(self, ctx: Context) -> float:
         log.debug(f"install applet: {self.__pkg_aid}, {self.__app_aid}")
-        sd = sc.SecurityDomain(ctx.reader)
+        sd = _security_domain(ctx)
 
-        t = time.perf_counter()
+        t = time.perf_counter_ns()
         sd.install_applet(self.__pkg_aid, self.__app_aid)
-        return time.perf_counter() - t
+        return ctx.calibration.net((time.perf_counter_ns() - t) * 1e-9)
 
 
 class Select(Action):
     def __init__(self, json_file, aid):
         self.__aid = sc.AID(aid)
+        apdu = sc.CmdAPDU("00a4040000")
+        apdu.data = bytes(self.__aid)
+        self.__apdu = sc.compile_apdu(apdu)
 
     def run(self, ctx: Context) -> float:
         log.debug(f"select: {self.__aid}")
-        apdu = sc.CmdAPDU("00a4040000")
-        apdu.data = bytes(self.__aid)
-        rsp = ctx.reader.transmit(apdu)
-        return rsp.time
+        ctx.end_session()
+        rsp = ctx.reader.transmit(self.__apdu)
+        self.overhead = rsp.overhead
+        self.hops = rsp.hops
+        return ctx.calibration.net(rsp.time, len(rsp.hops))
+
+
+# INS of SELECT and MANAGE CHANNEL, the card closes the secure channel
+_ENDS_SESSION = (0xA4, 0x70)
 
 
 class SendAPDU(Action):
     def __init__(self, json_file, apdu):
-        self.__apdu = apdu
+        # checked and converted once, not in every round
+        self.__apdu = sc.compile_apdu(apdu)
+        self.__ends_session = self.__apdu[1] in _ENDS_SESSION
 
     def run(self, ctx: Context) -> float:
-        log.debug(f"send apdu: {self.__apdu}")
+        log.debug(f"send apdu: {self.__apdu.hex()}")
+        # a command to the selected applet keeps the secure channel
+        if self.__ends_session:
+            ctx.end_session()
         rsp = ctx.reader.transmit(self.__apdu)
-        return rsp.time
+        self.overhead = rsp.overhead
+        self.hops = rsp.hops
+        if len(rsp.hops) > 1:
+            log.debug(f"{len(rsp.hops)} exchanges, overhead "
+                      f"{rsp.overhead * 1000:.02f} ms")
+        return ctx.calibration.net(rsp.time, len(rsp.hops))
 
 
 class Reset(Action):
@@ -119,19 +171,31 @@ class Reset(Action):
 
     def run(self, ctx: Context) -> float:
         log.debug("reset")
-        t = time.perf_counter()
+        t = time.perf_counter_ns()
         ctx.reader.reset()
-        return time.perf_counter() - t
+        ctx.end_session()
+        return (time.perf_counter_ns() - t) * 1e-9
 
 
 class Script(Action):
     def __init__(self, json_file, actions):
         self.__actions = actions
 
+    @property
+    def size(self):
+        sizes = [action.size for action in self.__actions if action.size]
+        return sum(sizes) if sizes else None
+
     def run(self, ctx: Context) -> float:
         t = 0
+        overhead = 0.0
+        hops = ()
         for action in self.__actions:
             t += action.run(ctx)
+            overhead += action.overhead
+            hops += action.hops
+        self.overhead = overhead
+        self.hops = hops
         return t
 
 
@@ -0,0 +1,218 @@
+#coding:utf-8
+"""
+Compare the results of a run with a baseline run.
+"""
+
+import math
+import sys
+import logging
+log = logging.getLogger("jcmeasure")
+
+from .store import open_store
+
+REGRESSION = "regression"
+IMPROVEMENT = "improvement"
+SAME = "same"
+MISSING = "missing"
+FAILED = "failed"
+
+
+def mann_whitney(xs, ys):
+    """
+    Two-sided Mann-Whitney U test with the normal approximation and tie
+    correction. Return (U of `xs`, p value).
+    """
+    n1, n2 = len(xs), len(ys)
+    if n1 == 0 or n2 == 0:
+        return 0.0, 1.0
+
+    # rank all samples, ties get their average rank
+    values = sorted([(x, 0) for x in xs] + [(y, 1) for y in ys])
+    ranks = [0.0] * len(values)
+    ties = 0.0
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1][0] == values[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        ties += t**3 - t
+        i = j + 1
+
+    r1 = sum(r for r, (v, g) in zip(ranks, values) if g == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    mu = n1 * n2 / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return u1, 1.0
+    # continuity correction
+    z = (abs(u1 - mu) - 0.5) / sigma
+    return u1, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def net_samples(record):
+    """
+    Per-round time of a case: the test samples less the median adjust sample.
+    """
+    adjust = sorted(record["adjust"])
+    if not adjust:
+        return list(record["test"])
+    mid = len(adjust) // 2
+    base = adjust[mid] if len(adjust) % 2 else (adjust[mid - 1] +
+                                                adjust[mid]) / 2
+    return [t - base for t in record["test"]]
+
+
+def load_run(file_name, run=None):
+    """
+    Load the results of `run` (the last run by default) from a result
+    store, failed ones included.
+    """
+    records = open_store(file_name).read()
+    if not records:
+        raise ValueError(f"no result in {file_name}.")
+    if run is None:
+        run = records[-1]["run"]
+    return [rec for rec in records if rec["run"] == run]
+
+
+def latest(records):
+    """
+    The last record of each case of each run on each reader, a case re-run
+    after a failure when a run is resumed has several.
+    """
+    last = {}
+    for rec in records:
+        key = (rec.get("run"), rec["name"], rec["reader"])
+        # the case keeps the place of its first record
+        last[key] = rec
+    return list(last.values())
+
+
+class Comparison:
+    """
+    Comparison of a case between the baseline and the current run.
+    """
+
+    def __init__(self, name, reader, status, change=None, p_value=None):
+        self.name = name
+        self.reader = reader
+        self.status = status
+        self.change = change
+        self.p_value = p_value
+
+
+def compare(baseline, current, threshold=0.05, alpha=0.05):
+    """
+    Compare `current` records with `baseline` records of the same case on
+    the same reader. A case regresses (or improves) when its time grows (or
+    shrinks) by more than `threshold` and the Mann-Whitney test on the
+    per-round times is significant at level `alpha`. Only the last record
+    of a case counts. A case failing now is FAILED, a case without a
+    successful result on either side is MISSING.
+    """
+    base = {(rec["name"], rec["reader"]): rec for rec in latest(baseline)}
+    comparisons = []
+    seen = set()
+    for rec in latest(current):
+        key = (rec["name"], rec["reader"])
+        seen.add(key)
+        ref = base.get(key)
+        if rec["failed"]:
+            comparisons.append(Comparison(rec["name"], rec["reader"],
+                                          FAILED))
+            continue
+        if ref is None or ref["failed"] or not ref["time"]:
+            comparisons.append(Comparison(rec["name"], rec["reader"],
+                                          MISSING))
+            continue
+
+        change = (rec["time"] - ref["time"]) / abs(ref["time"])
+        _, p_value = mann_whitney(net_samples(rec), net_samples(ref))
+        status = SAME
+        if p_value < alpha and change > threshold:
+            status = REGRESSION
+        elif p_value < alpha and change < -threshold:
+            status = IMPROVEMENT
+        comparisons.append(
+            Comparison(rec["name"], rec["reader"], status, change, p_value))
+
+    # cases of the baseline not run this time
+    for key, ref in base.items():
+        if key not in seen:
+            comparisons.append(Comparison(ref["name"], ref["reader"],
+                                          MISSING))
+    return comparisons
+
+
+def gen_diff_report(comparisons, file_name):
+    with open(file_name, "w") as f:
+        print(f"{'Name':<20s}    {'Change':<10s}    {'P value':<10s}    "
+              "Status", file=f)
+        for cmp in comparisons:
+            change = f"{cmp.change:+.02%}" if cmp.change is not None else "-"
+            p_value = f"{cmp.p_value:.04f}" if cmp.p_value is not None else "-"
+            print(f"{cmp.name:<20s}    {change:<10s}    {p_value:<10s}    "
+                  f"{cmp.status} [{cmp.reader}]", file=f)
+
+
+def check_regressions(comparisons):
+    """
+    Log the regressions, failures and improvements, return 1 if any case
+    regressed or failed.
+    """
+    regressed = False
+    for cmp in comparisons:
+        if cmp.status == REGRESSION:
+            regressed = True
+            log.warning(f"{cmp.name} [{cmp.reader}] regressed by "
+                        f"{cmp.change:.02%}, p = {cmp.p_value:.04f}")
+        elif cmp.status == FAILED:
+            regressed = True
+            log.warning(f"{cmp.name} [{cmp.reader}] failed")
+        elif cmp.status == MISSING:
+            log.warning(f"{cmp.name} [{cmp.reader}] has no result to "
+                        "compare")
+        elif cmp.status == IMPROVEMENT:
+            log.info(f"{cmp.name} [{cmp.reader}] improved by "
+                     f"{-cmp.change:.02%}, p = {cmp.p_value:.04f}")
+    return 1 if regressed else 0
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="jcmeasure-compare")
+    parser.add_argument("baseline", help="result store of the baseline.")
+    parser.add_argument("current", help="result store of the current run.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.05, help="relative change.")
+    parser.add_argument(
+        "--alpha", type=float, default=0.05, help="significance level.")
+    parser.add_argument(
+        "--output", "-o", default="diff.txt", help="diff report file.")
+    ns = parser.parse_args(sys.argv[1:])
+
+    log.setLevel(logging.INFO)
+    log.addHandler(logging.StreamHandler(sys.stdout))
+    comparisons = compare(
+        load_run(ns.baseline), load_run(ns.current), ns.threshold, ns.alpha)
+    gen_diff_report(comparisons, ns.output)
+    return check_regressions(comparisons)
+
+
+__all__ = [
+    "mann_whitney",
+    "load_run",
+    "latest",
+    "compare",
+    "gen_diff_report",
+    "check_regressions",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
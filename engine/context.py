@@ -1,14 +1,88 @@
 #coding:utf-8
 
+from contextlib import nullcontext
+from .libsc import SecurityDomain, C_MAC
+from .timing import Calibration
+from .isolation import quiet
+
+
+class CardInfo:
+    """
+    The card a case is measured on.
+    """
+
+    def __init__(self, reader, atr, protocol):
+        self.reader = reader
+        self.atr = atr
+        self.protocol = protocol
+
+    def __str__(self):
+        return f"{self.reader} ({self.atr})"
+
+    def __repr__(self):
+        return f"CardInfo('{self.reader}', '{self.atr}', '{self.protocol}')"
+
+    def __eq__(self, other):
+        return isinstance(other, CardInfo) and (
+            self.reader, self.atr) == (other.reader, other.atr)
+
+    def __hash__(self):
+        return hash((self.reader, self.atr))
+
+
 class Context:
-    def __init__(self, reader, reporter):
+    def __init__(self, reader, reporter, secure_level=C_MAC, isolated=False):
         self.__reader = reader
         self.__reporter = reporter
+        self.__secure_level = secure_level
+        self.__isolated = isolated
+        self.__sd = None
+        # reader overhead subtracted from the times of the actions, none
+        # until the reader is calibrated
+        self.calibration = Calibration()
 
     @property
     def reader(self):
         return self.__reader
 
+    @property
+    def security_domain(self):
+        """
+        Security domain of the card. Its secure channel is opened by the first
+        card management action and kept by the next ones until `end_session`,
+        which Select, Reset and a SendAPDU of SELECT or MANAGE CHANNEL call as
+        the card closes the channel then. A setup such as `Select;
+        LoadAndInstall; Select; Remove` thus opens the channel twice.
+        """
+        if self.__sd is None:
+            self.__sd = SecurityDomain(
+                self.__reader, secure_level=self.__secure_level)
+        return self.__sd
+
+    def end_session(self):
+        """
+        Drop the secure channel, the card closes it when it is reset or
+        another applet is selected.
+        """
+        if self.__sd is not None:
+            self.__sd.reset(reset_reader=False)
+
+    def timed(self):
+        """
+        Context manager of a timed loop, it holds the garbage collector and
+        the log output back in isolated mode.
+        """
+        return quiet() if self.__isolated else nullcontext()
+
+    @property
+    def card(self):
+        reader = self.__reader
+        try:
+            return CardInfo(reader.name, reader.get_atr().hex(),
+                            reader.get_protocol())
+        except Exception:
+            return CardInfo(reader.name, "", "")
+
     @property
     def config(self):
         pass
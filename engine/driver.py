@@ -2,6 +2,8 @@
 
 import time
 import sys
+import queue
+import threading
 import logging
 log = logging.getLogger("jcmeasure")
 
@@ -11,9 +13,26 @@ from .context import Context
 from .measurecase import MeasureCase
 from .action import *
 from .reporter import Reporter
+from .store import open_store
+from .compare import load_run, compare, gen_diff_report, check_regressions
+from .scheduler import TimeBudget
+from .planner import plan
+from .timing import calibrate
+from .isolation import (isolate, worker_cpus, fork_context, SharedBatches,
+                        RemoteReporter)
 from . import libsc
 
 
+def _cases_left(batches):
+    """
+    Count of the cases in the batches not started yet.
+    """
+    if isinstance(batches, SharedBatches):
+        return batches.cases_left()
+    with batches.mutex:
+        return sum(len(batch) for batch in batches.queue)
+
+
 def load_measure_cases():
     tests = Path("./tests")
     for json_file in tests.glob("**/*.json"):
@@ -21,36 +40,292 @@ def load_measure_cases():
 
 
 class Driver:
-    def __init__(self, config_file=None):
+    def __init__(self,
+                 config_file=None,
+                 reader="pcsc",
+                 time_budget=None,
+                 parallel=None,
+                 fleet=False,
+                 stores=(),
+                 resume=False,
+                 baseline=None,
+                 threshold=0.05,
+                 secure_level=libsc.C_MAC,
+                 calibrate=None,
+                 isolated=False):
         self.__cases = list(load_measure_cases())
+        self.__reader = reader
+        self.__time_budget = time_budget
+        # None: one reader; 0: every PC/SC reader with a card; N: N readers
+        self.__parallel = parallel
+        # run all cases on every reader instead of sharing them out
+        self.__fleet = fleet
+        self.__stores = [open_store(file_name) for file_name in stores]
+        # continue the last run recorded in the first store
+        self.__resume = resume
+        if resume and not self.__stores:
+            raise ValueError("a result store is needed to resume a run.")
+        # result store of the run to compare with
+        self.__baseline = baseline
+        self.__threshold = threshold
+        # secure level of the channel to the card manager
+        self.__secure_level = secure_level
+        # rounds of the reader calibration, None to not calibrate
+        self.__calibrate = calibrate
+        # run the cases of each reader in a pinned worker process
+        self.__isolated = isolated
         log.debug(f"Driver inited, case count: {len(self.__cases)}.")
 
     def __parse_config(self, config_file):
         pass
 
-    def __prepare_context(self):
-        return Context(libsc.PCSCReader(), Reporter())
+    def __prepare_readers(self):
+        specs = self.__reader.split(",")
+        if len(specs) > 1:
+            return [libsc.create_reader(spec) for spec in specs]
+        if self.__parallel is None and not self.__fleet:
+            return [libsc.create_reader(self.__reader)]
 
-    def test(self):
-        log.debug("prepare to test.")
-        ctx = self.__prepare_context()
+        backend = self.__reader.partition(":")[0].lower()
+        if backend == "pcsc":
+            names = [
+                name for name, card_inside in libsc.list_pcsc_readers()
+                if card_inside
+            ]
+            if self.__parallel:
+                names = names[:self.__parallel]
+            if not names:
+                raise ValueError("No PCSC reader with card found")
+            return [libsc.PCSCReader(name) for name in names]
+        else:
+            return [
+                libsc.create_reader(self.__reader)
+                for i in range(self.__parallel or 1)
+            ]
+
+    def __run_cases(self, ctx, batches, budget, workers):
+        """
+        Open the reader of `ctx` and run batches of cases taken from the
+        shared queue until it is empty, so a fast reader takes over the
+        batches a slow one has not started yet.
+        """
         try:
             # T=0 is better for measure speed because its wtx is short
             ctx.reader.open(protocol="T=0")
         except Exception:
             ctx.reader.open(protocol="auto")
+        if self.__calibrate:
+            ctx.calibration = calibrate(ctx.reader, self.__calibrate)
+
+        def test(case, left):
+            assert isinstance(case, MeasureCase)
+            try:
+                if budget is None:
+                    case.test(ctx)
+                else:
+                    left += _cases_left(batches)
+                    case.test(ctx, budget.share(left, workers))
+            except Exception as e:
+                log.exception(e)
 
         try:
-            for case in self.__cases:
-                assert isinstance(case, MeasureCase)
+            while True:
                 try:
-                    case.test(ctx)
-                except Exception as e:
-                    log.exception(e)
+                    batch = batches.get_nowait()
+                except queue.Empty:
+                    break
+                batch.run(ctx, test)
         finally:
+            ctx.end_session()
             ctx.reader.close()
-            ctx.reporter.gen_report(
-                f"report_{time.strftime('%Y%m%d%H%M%S')}.txt")
+
+    def __load_checkpoint(self):
+        """
+        Return the id and the finished results of the last run in the first
+        result store.
+        """
+        store = self.__stores[0]
+        records = store.read() if store.exists() else []
+        if not records:
+            return None, []
+        run = records[-1]["run"]
+        return run, [
+            rec for rec in records if rec["run"] == run and not rec["failed"]
+        ]
+
+    @staticmethod
+    def __plan(cases, skip):
+        """
+        Queue of the batches of `cases` not in `skip`, a batch is set up once
+        for all its cases.
+        """
+        batches = queue.Queue()
+        for batch in plan(case for case in cases if case.name not in skip):
+            batches.put(batch)
+        return batches
+
+    def __run_worker(self, ctx, cases, budget, workers):
+        try:
+            self.__run_cases(ctx, cases, budget, workers)
+        except Exception as e:
+            log.error(f"{ctx.reader} failed. {e}")
+            log.exception(e)
+
+    def __run_isolated_worker(self, reader, batches, budget, workers,
+                              results, cpu):
+        try:
+            isolate(cpu)
+            ctx = Context(reader, RemoteReporter(results),
+                          self.__secure_level, isolated=True)
+            self.__run_worker(ctx, batches, budget, workers)
+        finally:
+            # tell the driver this worker is done
+            results.put(None)
+
+    def __run_isolated_thread(self, reader, batches, reporter, budget,
+                              workers, cpu):
+        isolate(cpu)
+        ctx = Context(reader, reporter, self.__secure_level, isolated=True)
+        self.__run_worker(ctx, batches, budget, workers)
+
+    def __run_isolated(self, readers, queues, reporter, budget, workers):
+        """
+        Run the cases of each reader in a worker process of its own, and
+        report the results the workers send back.
+        """
+        mp = fork_context()
+        if mp is None:
+            log.warning("isolated mode needs fork, cases run in threads.")
+            threads = [
+                threading.Thread(
+                    target=self.__run_isolated_thread,
+                    args=(reader, batches, reporter, budget, workers, cpu),
+                    name=reader.name)
+                for reader, batches, cpu in zip(readers, queues,
+                                                worker_cpus(len(readers)))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return
+
+        shared = {}
+        for batches in queues:
+            if id(batches) not in shared:
+                shared[id(batches)] = SharedBatches(mp, batches)
+        results = mp.Queue()
+        procs = [
+            mp.Process(
+                target=self.__run_isolated_worker,
+                args=(reader, shared[id(batches)], budget, workers, results,
+                      cpu),
+                name=reader.name)
+            for reader, batches, cpu in zip(readers, queues,
+                                            worker_cpus(len(readers)))
+        ]
+        for proc in procs:
+            proc.start()
+        running = len(procs)
+        while running:
+            try:
+                res = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in procs):
+                    log.error("isolated workers exited unexpectedly.")
+                    break
+                continue
+            if res is None:
+                running -= 1
+            else:
+                reporter.report_result(res)
+        for proc in procs:
+            proc.join()
+
+    def test(self):
+        """
+        Run all cases, return 1 if any case regressed against the baseline,
+        otherwise 0.
+        """
+        log.debug("prepare to test.")
+        baseline = None
+        if self.__baseline is not None:
+            baseline = load_run(self.__baseline)
+        readers = self.__prepare_readers()
+
+        run, done = None, []
+        if self.__resume:
+            run, done = self.__load_checkpoint()
+            if run is not None:
+                log.info(f"resume run {run}, {len(done)} results found.")
+        reporter = Reporter(
+            self.__stores,
+            f"report_{run or time.strftime('%Y%m%d%H%M%S')}.txt",
+            run,
+            tag_card=len(readers) > 1)
+        reporter.restore(done)
+
+        if self.__fleet:
+            # every reader runs its own copy of the cases
+            queues = []
+            for i, reader in enumerate(readers):
+                skip = {rec["name"] for rec in done
+                        if rec["reader"] == reader.name}
+                cases = self.__cases if i == 0 else load_measure_cases()
+                queues.append(self.__plan(cases, skip))
+            workers = 1
+        else:
+            skip = {rec["name"] for rec in done}
+            queues = [self.__plan(self.__cases, skip)] * len(readers)
+            workers = len(readers)
+
+        budget = None
+        if self.__time_budget is not None:
+            budget = TimeBudget(self.__time_budget)
+
+        try:
+            if self.__isolated:
+                self.__run_isolated(readers, queues, reporter, budget,
+                                    workers)
+            elif len(readers) == 1:
+                self.__run_cases(
+                    Context(readers[0], reporter, self.__secure_level),
+                    queues[0], budget, 1)
+            else:
+                log.debug(f"test with {len(readers)} readers: {readers}")
+                threads = [
+                    threading.Thread(
+                        target=self.__run_worker,
+                        args=(Context(reader, reporter, self.__secure_level),
+                              cases, budget, workers),
+                        name=reader.name)
+                    for reader, cases in zip(readers, queues)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            reporter.close()
+            if self.__fleet:
+                reporter.gen_matrix(f"matrix_{reporter.run}.txt")
+
+        if baseline is None:
+            return 0
+        comparisons = compare(baseline,
+                              [res.to_dict() for res in reporter.results],
+                              self.__threshold)
+        gen_diff_report(comparisons, f"diff_{reporter.run}.txt")
+        return check_regressions(comparisons)
+
+
+SECURE_LEVELS = {
+    "mac": libsc.C_MAC,
+    "enc": libsc.C_ENCRYPT_MAC,
+    "mac+rmac": libsc.C_MAC | libsc.R_MAC,
+    "enc+rmac": libsc.C_ENCRYPT_MAC | libsc.R_MAC,
+    "enc+renc": libsc.C_ENCRYPT_MAC | libsc.R_ENCRYPT_MAC,
+}
 
 
 def parse_cmdline():
@@ -62,6 +337,74 @@ def parse_cmdline():
         "--config", "-c", default=None, help="set config file.")
     parser.add_argument(
         "--list", "-l", default=None, help="set measure list file.")
+    parser.add_argument(
+        "--reader",
+        "-r",
+        default="pcsc",
+        help="set reader, `pcsc[:name]` or `sim[:script.json]`, several readers are separated by commas."
+    )
+    parser.add_argument(
+        "--time-budget",
+        "-t",
+        type=float,
+        default=None,
+        help="set wall-clock budget in seconds spread across all cases.")
+    parser.add_argument(
+        "--parallel",
+        "-p",
+        type=int,
+        nargs="?",
+        const=0,
+        default=None,
+        help="run cases on N readers at once, all readers with card if N is omitted."
+    )
+    parser.add_argument(
+        "--fleet",
+        "-f",
+        action="store_true",
+        help="run all cases on every reader and compare the cards.")
+    parser.add_argument(
+        "--store",
+        "-s",
+        action="append",
+        default=[],
+        help="also append results to a .jsonl, .csv or .db (SQLite) file.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the last run in the first store, skip finished cases."
+    )
+    parser.add_argument(
+        "--baseline",
+        "-b",
+        default=None,
+        help="compare with the last run in a result store, exit with 1 on regression."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="relative change of time to flag against the baseline.")
+    parser.add_argument(
+        "--secure-level",
+        choices=list(SECURE_LEVELS),
+        default="mac",
+        help="secure level of the channel to the card manager, SCP02 or SCP03 as the card supports."
+    )
+    parser.add_argument(
+        "--calibrate",
+        type=int,
+        nargs="?",
+        const=50,
+        default=None,
+        help="measure the reader overhead with N empty commands (50 if N is omitted) and subtract it from every command."
+    )
+    parser.add_argument(
+        "--isolated",
+        "-i",
+        action="store_true",
+        help="measure in a worker process per reader, pinned to a CPU, without GC and log output in the timed loops."
+    )
     return parser.parse_args(sys.argv[1:])
 
 
@@ -82,5 +425,7 @@ def main():
     log2.addHandler(console)
 
     ns = parse_cmdline()
-    drv = Driver(ns.config)
-    drv.test()
+    drv = Driver(ns.config, ns.reader, ns.time_budget, ns.parallel,
+                 ns.fleet, ns.store, ns.resume, ns.baseline, ns.threshold,
+                 SECURE_LEVELS[ns.secure_level], ns.calibrate, ns.isolated)
+    return drv.test()
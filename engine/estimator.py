@@ -0,0 +1,252 @@
+#coding:utf-8
+"""
+Estimators to reduce adjust and test samples to the time of a measure case.
+"""
+
+from abc import ABC, abstractmethod
+import math
+import random
+
+
+def _norm_ppf(p):
+    """
+    Quantile of the standard normal distribution.
+    """
+    lo, hi = -10.0, 10.0
+    for i in range(64):
+        mid = (lo + hi) / 2
+        if 0.5 * math.erfc(-mid / math.sqrt(2)) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def _t_ppf(p, dof):
+    """
+    Quantile of Student's t distribution (Cornish-Fisher expansion).
+    """
+    z = _norm_ppf(p)
+    if math.isinf(dof):
+        return z
+    g1 = (z**3 + z) / 4
+    g2 = (5 * z**5 + 16 * z**3 + 3 * z) / 96
+    g3 = (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384
+    g4 = (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / 92160
+    return z + g1 / dof + g2 / dof**2 + g3 / dof**3 + g4 / dof**4
+
+
+def _mean(samples):
+    return sum(samples) / len(samples)
+
+
+def _var(samples):
+    n = len(samples)
+    if n < 2:
+        return math.inf
+    m = _mean(samples)
+    return sum((x - m)**2 for x in samples) / (n - 1)
+
+
+def _percentile(sorted_samples, q):
+    # linear interpolation between closest ranks
+    pos = (len(sorted_samples) - 1) * q
+    i = int(math.floor(pos))
+    j = min(i + 1, len(sorted_samples) - 1)
+    return sorted_samples[i] + (sorted_samples[j] - sorted_samples[i]) * (
+        pos - i)
+
+
+class Estimate:
+    """
+    Estimated time with its confidence interval.
+    """
+
+    def __init__(self, value, low=-math.inf, high=math.inf, method=""):
+        self.value = value
+        self.low = low
+        self.high = high
+        self.method = method
+
+    @property
+    def width(self):
+        return self.high - self.low
+
+    def __repr__(self):
+        return f"Estimate({self.value!r}, {self.low!r}, {self.high!r}, '{self.method}')"
+
+
+def bootstrap_ci(adjust,
+                 test,
+                 statistic,
+                 confidence=0.95,
+                 resamples=1000,
+                 seed=0):
+    """
+    Percentile bootstrap confidence interval of
+    `statistic(test) - statistic(adjust)`.
+    """
+    if len(adjust) < 2 or len(test) < 2:
+        return -math.inf, math.inf
+    rnd = random.Random(seed)
+    diffs = sorted(
+        statistic(rnd.choices(test, k=len(test))) -
+        statistic(rnd.choices(adjust, k=len(adjust)))
+        for i in range(resamples))
+    alpha = (1 - confidence) / 2
+    return _percentile(diffs, alpha), _percentile(diffs, 1 - alpha)
+
+
+def welch_diff(adjust, test, confidence=0.95):
+    """
+    Difference of the means of `test` and `adjust` with the Welch's t
+    confidence interval.
+    """
+    diff = _mean(test) - _mean(adjust)
+    va = _var(adjust) / len(adjust)
+    vt = _var(test) / len(test)
+    se = math.sqrt(va + vt)
+    if math.isinf(se):
+        return Estimate(diff, method="welch")
+    if se == 0:
+        return Estimate(diff, diff, diff, "welch")
+    # Welch-Satterthwaite degrees of freedom
+    dof = (va + vt)**2 / (va**2 / (len(adjust) - 1) + vt**2 /
+                          (len(test) - 1))
+    half = _t_ppf(1 - (1 - confidence) / 2, dof) * se
+    return Estimate(diff, diff - half, diff + half, "welch")
+
+
+def paired_diff(adjust, test, confidence=0.95, resamples=1000, seed=0):
+    """
+    Median of the differences of the test and adjust samples taken in the
+    same round, with its percentile bootstrap confidence interval.
+    """
+    diffs = [t - a for a, t in zip(adjust, test)]
+    if not diffs:
+        raise ValueError("no paired samples.")
+    value = _percentile(sorted(diffs), 0.5)
+    if len(diffs) < 2:
+        return Estimate(value, method="paired")
+    rnd = random.Random(seed)
+    medians = sorted(
+        _percentile(sorted(rnd.choices(diffs, k=len(diffs))), 0.5)
+        for i in range(resamples))
+    alpha = (1 - confidence) / 2
+    return Estimate(value, _percentile(medians, alpha),
+                    _percentile(medians, 1 - alpha), "paired")
+
+
+class Estimator(ABC):
+    """
+    Base class of estimator. The time of a case is
+    `statistic(test) - statistic(adjust)`, the confidence interval of it is
+    bootstrapped.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def statistic(self, samples) -> float:
+        pass
+
+    def difference(self, adjust, test, confidence=0.95) -> Estimate:
+        value = self.statistic(test) - self.statistic(adjust)
+        low, high = bootstrap_ci(adjust, test, self.statistic, confidence)
+        return Estimate(value, low, high, self.name)
+
+
+class MinEstimator(Estimator):
+    name = "min"
+
+    def statistic(self, samples):
+        return min(samples)
+
+
+class MedianEstimator(Estimator):
+    name = "median"
+
+    def statistic(self, samples):
+        return _percentile(sorted(samples), 0.5)
+
+
+class TrimmedMeanEstimator(Estimator):
+    """
+    Mean of samples after dropping `trim` of the samples at each end.
+    """
+
+    name = "trimmed"
+
+    def __init__(self, trim=0.1):
+        trim = float(trim)
+        if not 0 <= trim < 0.5:
+            raise ValueError(f"trim {trim} should be in range [0, 0.5).")
+        self.trim = trim
+
+    def statistic(self, samples):
+        samples = sorted(samples)
+        k = int(len(samples) * self.trim)
+        return _mean(samples[k:len(samples) - k])
+
+
+class WelchEstimator(Estimator):
+    name = "welch"
+
+    def statistic(self, samples):
+        return _mean(samples)
+
+    def difference(self, adjust, test, confidence=0.95):
+        return welch_diff(adjust, test, confidence)
+
+
+class PairedEstimator(Estimator):
+    """
+    Median of the paired differences, for samples taken in an interleaved
+    or random order where each test round has an adjust round next to it.
+    """
+
+    name = "paired"
+
+    def statistic(self, samples):
+        return _percentile(sorted(samples), 0.5)
+
+    def difference(self, adjust, test, confidence=0.95):
+        return paired_diff(adjust, test, confidence)
+
+
+ESTIMATORS = {
+    "min": MinEstimator,
+    "median": MedianEstimator,
+    "trimmed": TrimmedMeanEstimator,
+    "welch": WelchEstimator,
+    "paired": PairedEstimator,
+}
+
+
+def get_estimator(spec="min"):
+    """
+    Get estimator by spec string `name[:argument]`, for example "median" or
+    "trimmed:0.2".
+    """
+    name, _, arg = str(spec).partition(":")
+    try:
+        cls = ESTIMATORS[name.lower()]
+    except KeyError:
+        raise ValueError(f"estimator {name} not supported.")
+    return cls(arg) if arg else cls()
+
+
+__all__ = [
+    "Estimate",
+    "Estimator",
+    "MinEstimator",
+    "MedianEstimator",
+    "TrimmedMeanEstimator",
+    "WelchEstimator",
+    "PairedEstimator",
+    "ESTIMATORS",
+    "bootstrap_ci",
+    "welch_diff",
+    "paired_diff",
+    "get_estimator",
+]
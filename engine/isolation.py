@@ -0,0 +1,184 @@
+#coding:utf-8
+"""
+Isolated measurement: the cases of a reader run in a worker process of their
+own, pinned to one CPU at a raised priority, and the timed loops run with
+the garbage collector disabled and the log output held back. Results are
+sent to the driver process as soon as each case finishes.
+"""
+
+from contextlib import contextmanager
+import gc
+import os
+import queue
+import threading
+import multiprocessing
+import logging
+log = logging.getLogger("jcmeasure")
+
+# loggers held back during timed loops
+_LOGGERS = ("jcmeasure", "libsc")
+
+# niceness asked for the worker, only granted to privileged users
+_NICE = -10
+
+
+class _Buffer(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+# quiet() of several threads share one buffer, the first one in sets it up
+# and the last one out handles the records
+_quiet_lock = threading.Lock()
+_quiet_depth = 0
+_quiet_state = None
+
+
+@contextmanager
+def quiet():
+    """
+    Run the block with the garbage collector disabled and the log records
+    kept in memory, they are handled after the block. Blocks of several
+    threads may overlap, the records are handled after the last one.
+    """
+    global _quiet_depth, _quiet_state
+    with _quiet_lock:
+        if _quiet_depth == 0:
+            loggers = [logging.getLogger(name) for name in _LOGGERS]
+            saved = [(logger.handlers, logger.propagate) for logger in loggers]
+            buf = _Buffer()
+            for logger in loggers:
+                logger.handlers = [buf]
+                logger.propagate = False
+            # collect now so the garbage of the last block is not left over
+            gc.collect()
+            enabled = gc.isenabled()
+            gc.disable()
+            _quiet_state = (loggers, saved, buf, enabled)
+        _quiet_depth += 1
+    try:
+        yield
+    finally:
+        records = []
+        with _quiet_lock:
+            _quiet_depth -= 1
+            if _quiet_depth == 0:
+                loggers, saved, buf, enabled = _quiet_state
+                _quiet_state = None
+                if enabled:
+                    gc.enable()
+                for logger, (handlers, propagate) in zip(loggers, saved):
+                    logger.handlers = handlers
+                    logger.propagate = propagate
+                records = buf.records
+        for record in records:
+            logging.getLogger(record.name).handle(record)
+
+
+def worker_cpus(count):
+    """
+    CPUs to pin `count` workers to, one each from the last CPU the process
+    may run on, so the first stays with the driver and the system. None if
+    the platform does not support pinning.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * count
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) > count:
+        cpus = cpus[1:]
+    return [cpus[-1 - i % len(cpus)] for i in range(count)]
+
+
+def isolate(cpu=None):
+    """
+    Pin the calling thread, or process, to `cpu` and raise its priority where
+    allowed.
+    """
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            log.debug(f"worker {os.getpid()} pinned to CPU {cpu}")
+        except OSError as e:
+            log.warning(f"cannot pin worker to CPU {cpu}. {e}")
+    if hasattr(os, "nice"):
+        try:
+            os.nice(_NICE)
+        except OSError:
+            log.debug(f"priority of worker {os.getpid()} not raised, "
+                      "not permitted")
+
+
+def fork_context():
+    """
+    Context of the worker processes, they are forked so they inherit the
+    cases, None where fork is not available.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+class SharedBatches:
+    """
+    Batches of cases taken by the workers of several processes. The batches
+    are inherited by the forked workers, which share the index of the next
+    batch and the count of cases not started.
+    """
+
+    def __init__(self, mp, batches):
+        self.__batches = []
+        while True:
+            try:
+                self.__batches.append(batches.get_nowait())
+            except queue.Empty:
+                break
+        self.__next = mp.Value("i", 0)
+        self.__left = mp.Value(
+            "i", sum(len(batch) for batch in self.__batches))
+
+    def get_nowait(self):
+        with self.__next.get_lock():
+            i = self.__next.value
+            if i >= len(self.__batches):
+                raise queue.Empty
+            self.__next.value = i + 1
+            batch = self.__batches[i]
+            with self.__left.get_lock():
+                self.__left.value -= len(batch)
+        return batch
+
+    def cases_left(self):
+        return self.__left.value
+
+
+class RemoteReporter:
+    """
+    Reporter of a worker process, results are sent to the driver.
+    """
+
+    def __init__(self, results):
+        self.__results = results
+
+    def report_case(self, case, result, card=None):
+        from .reporter import CaseResult
+        log.debug(f"{case.name}: {result} {case.unit}")
+        self.__results.put(CaseResult(case, result, card))
+
+    def report_failure(self, case, card=None):
+        from .reporter import CaseResult
+        self.__results.put(CaseResult(case, None, card))
+        log.debug(f"{case.name} failed")
+
+
+__all__ = [
+    "quiet",
+    "isolate",
+    "worker_cpus",
+    "fork_context",
+    "SharedBatches",
+    "RemoteReporter",
+]
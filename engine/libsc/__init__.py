@@ -5,5 +5,7 @@ Library Smart Card.
 
 from .base import *
 from .reader import *
+from .pcsc import *
+from .simulator import *
 from .javacard import *
 from .gp import *
\ No newline at end of file
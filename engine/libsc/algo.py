@@ -3,20 +3,246 @@
 Privide some algorithoms.
 """
 
-import pyDes
-import cryptolib as cl
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import os
+import threading
 
 PAD_NONE = 0
 PAD_9797M2 = 1
 
 DEFAULT_IV = b"\x00" * 8
-
-
-def _add_padding(data, pad):
+DEFAULT_AES_IV = b"\x00" * 16
+
+
+def _xor(a, b):
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(
+        len(a), "big")
+
+
+class CryptoProvider(ABC):
+    """
+    Block cipher backend of the functions below. `encrypt` and `decrypt` use
+    DES, or 3DES when `triple` is true, `aes_encrypt` and `aes_decrypt` use
+    AES, in ECB mode, or in CBC mode when `iv` is given.
+
+    A provider keeps the key schedules of the last `cache_size` keys, since
+    the session keys of a secure channel are used for every command.
+    """
+
+    name = None
+
+    def __init__(self, cache_size=64):
+        self.__cache_size = cache_size
+        self.__ciphers = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def _cipher(self, key, kind):
+        """
+        Return the `kind` ("des", "3des" or "aes") cipher of `key` built by
+        `_new_cipher`, from the cache.
+        """
+        tag = (bytes(key), kind)
+        with self.__lock:
+            cipher = self.__ciphers.get(tag)
+            if cipher is not None:
+                self.__ciphers.move_to_end(tag)
+                return cipher
+        cipher = self._new_cipher(tag[0], kind)
+        with self.__lock:
+            self.__ciphers[tag] = cipher
+            if len(self.__ciphers) > self.__cache_size:
+                self.__ciphers.popitem(last=False)
+        return cipher
+
+    @abstractmethod
+    def _new_cipher(self, key, kind):
+        pass
+
+    @abstractmethod
+    def encrypt(self, key, data, iv=None, triple=True) -> bytes:
+        pass
+
+    @abstractmethod
+    def decrypt(self, key, data, iv=None, triple=True) -> bytes:
+        pass
+
+    def aes_encrypt(self, key, data, iv=None) -> bytes:
+        raise NotImplementedError(f"{self.name} does not support AES.")
+
+    def aes_decrypt(self, key, data, iv=None) -> bytes:
+        raise NotImplementedError(f"{self.name} does not support AES.")
+
+
+class PyDesProvider(CryptoProvider):
+    """
+    Pure Python provider, slow and without AES, but always available.
+    """
+
+    name = "pydes"
+
+    def __init__(self, cache_size=64):
+        import pyDes
+        self.__pyDes = pyDes
+        super().__init__(cache_size)
+
+    def _new_cipher(self, key, kind):
+        pyDes = self.__pyDes
+        cipher = pyDes.triple_des(key) if kind == "3des" else pyDes.des(key)
+        # pyDes keeps the mode and IV in the cipher object
+        return cipher, threading.Lock()
+
+    def __crypt(self, key, data, iv, triple, encrypt):
+        cipher, lock = self._cipher(key, "3des" if triple else "des")
+        with lock:
+            if iv is None:
+                cipher.setMode(self.__pyDes.ECB)
+            else:
+                cipher.setMode(self.__pyDes.CBC)
+                cipher.setIV(bytes(iv))
+            if encrypt:
+                return cipher.encrypt(bytes(data))
+            return cipher.decrypt(bytes(data))
+
+    def encrypt(self, key, data, iv=None, triple=True) -> bytes:
+        return self.__crypt(key, data, iv, triple, True)
+
+    def decrypt(self, key, data, iv=None, triple=True) -> bytes:
+        return self.__crypt(key, data, iv, triple, False)
+
+
+class OpenSSLProvider(CryptoProvider):
+    """
+    Provider backed by OpenSSL through the `cryptography` package.
+    """
+
+    name = "openssl"
+
+    def __init__(self, cache_size=64):
+        from cryptography.hazmat.primitives.ciphers import Cipher, modes
+        from cryptography.hazmat.primitives.ciphers.algorithms import AES
+        try:
+            from cryptography.hazmat.decrepit.ciphers.algorithms import \
+                TripleDES
+        except ImportError:
+            from cryptography.hazmat.primitives.ciphers.algorithms import \
+                TripleDES
+        self.__Cipher = Cipher
+        self.__modes = modes
+        self.__TripleDES = TripleDES
+        self.__AES = AES
+        super().__init__(cache_size)
+
+    def _new_cipher(self, key, kind):
+        if kind == "aes":
+            algorithm = self.__AES(key)
+        else:
+            if len(key) not in ((16, 24) if kind == "3des" else (8,)):
+                raise ValueError(f"Invalid key size {len(key)}.")
+            # DES is 3DES with K1 = K2 = K3, and 2-key 3DES is K3 = K1
+            if kind == "des":
+                key = key * 3
+            elif len(key) == 16:
+                key = key + key[:8]
+            algorithm = self.__TripleDES(key)
+        # ECB keeps no state between blocks, so its contexts are kept open.
+        # A CBC context carries the last ciphertext block as the IV of the
+        # next call, it is kept open too and the IV asked for is folded into
+        # the first block, so no call sets up a new context.
+        ecb = self.__Cipher(algorithm, self.__modes.ECB())
+        block = algorithm.block_size // 8
+        cbc = self.__Cipher(algorithm, self.__modes.CBC(b"\x00" * block))
+        return [
+            ecb.encryptor(), ecb.decryptor(), cbc.encryptor(),
+            cbc.decryptor(), b"\x00" * block, b"\x00" * block,
+            threading.Lock()
+        ]
+
+    def __crypt(self, key, data, iv, kind, encrypt):
+        state = self._cipher(key, kind)
+        block = 16 if kind == "aes" else 8
+        if len(data) % block:
+            raise ValueError(
+                f"Invalid data length, must be multiple of {block}.")
+        data = bytes(data)
+        with state[6]:
+            if iv is None:
+                return (state[0] if encrypt else state[1]).update(data)
+            if not data:
+                return b""
+            if encrypt:
+                first = _xor(data[:block], _xor(iv, state[4]))
+                out = state[2].update(first + data[block:])
+                state[4] = out[-block:]
+                return out
+            out = state[3].update(data)
+            mask = _xor(iv, state[5])
+            state[5] = data[-block:]
+            return _xor(out[:block], mask) + out[block:]
+
+    def encrypt(self, key, data, iv=None, triple=True) -> bytes:
+        return self.__crypt(key, data, iv, "3des" if triple else "des", True)
+
+    def decrypt(self, key, data, iv=None, triple=True) -> bytes:
+        return self.__crypt(key, data, iv, "3des" if triple else "des", False)
+
+    def aes_encrypt(self, key, data, iv=None) -> bytes:
+        return self.__crypt(key, data, iv, "aes", True)
+
+    def aes_decrypt(self, key, data, iv=None) -> bytes:
+        return self.__crypt(key, data, iv, "aes", False)
+
+
+# provider name -> class, the first available one is the default
+_PROVIDERS = OrderedDict([
+    ("openssl", OpenSSLProvider),
+    ("pydes", PyDesProvider),
+])
+
+_provider = None
+
+
+def set_provider(provider):
+    """
+    Use `provider`, a CryptoProvider or a name in `_PROVIDERS`, for all the
+    functions below, and return it.
+    """
+    global _provider
+    if isinstance(provider, str):
+        try:
+            cls = _PROVIDERS[provider.lower()]
+        except KeyError:
+            raise ValueError(f"crypto provider {provider} not supported.")
+        provider = cls()
+    elif not isinstance(provider, CryptoProvider):
+        raise TypeError(provider)
+    _provider = provider
+    return provider
+
+
+def get_provider():
+    """
+    Return the provider in use. The default is named by the environment
+    variable LIBSC_CRYPTO, or is the first one whose package is installed.
+    """
+    if _provider is not None:
+        return _provider
+    name = os.environ.get("LIBSC_CRYPTO")
+    if name:
+        return set_provider(name)
+    for cls in _PROVIDERS.values():
+        try:
+            return set_provider(cls())
+        except ImportError:
+            pass
+    raise ImportError("No crypto provider, install cryptography or pyDes.")
+
+
+def _add_padding(data, pad, block=8):
     if pad == PAD_NONE:
         return data
     elif pad == PAD_9797M2:
-        pad_len = 8 - len(data) % 8
+        pad_len = block - len(data) % block
         datas = [data, b'\x80', b'\x00' * (pad_len - 1)]
         return b''.join(datas)
     else:
@@ -41,25 +267,21 @@ def _rm_padding(data, pad):
 
 def tdes_cbc_enc(key, data, iv=DEFAULT_IV, pad=PAD_NONE) -> bytes:
     data = _add_padding(data, pad)
-    tdes = pyDes.triple_des(key, mode=pyDes.CBC, IV=iv)
-    return tdes.encrypt(data)
+    return get_provider().encrypt(key, data, iv)
 
 
 def tdes_cbc_dec(key, data, iv=DEFAULT_IV, pad=PAD_NONE) -> bytes:
-    tdes = pyDes.triple_des(key, mode=pyDes.CBC, IV=iv)
-    ret = tdes.decrypt(data)
+    ret = get_provider().decrypt(key, data, iv)
     return _rm_padding(ret, pad)
 
 
 def tdes_ecb_enc(key, data, pad=PAD_NONE) -> bytes:
     data = _add_padding(data, pad)
-    tdes = pyDes.triple_des(key, mode=pyDes.ECB)
-    return tdes.encrypt(data)
+    return get_provider().encrypt(key, data)
 
 
 def tdes_ecb_dec(key, data, pad=PAD_NONE) -> bytes:
-    tdes = pyDes.triple_des(key, mode=pyDes.ECB)
-    ret = tdes.decrypt(data)
+    ret = get_provider().decrypt(key, data)
     return _rm_padding(ret, pad)
 
 
@@ -77,25 +299,21 @@ def tdes_mac_9797m2_alg3(key, data, iv=DEFAULT_IV) -> bytes:
 
 def des_cbc_enc(key, data, iv=DEFAULT_IV, pad=PAD_NONE) -> bytes:
     data = _add_padding(data, pad)
-    tdes = pyDes.des(key, mode=pyDes.CBC, IV=iv)
-    return tdes.encrypt(data)
+    return get_provider().encrypt(key, data, iv, triple=False)
 
 
 def des_cbc_dec(key, data, iv=DEFAULT_IV, pad=PAD_NONE) -> bytes:
-    tdes = pyDes.des(key, mode=pyDes.CBC, IV=iv)
-    ret = tdes.decrypt(data)
+    ret = get_provider().decrypt(key, data, iv, triple=False)
     return _rm_padding(ret, pad)
 
 
 def des_ecb_enc(key, data, pad=PAD_NONE) -> bytes:
     data = _add_padding(data, pad)
-    tdes = pyDes.des(key, mode=pyDes.ECB)
-    return tdes.encrypt(data)
+    return get_provider().encrypt(key, data, triple=False)
 
 
 def des_ecb_dec(key, data, pad=PAD_NONE) -> bytes:
-    tdes = pyDes.des(key, mode=pyDes.ECB)
-    ret = tdes.decrypt(data)
+    ret = get_provider().decrypt(key, data, triple=False)
     return _rm_padding(ret, pad)
 
 
@@ -103,7 +321,56 @@ def des_mac(key, data, iv=DEFAULT_IV, pad=PAD_NONE) -> bytes:
     return des_cbc_enc(key, data, iv, pad)[-8:]
 
 
+def aes_cbc_enc(key, data, iv=DEFAULT_AES_IV, pad=PAD_NONE) -> bytes:
+    data = _add_padding(data, pad, 16)
+    return get_provider().aes_encrypt(key, data, iv)
+
+
+def aes_cbc_dec(key, data, iv=DEFAULT_AES_IV, pad=PAD_NONE) -> bytes:
+    ret = get_provider().aes_decrypt(key, data, iv)
+    return _rm_padding(ret, pad)
+
+
+def aes_ecb_enc(key, data, pad=PAD_NONE) -> bytes:
+    data = _add_padding(data, pad, 16)
+    return get_provider().aes_encrypt(key, data)
+
+
+def aes_ecb_dec(key, data, pad=PAD_NONE) -> bytes:
+    ret = get_provider().aes_decrypt(key, data)
+    return _rm_padding(ret, pad)
+
+
+def _cmac_subkey(val):
+    # doubling in GF(2^128)
+    n = int.from_bytes(val, "big") << 1
+    if n >> 128:
+        n = (n & ((1 << 128) - 1)) ^ 0x87
+    return n.to_bytes(16, "big")
+
+
+def aes_cmac(key, data) -> bytes:
+    """
+    AES-CMAC (NIST SP 800-38B) of `data`, 16 bytes.
+    """
+    k1 = _cmac_subkey(aes_ecb_enc(key, DEFAULT_AES_IV))
+    if data and len(data) % 16 == 0:
+        head, last, subkey = data[:-16], data[-16:], k1
+    else:
+        n = len(data) // 16 * 16
+        head, subkey = data[:n], _cmac_subkey(k1)
+        last = _add_padding(data[n:], PAD_9797M2, 16)
+    last = (int.from_bytes(last, "big") ^
+            int.from_bytes(subkey, "big")).to_bytes(16, "big")
+    return aes_cbc_enc(key, head + last)[-16:]
+
+
 __all__ = [
+    "CryptoProvider",
+    "PyDesProvider",
+    "OpenSSLProvider",
+    "set_provider",
+    "get_provider",
     "tdes_cbc_enc",
     "tdes_cbc_dec",
     "tdes_ecb_enc",
@@ -115,6 +382,11 @@ __all__ = [
     "tdes_mac",
     "tdes_mac_9797m2_alg3",
     "des_mac",
+    "aes_cbc_enc",
+    "aes_cbc_dec",
+    "aes_ecb_enc",
+    "aes_ecb_dec",
+    "aes_cmac",
     "PAD_NONE",
     "PAD_9797M2",
-]
\ No newline at end of file
+]
@@ -9,8 +9,14 @@ import struct
 class CmdAPDU:
     """
     Command APDU.
+
+    The fields are kept in one bytearray, CLA INS P1 P2 LC DATA LE, with the
+    lengths of LC and LE, so serializing it is a single copy and the header
+    bytes are patched in place.
     """
 
+    __slots__ = ("__buf", "__lc_len", "__le_len")
+
     CASE1 = 1
     CASE2 = 2
     CASE3 = 3
@@ -21,14 +27,14 @@ class CmdAPDU:
 
     def __init__(self, val=None):
         if val is None:
-            self.__fields = [
-                b"\x00", b"\x00", b"\x00", b"\x00", b"", b"", b"\x00"
-            ]
+            self.__buf = bytearray(b"\x00\x00\x00\x00\x00")
+            self.__lc_len = 0
+            self.__le_len = 1
         elif isinstance(val, CmdAPDU):
-            self.__fields = [
-                val.cla, val.ins, val.p1, val.p2, val.lc, val.data, val.le
-            ]
-        elif isinstance(val, bytes):
+            self.__buf = bytearray(val.__buf)
+            self.__lc_len = val.__lc_len
+            self.__le_len = val.__le_len
+        elif isinstance(val, (bytes, bytearray)):
             self.__parse(val)
         elif isinstance(val, str):
             self.__parse(bytes.fromhex(val))
@@ -41,43 +47,37 @@ class CmdAPDU:
             raise ValueError(
                 "The length of command apdu bytes must be larger than 4.")
 
-        self.__fields = [
-            apdu[0:1], apdu[1:2], apdu[2:3], apdu[3:4], b"", b"", b""
-        ]
-
+        self.__buf = bytearray(apdu)
         if data_len == 4:  # case 1
-            pass
+            self.__lc_len, self.__le_len = 0, 0
         elif data_len == 5:  # case 2
-            self.__fields[6] = apdu[4:5]
+            self.__lc_len, self.__le_len = 0, 1
         elif apdu[4] != 0 and (apdu[4]) + 5 == data_len:  # case 3
-            self.__fields[4] = apdu[4:5]
-            self.__fields[5] = apdu[5:]
+            self.__lc_len, self.__le_len = 1, 0
         elif apdu[4] != 0 and (apdu[4]) + 6 == data_len:  # case 4
-            self.__fields[4] = apdu[4:5]
-            self.__fields[5] = apdu[5:-1]
-            self.__fields[6] = apdu[-1:]
+            self.__lc_len, self.__le_len = 1, 1
         elif apdu[4] == 0 and data_len == 7:  # case 2E
-            self.__fields[6] = apdu[-2:]
+            # P3 00 is not kept, see `__bytes__`
+            del self.__buf[4]
+            self.__lc_len, self.__le_len = 0, 2
         # case 3E
         elif data_len > 7 and apdu[4] == 0 and (apdu[5]) * 256 + (
                 apdu[6]) + 7 == data_len:
-            self.__fields[4] = apdu[4:7]
-            self.__fields[5] = apdu[7:]
+            self.__lc_len, self.__le_len = 3, 0
         # case 4E
         elif data_len > 9 and apdu[4] == 0 and (apdu[5]) * 256 + (
                 apdu[6]) + 9 == data_len:
-            self.__fields[4] = apdu[4:7]
-            self.__fields[5] = apdu[7:-2]
-            self.__fields[6] = apdu[-2:]
+            self.__lc_len, self.__le_len = 3, 2
         else:
             raise ValueError("The command apdu is not correct.")
 
     def __bytes__(self):
-        if not self.lc and len(self.le) == 2:
+        if not self.__lc_len and self.__le_len == 2:
             # for CASE2E, P3 should be 00 to indicate extended APDU
-            return b''.join(self.__fields[0:4] + [b"\x00"] + self.__fields[5:])
+            buf = self.__buf
+            return bytes(buf[:4]) + b"\x00" + bytes(buf[4:])
         else:
-            return b''.join(self.__fields)
+            return bytes(self.__buf)
 
     def __str__(self):
         return bytes(self).hex()
@@ -100,8 +100,8 @@ class CmdAPDU:
         """
         The case of APDU, read only property.
         """
-        lc = self.lc
-        le = self.le
+        lc = self.__lc_len
+        le = self.__le_len
         if not self.is_extended():
             if not lc and not le:
                 return self.CASE1
@@ -125,26 +125,32 @@ class CmdAPDU:
         if isinstance(val, bytes):
             if len(val) != 1:
                 raise ValueError("Length of `%s` is not correct." % name)
-            self.__fields[i] = val
+            self.__buf[i] = val[0]
         elif isinstance(val, str):
             val = bytes.fromhex(val)
             if len(val) != 1:
                 raise ValueError("Length of `%s` is not correct." % name)
-            self.__fields[i] = val
+            self.__buf[i] = val[0]
         elif isinstance(val, int):
             if val < 0 or val > 255:
                 raise ValueError("`%s` must in range 0 ~ 255" % name)
-            self.__fields[i] = bytes([val])
+            self.__buf[i] = val
         else:
             raise TypeError(
                 "Type of `%s` must be `bytes`, `str` or `int`" % name)
 
+    def __set(self, lc, data, le):
+        buf = self.__buf
+        buf[4:] = lc + data + le
+        self.__lc_len = len(lc)
+        self.__le_len = len(le)
+
     @property
     def cla(self):
         """
         Getter for CLA of APDU.
         """
-        return self.__fields[0]
+        return bytes(self.__buf[0:1])
 
     @cla.setter
     def cla(self, cla):
@@ -158,7 +164,7 @@ class CmdAPDU:
         """
         Getter for INS of APDU.
         """
-        return self.__fields[1]
+        return bytes(self.__buf[1:2])
 
     @ins.setter
     def ins(self, ins):
@@ -172,7 +178,7 @@ class CmdAPDU:
         """
         Getter for P1 of APDU.
         """
-        return self.__fields[2]
+        return bytes(self.__buf[2:3])
 
     @p1.setter
     def p1(self, p1):
@@ -186,7 +192,7 @@ class CmdAPDU:
         """
         Getter for P2 of APDU.
         """
-        return self.__fields[3]
+        return bytes(self.__buf[3:4])
 
     @p2.setter
     def p2(self, p2):
@@ -200,14 +206,15 @@ class CmdAPDU:
         """
         Getter for LC of APDU. LC is changed when data field of APDU changed.
         """
-        return self.__fields[4]
+        return bytes(self.__buf[4:4 + self.__lc_len])
 
     @property
     def data(self):
         """
         Getter for data field of APDU.
         """
-        return self.__fields[5]
+        return bytes(self.__buf[4 + self.__lc_len:len(self.__buf) -
+                                self.__le_len])
 
     @data.setter
     def data(self, data):
@@ -218,24 +225,26 @@ class CmdAPDU:
             data = bytes.fromhex(data)
         if not isinstance(data, bytes):
             raise TypeError("Type of `data` must be `bytes` or `str`")
-        self.__fields[5] = data
+        le = self.le
         data_len = len(data)
         if len(data) == 0:
-            self.__fields[4] = b""  # lc
+            lc = b""
         else:
-            if len(self.le) == 2 or data_len > 255:  # extended apdu
-                self.__fields[4] = struct.pack(">BH", 0, data_len)
-                if len(self.le) == 1:
-                    self.__fields[6] = b"\x00" + self.__fields[6]
+            if len(le) == 2 or data_len > 255:  # extended apdu
+                lc = struct.pack(">BH", 0, data_len)
+                if len(le) == 1:
+                    le = b"\x00" + le
             else:
-                self.__fields[4] = bytes([data_len])
+                lc = bytes([data_len])
+        self.__set(lc, data, le)
 
     @property
     def le(self):
         """
         Getter for LE of APDU.
         """
-        return self.__fields[6]
+        buf = self.__buf
+        return bytes(buf[len(buf) - self.__le_len:])
 
     @le.setter
     def le(self, le):
@@ -252,26 +261,35 @@ class CmdAPDU:
             if le < 0 or le > 65536:
                 raise ValueError("`le` must be in range 0 ~ 65536")
             if le == 0:
-                le = ""
+                le = b""
             elif le <= 256:
                 le = bytes([le & 0xff])
             else:
                 le = struct.pack(">H", le)
         else:
             raise TypeError("Type of `le` must be `str` or `int`.")
-        if len(le) == 2 and len(self.lc) == 1:
-            self.__fields[4] = b"\x00\x00" + self.__fields[4]
-            self.__fields[6] = le
-        elif len(le) == 1 and len(self.lc) == 3:
-            self.__fields[6] = b"\x00" + le
+        lc, data = self.lc, self.data
+        if len(le) == 2 and len(lc) == 1:
+            self.__set(b"\x00\x00" + lc, data, le)
+        elif len(le) == 1 and len(lc) == 3:
+            self.__set(lc, data, b"\x00" + le)
         else:
-            self.__fields[6] = le
+            self.__set(lc, data, le)
 
     def is_extended(self):
         """
         Is this APDU extended APDU.
         """
-        return len(self.lc) > 1 or len(self.le) > 1
+        return self.__lc_len > 1 or self.__le_len > 1
+
+
+def compile_apdu(val) -> bytes:
+    """
+    Check a command APDU given as hex string, bytes or CmdAPDU once, and
+    return the bytes to send, so actions sending it every round neither
+    parse nor allocate.
+    """
+    return bytes(CmdAPDU(val))
 
 
 class RspAPDU:
@@ -279,7 +297,7 @@ class RspAPDU:
     Response APDU.
     """
 
-    def __init__(self, val=b"\x90\x00", time=0.0):
+    def __init__(self, val=b"\x90\x00", time=0.0, hops=None, overhead=0.0):
         if isinstance(val, str):
             val = bytes.fromhex(val)
         if not isinstance(val, bytes):
@@ -290,6 +308,8 @@ class RspAPDU:
 
         self.__val = val
         self.__time = time
+        self.__hops = (time, ) if hops is None else tuple(hops)
+        self.__overhead = overhead
 
     @property
     def data(self):
@@ -326,6 +346,22 @@ class RspAPDU:
         """
         return self.__time
 
+    @property
+    def hops(self):
+        """
+        Time of each exchange with the card, more than one if the response
+        was got with GET RESPONSE under T=0.
+        """
+        return self.__hops
+
+    @property
+    def overhead(self):
+        """
+        Time of the exchanges only needed by the T=0 protocol, included in
+        `time`.
+        """
+        return self.__overhead
+
     def __bytes__(self):
         return self.__val
 
@@ -420,6 +456,7 @@ class RspError(Exception):
 
 __all__ = [
     'CmdAPDU',
+    'compile_apdu',
     'RspAPDU',
     'AID',
     'RspError',
@@ -1,17 +1,37 @@
 #coding:utf-8
 
 from abc import ABC, abstractmethod
+from collections import deque
+import math
 import struct
+import time
 import logging
 log = logging.getLogger("libsc")
 
 from .base import *
-from .reader import Reader
+from .reader import Reader, ReaderError
 from .algo import *
 from .javacard import *
 
-C_MAC = 1
-C_ENCRYPT_MAC = 3
+# secure levels, the P1 of EXTERNAL AUTHENTICATE
+C_MAC = 0x01
+C_ENCRYPT_MAC = 0x03
+R_MAC = 0x10
+R_ENCRYPT_MAC = 0x30
+
+# host challenge of INITIALIZE UPDATE
+_HOST_CHALLENGE = bytes.fromhex("1122334455667788")
+
+_DEFAULT_KEYSETS = {
+    0xff: (
+        # key ENC
+        bytes.fromhex("404142434445464748494A4B4C4D4E4F"),
+        # key MAC
+        bytes.fromhex("404142434445464748494A4B4C4D4E4F"),
+        # key DEK
+        bytes.fromhex("404142434445464748494A4B4C4D4E4F"),
+    )
+}
 
 
 class SecureChannelError(Exception):
@@ -39,6 +59,15 @@ class SecureChannel(ABC):
     def wrap(self, apdu):
         pass
 
+    def wrap_many(self, apdus):
+        """
+        Wrap a sequence of command APDUs before sending any of them. The MAC
+        chaining only depends on the commands, so all the crypto of a CAP
+        load is done up front instead of between transmissions. The
+        responses must be unwrapped in the same order.
+        """
+        return [self.wrap(apdu) for apdu in apdus]
+
     @abstractmethod
     def unwrap(self, rsp):
         pass
@@ -52,21 +81,20 @@ class SecureChannel(ABC):
         pass
 
 
+def _has_rmac(rsp):
+    # no R-MAC is appended to an error status
+    return len(rsp.data) >= 8 and rsp.sw1 in (b"\x90", b"\x62", b"\x63")
+
+
 class SCP02I55(SecureChannel):
     def __init__(self, secure_level=0, keysets=None):
-        if secure_level not in [0, C_MAC, C_ENCRYPT_MAC]:
+        if secure_level not in [
+                0, C_MAC, C_ENCRYPT_MAC, R_MAC, C_MAC | R_MAC,
+                C_ENCRYPT_MAC | R_MAC
+        ]:
             raise ValueError(secure_level)
         if keysets is None:
-            keysets = {
-                0xff: (
-                    # key ENC
-                    bytes.fromhex("404142434445464748494A4B4C4D4E4F"),
-                    # key MAC
-                    bytes.fromhex("404142434445464748494A4B4C4D4E4F"),
-                    # key DEK
-                    bytes.fromhex("404142434445464748494A4B4C4D4E4F"),
-                )
-            }
+            keysets = _DEFAULT_KEYSETS
         self.__keysets = keysets
         self.__secure_level = secure_level
         self.__reset()
@@ -74,6 +102,9 @@ class SCP02I55(SecureChannel):
     def __reset(self):
         self.__session_keys = None
         self.__apdu_mac = None
+        self.__rmac_icv = b"\x00" * 8
+        # R-MAC input of the commands whose response is not unwrapped yet
+        self.__pending = deque()
         self.__is_secure = False
 
     def __gen_session_key(self, constant, seq_counter, static_key):
@@ -93,10 +124,13 @@ class SCP02I55(SecureChannel):
             self.__gen_session_key(b"\x01\x01", seq_counter, keyset[1]))
         self.__session_keys.append(
             self.__gen_session_key(b"\x01\x81", seq_counter, keyset[2]))
+        self.__session_keys.append(
+            self.__gen_session_key(b"\x01\x02", seq_counter, keyset[1]))
 
         log.debug(f"session key (ENC): {self.__session_keys[0].hex()}")
         log.debug(f"session key (MAC): {self.__session_keys[1].hex()}")
         log.debug(f"session key (DEK): {self.__session_keys[2].hex()}")
+        log.debug(f"session key (R-MAC): {self.__session_keys[3].hex()}")
 
     def __gen_card_cryptogram(self, seq_counter, card_challenge,
                               host_challenge):
@@ -128,7 +162,7 @@ class SCP02I55(SecureChannel):
         else:
             temp_icv = des_ecb_enc(self.__session_keys[1][:8], self.__apdu_mac)
 
-        if len(apdu.data) + 8 > 255:
+        if len(apdu.data) + 8 > 65535:
             raise ValueError(
                 f"data field of apdu is too long to add MAC: {apdu}")
 
@@ -146,17 +180,32 @@ class SCP02I55(SecureChannel):
         return new_apdu
 
     def __encrypt_apdu(self, apdu: CmdAPDU):
+        """
+        Encrypt the data field of a MACed APDU, the MAC is computed on the
+        plain data so it is kept as is.
+        """
         assert isinstance(apdu, CmdAPDU)
-        pass
+        data, mac = apdu.data[:-8], apdu.data[-8:]
+        if not data:
+            return apdu
+        data = tdes_cbc_enc(self.__session_keys[0], data, pad=PAD_9797M2)
+        if len(data) + 8 > 65535:
+            raise ValueError(
+                f"data field of apdu is too long to encrypt: {apdu}")
+
+        new_apdu = CmdAPDU(apdu)
+        new_apdu.data = data + mac
+        return new_apdu
 
     def init_secure_channel(self, reader: Reader):
-        apdu = CmdAPDU("80500000081122334455667788")
+        apdu = CmdAPDU("8050000000")
+        apdu.data = _HOST_CHALLENGE
         rsp = reader.transmit(apdu)
         self.external_auth(reader, apdu, rsp)
 
     def external_auth(self, reader: Reader, prev_apdu: CmdAPDU,
                       prev_rsp: RspAPDU):
-        if prev_apdu.ins != b"\x80" and len(prev_apdu.data) != 8:
+        if prev_apdu.ins != b"\x50" or len(prev_apdu.data) != 8:
             raise SecureChannelError("Command APDU of Init-Update error.")
         if prev_rsp.sw != b'\x90\x00' or len(prev_rsp.data) != 28:
             raise SecureChannelError("Response of Init-Update error.")
@@ -210,20 +259,35 @@ class SCP02I55(SecureChannel):
     def wrap(self, apdu):
         if not self.is_secure():
             raise SecureChannelError("Secure channel is not established.")
-        if self.get_secure_level() == 0:
-            return apdu
-        elif self.get_secure_level() == C_MAC:
+        level = self.get_secure_level()
+        if level & R_MAC:
+            # the R-MAC covers the command without secure messaging
+            self.__pending.append(
+                b''.join([apdu.cla, apdu.ins, apdu.p1, apdu.p2,
+                          apdu.lc or b"\x00", apdu.data]))
+        if level & C_ENCRYPT_MAC == C_ENCRYPT_MAC:
+            return self.__encrypt_apdu(self.__add_apdu_mac(apdu))
+        elif level & C_MAC:
             return self.__add_apdu_mac(apdu)
-        else:
-            assert self.get_secure_level() == C_ENCRYPT_MAC
-            # TODO: implement me
-            pass
+        return apdu
 
     def unwrap(self, rsp):
         if not self.is_secure():
             raise SecureChannelError("Secure channel is not established.")
-        # do not need to do anything for SCP02 i=55
-        return rsp
+        if not self.get_secure_level() & R_MAC:
+            return rsp
+        command = self.__pending.popleft()
+        if not _has_rmac(rsp):
+            return rsp
+
+        data, mac = rsp.data[:-8], rsp.data[-8:]
+        bs = command + bytes([len(data)]) + data + rsp.sw
+        r_mac = tdes_mac_9797m2_alg3(self.__session_keys[3], bs,
+                                     self.__rmac_icv)
+        if r_mac != mac:
+            raise SecureChannelError("R-MAC of response error.")
+        self.__rmac_icv = r_mac
+        return RspAPDU(data + rsp.sw, rsp.time)
 
     def encrypt_data(self, data):
         if not self.is_secure():
@@ -238,13 +302,292 @@ class SCP02I55(SecureChannel):
         return tdes_ecb_dec(self.__session_keys[2], data)
 
 
+class SCP03(SecureChannel):
+    """
+    SCP03 (GlobalPlatform Amendment D) with AES keys of 16, 24 or 32 bytes.
+    """
+
+    def __init__(self, secure_level=0, keysets=None):
+        if secure_level not in [
+                0, C_MAC, C_ENCRYPT_MAC, C_MAC | R_MAC, C_ENCRYPT_MAC | R_MAC,
+                C_ENCRYPT_MAC | R_ENCRYPT_MAC
+        ]:
+            raise ValueError(secure_level)
+        if keysets is None:
+            keysets = _DEFAULT_KEYSETS
+        self.__keysets = keysets
+        self.__secure_level = secure_level
+        self.__reset()
+
+    def __reset(self):
+        self.__keyset = None
+        self.__session_keys = None
+        self.__mac_chain = b"\x00" * 16
+        self.__counter = 0
+        # MAC chaining value and counter of the commands whose response is
+        # not unwrapped yet
+        self.__pending = deque()
+        self.__is_secure = False
+
+    def __derive(self, key, constant, context, bits):
+        """
+        KDF in counter mode of NIST SP 800-108 with AES-CMAC.
+        """
+        out = []
+        for i in range(1, (bits + 127) // 128 + 1):
+            data = b''.join([
+                b"\x00" * 11,
+                bytes([constant, 0]),
+                bits.to_bytes(2, "big"),
+                bytes([i]),
+                context,
+            ])
+            out.append(aes_cmac(key, data))
+        return b''.join(out)[:bits // 8]
+
+    def init_secure_channel(self, reader: Reader):
+        apdu = CmdAPDU("8050000000")
+        apdu.data = _HOST_CHALLENGE
+        rsp = reader.transmit(apdu)
+        self.external_auth(reader, apdu, rsp)
+
+    def external_auth(self, reader: Reader, prev_apdu: CmdAPDU,
+                      prev_rsp: RspAPDU):
+        if prev_apdu.ins != b"\x50" or len(prev_apdu.data) != 8:
+            raise SecureChannelError("Command APDU of Init-Update error.")
+        if prev_rsp.sw != b'\x90\x00' or len(prev_rsp.data) not in (29, 32):
+            raise SecureChannelError("Response of Init-Update error.")
+
+        self.__reset()
+        data = prev_rsp.data
+
+        key_version = data[10]
+        scp_version = data[11]
+        if scp_version != 3:
+            raise SecureChannelError("SCP03 not supported in card!")
+        card_challenge = data[13:21]
+        card_cryptogram1 = data[21:29]
+        host_challenge = prev_apdu.data
+        context = host_challenge + card_challenge
+
+        log.debug(f"keyset version is {key_version:02x}")
+        log.debug(f"card challenge is {card_challenge.hex()}")
+        log.debug(f"host challenge is {host_challenge.hex()}")
+        log.debug(f"card cryptogram received: {card_cryptogram1.hex()}")
+
+        keyset = self.__keysets.get(key_version)
+        if keyset is None:
+            raise SecureChannelError(
+                f"key version {key_version:02x} is not defined!")
+        self.__keyset = keyset
+        bits = len(keyset[0]) * 8
+        # S-ENC, S-MAC and S-RMAC
+        self.__session_keys = [
+            self.__derive(keyset[0], 0x04, context, bits),
+            self.__derive(keyset[1], 0x06, context, bits),
+            self.__derive(keyset[1], 0x07, context, bits),
+        ]
+        log.debug(f"session key (ENC): {self.__session_keys[0].hex()}")
+        log.debug(f"session key (MAC): {self.__session_keys[1].hex()}")
+        log.debug(f"session key (R-MAC): {self.__session_keys[2].hex()}")
+
+        card_cryptogram = self.__derive(self.__session_keys[1], 0x00, context,
+                                        64)
+        log.debug(f"card cryptogram: {card_cryptogram.hex()}")
+        if card_cryptogram != card_cryptogram1:
+            raise SecureChannelError("Card cryptogram error.")
+        host_cryptogram = self.__derive(self.__session_keys[1], 0x01, context,
+                                        64)
+        log.debug(f"host cryptogram: {host_cryptogram.hex()}")
+
+        apdu = CmdAPDU("84820000")
+        apdu.p1 = self.__secure_level
+        apdu.data = host_cryptogram
+        apdu = self.__add_apdu_mac(apdu)
+
+        rsp = reader.transmit(apdu)
+        if rsp.sw != b"\x90\x00":
+            raise SecureChannelError("External Authenticate failed.")
+
+        self.__is_secure = True
+
+    def __add_apdu_mac(self, apdu: CmdAPDU):
+        if len(apdu.data) + 8 > 65535:
+            raise ValueError(
+                f"data field of apdu is too long to add MAC: {apdu}")
+
+        new_apdu = CmdAPDU(apdu)
+        new_apdu.cla = apdu.cla[0] | 0x04  # add secure message bit
+        new_apdu.data += b"\x00" * 8  # this makes LC correct
+        new_apdu.le = b""  # remove LE
+        bs = bytes(new_apdu)[:-8]  # remove last 8 zeros
+
+        self.__mac_chain = aes_cmac(self.__session_keys[1],
+                                    self.__mac_chain + bs)
+        new_apdu.data = new_apdu.data[:-8] + self.__mac_chain[:8]
+        return new_apdu
+
+    def __icv(self):
+        return aes_ecb_enc(self.__session_keys[0],
+                           self.__counter.to_bytes(16, "big"))
+
+    def is_secure(self):
+        return self.__is_secure
+
+    def get_secure_level(self):
+        return self.__secure_level
+
+    def wrap(self, apdu):
+        if not self.is_secure():
+            raise SecureChannelError("Secure channel is not established.")
+        level = self.get_secure_level()
+        if level == 0:
+            return apdu
+
+        # the counter counts the commands of the session
+        self.__counter += 1
+        if level & C_ENCRYPT_MAC == C_ENCRYPT_MAC and apdu.data:
+            apdu = CmdAPDU(apdu)
+            apdu.data = aes_cbc_enc(self.__session_keys[0], apdu.data,
+                                    self.__icv(), PAD_9797M2)
+        apdu = self.__add_apdu_mac(apdu)
+        if level & R_MAC:
+            self.__pending.append((self.__mac_chain, self.__counter))
+        return apdu
+
+    def unwrap(self, rsp):
+        if not self.is_secure():
+            raise SecureChannelError("Secure channel is not established.")
+        level = self.get_secure_level()
+        if not level & R_MAC:
+            return rsp
+        mac_chain, counter = self.__pending.popleft()
+        if not _has_rmac(rsp):
+            return rsp
+
+        data, mac = rsp.data[:-8], rsp.data[-8:]
+        r_mac = aes_cmac(self.__session_keys[2], mac_chain + data + rsp.sw)
+        if r_mac[:8] != mac:
+            raise SecureChannelError("R-MAC of response error.")
+        if level & R_ENCRYPT_MAC == R_ENCRYPT_MAC and data:
+            icv = aes_ecb_enc(self.__session_keys[0],
+                              b"\x80" + counter.to_bytes(15, "big"))
+            data = aes_cbc_dec(self.__session_keys[0], data, icv, PAD_9797M2)
+        return RspAPDU(data + rsp.sw, rsp.time)
+
+    def encrypt_data(self, data):
+        if not self.is_secure():
+            raise SecureChannelError("Secure channel is not established.")
+
+        return aes_cbc_enc(self.__keyset[2], data)
+
+    def decrypt_data(self, data):
+        if not self.is_secure():
+            raise SecureChannelError("Secure channel is not established.")
+
+        return aes_cbc_dec(self.__keyset[2], data)
+
+
+def _historical_bytes(atr):
+    if len(atr) < 2:
+        return b""
+    y, k = atr[1] >> 4, atr[1] & 0x0f
+    i = 2
+    while y:
+        # TA, TB, TC, TD present as bits 1 to 4 of Y
+        td = i + bin(y & 0x07).count("1")
+        i += bin(y).count("1")
+        if i > len(atr):
+            return b""
+        y = atr[td] >> 4 if y & 0x08 else 0
+    return atr[i:i + k]
+
+
+def _extended_length(atr):
+    """
+    Whether the card capabilities in the historical bytes of `atr` announce
+    extended Lc and Le fields (ISO 7816-4, 8.1.1.2.7).
+    """
+    hist = _historical_bytes(atr)
+    if hist[:1] == b"\x80":
+        objects = hist[1:]
+    elif hist[:1] == b"\x00":
+        # the last 3 bytes are the status indicator
+        objects = hist[1:-3]
+    else:
+        return False
+    i = 0
+    while i < len(objects):
+        tag, n = objects[i] >> 4, objects[i] & 0x0f
+        if tag == 0x07 and n >= 3 and i + 3 < len(objects):
+            return bool(objects[i + 3] & 0x40)
+        i += 1 + n
+    return False
+
+
+def _max_command(data):
+    """
+    Maximum command APDU size from the extended length information (7F66),
+    None if `data` is not one.
+    """
+    if data[:2] != b"\x7f\x66" or len(data) < 4:
+        return None
+    i = 3 if data[2] < 0x80 else 3 + (data[2] & 0x7f)
+    # the first INTEGER is for commands, the second for responses
+    if data[i:i + 1] != b"\x02":
+        return None
+    n = data[i + 1]
+    return int.from_bytes(data[i + 2:i + 2 + n], "big") or None
+
+
+class LoadStats:
+    """
+    Timing of a CAP load: the response time of every command, INSTALL [for
+    load] first, and the elapsed time from sending the first command to the
+    last response.
+    """
+
+    def __init__(self, size, block_size, times, elapsed):
+        self.size = size
+        self.block_size = block_size
+        self.times = times
+        self.elapsed = elapsed
+
+    @property
+    def blocks(self):
+        return len(self.times) - 1
+
+    @property
+    def throughput(self):
+        """
+        Bytes of the load file per second.
+        """
+        return self.size / self.elapsed if self.elapsed > 0 else math.inf
+
+    def __repr__(self):
+        return (f"LoadStats({self.size} bytes, {self.blocks} blocks of "
+                f"{self.block_size}, {self.elapsed * 1000:.02f} ms)")
+
+
+# secure channel protocol of INITIALIZE UPDATE response -> class
+_PROTOCOLS = {
+    2: SCP02I55,
+    3: SCP03,
+}
+
+
 class SecurityDomain:
-    def __init__(self, reader: Reader, sd_aid=b""):
+    def __init__(self, reader: Reader, sd_aid=b"", secure_level=C_MAC,
+                 keysets=None):
         if not isinstance(reader, Reader):
             raise TypeError(reader)
         self.__reader = reader
         self.__sd_aid = sd_aid
+        self.__secure_level = secure_level
+        self.__keysets = keysets
         self.__sc = None
+        # largest data field of a command, known once the SD is selected
+        self.__max_data = None
 
     def select(self, aid=b""):
         if isinstance(aid, str):
@@ -265,16 +608,123 @@ class SecurityDomain:
         if reset_reader:
             self.__reader.reset()
 
-    def prepare(self, secure_level=C_MAC):
-        self.__sc = SCP02I55(secure_level)
+    def is_prepared(self):
+        return self.__sc is not None
+
+    def prepare(self, secure_level=None):
+        """
+        Open a secure channel, SCP02 or SCP03 as the card answers to
+        INITIALIZE UPDATE.
+        """
+        if secure_level is None:
+            secure_level = self.__secure_level
+        self.__sc = None
         rsp = self.select(self.__sd_aid)
         if rsp.sw != b'\x90\x00':
             raise RspError(f"select {bytes(self.__sd_aid).hex()} failed.")
-        self.__sc.init_secure_channel(self.__reader)
+        if self.__max_data is None:
+            self.__max_data = self.__get_max_data()
 
-    def load_cap(self, cap_file):
+        apdu = CmdAPDU("8050000000")
+        apdu.data = _HOST_CHALLENGE
+        rsp = self.__reader.transmit(apdu)
+        scp_version = rsp.data[11] if len(rsp.data) > 11 else None
+        cls = _PROTOCOLS.get(scp_version)
+        if cls is None:
+            raise SecureChannelError(
+                f"secure channel protocol {scp_version} not supported.")
+        log.debug(f"open SCP{scp_version:02d} channel, level {secure_level:02x}")
+        sc = cls(secure_level, self.__keysets)
+        sc.external_auth(self.__reader, apdu, rsp)
+        self.__sc = sc
+
+    def __get_max_data(self):
+        """
+        Extended APDUs are used under T=1 when the ATR announces them, up to
+        the command size the card gives in its extended length information.
+        """
+        reader = self.__reader
+        try:
+            extended = (reader.get_protocol() == "T=1"
+                        and _extended_length(reader.get_atr()))
+        except ReaderError:
+            extended = False
+        if extended:
+            rsp = reader.transmit(CmdAPDU("00CA7F6600"))
+            max_command = _max_command(rsp.data)
+            if rsp.sw == b"\x90\x00" and max_command:
+                # header and 3 bytes Lc
+                max_data = min(max_command - 7, 65535)
+                log.debug(f"extended APDU, max data field: {max_data}")
+                if max_data > 255:
+                    return max_data
+        return 255
+
+    def load_block_size(self):
+        """
+        Largest block of the load file a LOAD command can carry with the C-MAC
+        and the padding of C-ENC.
+        """
+        level = self.__sc.get_secure_level() if self.__sc else \
+            self.__secure_level
+        size = self.__max_data or 255
+        if level & C_MAC:
+            size -= 8
+        if level & C_ENCRYPT_MAC == C_ENCRYPT_MAC:
+            # padding adds 1 to 16 bytes
+            size = size // 16 * 16 - 1
+        return size
+
+    def __wrap(self, apdus):
+        try:
+            return [bytes(apdu) for apdu in self.__sc.wrap_many(apdus)]
+        except Exception:
+            self.__sc = None
+            raise
+
+    def __transmit(self, apdus, error):
+        """
+        Send wrapped `apdus` in the secure channel, return the responses.
+
+        The channel is dropped, and opened again by the next command, when
+        the card may have closed it or the MAC chain is broken: on a
+        transmission failure, a security error status (69xx) or an error
+        before the last command.
+        """
+        sc = self.__sc
+        transmit = self.__reader.transmit
+        rsps = []
+        try:
+            for apdu in apdus:
+                rsp = sc.unwrap(transmit(apdu))
+                rsps.append(rsp)
+                if rsp.sw != b'\x90\x00':
+                    break
+        except Exception:
+            self.__sc = None
+            raise
+        if rsp.sw != b'\x90\x00':
+            if rsp.sw[:1] == b'\x69' or len(rsps) < len(apdus):
+                self.__sc = None
+            raise RspError(f"{error} Command {len(rsps)} of {len(apdus)}, "
+                           f"SW {rsp.sw.hex()}.")
+        return rsps
+
+    def __send(self, apdus, error):
+        """
+        Wrap all `apdus` first, so no crypto is done between transmissions,
+        then send them in the secure channel and return the last response.
+        """
+        return self.__transmit(self.__wrap(apdus), error)[-1]
+
+    def load_cap(self, cap_file, block_size=None):
+        """
+        Load a CAP file in blocks of `block_size`, by default the largest
+        the card takes, return the LoadStats. Every command is wrapped before
+        the first is sent, so the elapsed time is the time of the transfer.
+        """
         if isinstance(cap_file, str):
-            cap = CapFile(cap_file)
+            cap = open_cap(cap_file)
         elif isinstance(cap_file, CapFile):
             cap = cap_file
         else:
@@ -304,20 +754,22 @@ class SecurityDomain:
         apdus.append(apdu)
 
         # load APDUs
+        block = block_size or self.load_block_size()
         load_data = tlv_bytes(0xC4, cap_data)
-        for i, offset in enumerate(range(0, len(load_data), 240)):
+        for i, offset in enumerate(range(0, len(load_data), block)):
             apdu = CmdAPDU("80E80000")
-            apdu.p1 = 0x00 if offset + 240 < len(load_data) else 0x80
+            apdu.p1 = 0x00 if offset + block < len(load_data) else 0x80
             apdu.p2 = i & 0xff
-            apdu.data = load_data[offset: offset + 240]
+            apdu.data = load_data[offset: offset + block]
             apdus.append(apdu)
 
         # now send all APDUs
-        for apdu in apdus:
-            apdu = self.__sc.wrap(apdu)
-            rsp = self.__reader.transmit(apdu)
-            if rsp.sw != b'\x90\x00':
-                raise RspError('loading CAP file failed.')
+        apdus = self.__wrap(apdus)
+        t = time.perf_counter_ns()
+        rsps = self.__transmit(apdus, 'loading CAP file failed.')
+        elapsed = (time.perf_counter_ns() - t) * 1e-9
+        return LoadStats(len(load_data), block, [rsp.time for rsp in rsps],
+                         elapsed)
 
     def install_applet(self, pkg_aid, applet_aid, instance_aid=None):
         if not self.__sc:
@@ -330,10 +782,7 @@ class SecurityDomain:
 
         apdu.data = lv_bytes(pkg_aid) + lv_bytes(applet_aid) + lv_bytes(instance_aid) + bytes.fromhex('01 00 02 c900 00')
 
-        apdu = self.__sc.wrap(apdu)
-        rsp = self.__reader.transmit(apdu)
-        if rsp.sw != b'\x90\x00':
-            raise RspError('loading CAP file failed.')
+        self.__send([apdu], 'installing applet failed.')
 
     def remove(self, aid):
         if not self.__sc:
@@ -342,15 +791,18 @@ class SecurityDomain:
         apdu = CmdAPDU("80E40080")
         apdu.data = tlv_bytes(b'\x4f', aid)
 
-        apdu = self.__sc.wrap(apdu)
-        rsp = self.__reader.transmit(apdu)
-        if rsp.sw != b'\x90\x00':
-            raise RspError('removing package failed.')
+        self.__send([apdu], 'removing package failed.')
 
 
 __all__ = [
+    "C_MAC",
+    "C_ENCRYPT_MAC",
+    "R_MAC",
+    "R_ENCRYPT_MAC",
     "SecureChannel",
     "SecureChannelError",
     "SCP02I55",
+    "SCP03",
     "SecurityDomain",
+    "LoadStats",
 ]
@@ -3,54 +3,247 @@
 Provide functions for Java Card.
 """
 
+import io
+import os
+import struct
+import threading
 import zipfile
+from collections import namedtuple, OrderedDict
+
+# component name -> tag
+COMPONENTS = OrderedDict((name, tag) for tag, name in enumerate([
+    'Header',
+    'Directory',
+    'Applet',
+    'Import',
+    'ConstantPool',
+    'Class',
+    'Method',
+    'StaticField',
+    'RefLocation',
+    'Export',
+    'Descriptor',
+    'Debug',
+], 1))
+
+_MAGIC = 0xDECAFFED
+
+_METHOD_ACC_EXTENDED = 0x08
+_METHOD_ACC_ABSTRACT = 0x04
+
+CapHeader = namedtuple("CapHeader",
+                       "version flags pkg_version pkg_aid pkg_name")
+AppletInfo = namedtuple("AppletInfo", "aid install_method_offset")
+ImportInfo = namedtuple("ImportInfo", "aid version")
+# `offset` is in the info of the Method component, `size` is the bytecode
+MethodInfo = namedtuple("MethodInfo",
+                        "offset flags max_stack nargs max_locals size")
+
+
+class CapError(ValueError):
+    pass
+
+
+class _Reader:
+    """
+    Read the info of a component, raising CapError past its end.
+    """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.pos = 3
+
+    def u1(self):
+        return self.take(1)[0]
+
+    def u2(self):
+        return struct.unpack(">H", self.take(2))[0]
+
+    def take(self, n):
+        if self.pos + n > len(self.data):
+            raise CapError(f"{self.name} component is truncated.")
+        val = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return val
+
+    @property
+    def more(self):
+        return self.pos < len(self.data)
 
 
 class CapFile:
+    """
+    CAP file with a lazily read component index. Only the zip directory is
+    parsed when the file is opened; each component is inflated and checked
+    on first use. The component bytes are the attributes named as the
+    components, b'' for those not in the file.
+    """
+
     def __init__(self, cap_path):
-        zf = zipfile.ZipFile(cap_path, 'r')
-        try:
-            names = zf.namelist()
-            self.__content = {
-                'Header': b'',
-                'Directory': b'',
-                'Import': b'',
-                'Applet': b'',
-                'Class': b'',
-                'Method': b'',
-                'StaticField': b'',
-                'ConstantPool': b'',
-                'RefLocation': b'',
-                'Debug': b'',
-                'Export': b'',
-                'Descriptor': b'',
-            }
-            self.__pkg_name = ''
-            for name in names:
-                if 'javacard' in name and '.cap' in name:
-                    if not self.__pkg_name:
-                        self.__pkg_name = name[:name.rfind(
-                            "/javacard/")].replace('/', '.')
-                    self.__content[name[name.rfind('/') +
-                                        1:-4]] = zf.read(name)
-
-            #package aid
-            header = self.__content["Header"]
-            pkgaidlen = header[12]
-            self.__pkg_aid = header[13:pkgaidlen + 13]
-
-            #applet aids
-            aids = []
-            applet = self.__content["Applet"]
-            length = len(applet)
-            index = 4
-            while index < length:
-                aid_len = applet[index]
-                aids.append(applet[index + 1:index + 1 + aid_len])
-                index += 3 + aid_len
-            self.__app_aids = tuple(aids)
-        finally:
-            zf.close()
+        with open(cap_path, 'rb') as f:
+            self.__zip = zipfile.ZipFile(io.BytesIO(f.read()))
+        self.__lock = threading.Lock()
+        self.__index = {}
+        self.__content = {}
+        self.__pkg_name = ''
+        for info in self.__zip.infolist():
+            parts = info.filename.split('/')
+            name, ext = os.path.splitext(parts[-1])
+            if len(parts) < 2 or parts[-2] != 'javacard' or ext != '.cap':
+                continue
+            if name not in COMPONENTS:
+                raise CapError(f"unknown component {info.filename}.")
+            self.__index[name] = info
+            self.__pkg_name = '.'.join(parts[:-2])
+        if 'Header' not in self.__index:
+            raise CapError(f"{cap_path} has no Header component.")
+
+        self.__header = None
+        self.__applets = None
+        self.__imports = None
+        self.__methods = None
+
+    def component(self, name):
+        """
+        Bytes of component `name`, b'' if the CAP file has none.
+        """
+        if name not in COMPONENTS:
+            raise KeyError(name)
+        with self.__lock:
+            data = self.__content.get(name)
+            if data is None:
+                info = self.__index.get(name)
+                data = self.__zip.read(info) if info else b''
+                if data:
+                    self.__check(name, data)
+                self.__content[name] = data
+            return data
+
+    @staticmethod
+    def __check(name, data):
+        if data[0] != COMPONENTS[name]:
+            raise CapError(f"{name} component has tag {data[0]}.")
+        if len(data) < 3 or struct.unpack_from(">H", data, 1)[0] + 3 != \
+                len(data):
+            raise CapError(f"size of {name} component is not correct.")
+
+    @property
+    def components(self):
+        """
+        Names of the components in the CAP file, in tag order.
+        """
+        return [name for name in COMPONENTS if name in self.__index]
+
+    def validate(self):
+        """
+        Check every component, and their sizes against the Directory.
+        """
+        directory = _Reader('Directory', self.component('Directory'))
+        if not directory.data:
+            raise CapError("CAP file has no Directory component.")
+        # 11 component sizes before CAP format 2.2, 12 since
+        count = 12 if self.header.version >= (2, 2) else 11
+        for name in list(COMPONENTS)[:count]:
+            size = directory.u2()
+            data = self.component(name)
+            if data and size != len(data) - 3:
+                raise CapError(f"size of {name} component is {len(data) - 3}"
+                               f", Directory gives {size}.")
+
+    @property
+    def header(self):
+        if self.__header is None:
+            cur = _Reader('Header', self.component('Header'))
+            magic = struct.unpack(">I", cur.take(4))[0]
+            if magic != _MAGIC:
+                raise CapError(f"bad magic {magic:08X} of Header component.")
+            minor, major, flags = cur.take(3)
+            pkg_minor, pkg_major = cur.take(2)
+            pkg_aid = cur.take(cur.u1())
+            # package name since CAP format 2.2
+            pkg_name = cur.take(cur.u1()).decode() if cur.more else ''
+            self.__header = CapHeader((major, minor), flags,
+                                      (pkg_major, pkg_minor), pkg_aid,
+                                      pkg_name)
+        return self.__header
+
+    @property
+    def applets(self):
+        if self.__applets is None:
+            applets = []
+            data = self.component('Applet')
+            if data:
+                cur = _Reader('Applet', data)
+                for i in range(cur.u1()):
+                    aid = cur.take(cur.u1())
+                    applets.append(AppletInfo(aid, cur.u2()))
+            self.__applets = tuple(applets)
+        return self.__applets
+
+    @property
+    def imports(self):
+        if self.__imports is None:
+            imports = []
+            data = self.component('Import')
+            if data:
+                cur = _Reader('Import', data)
+                for i in range(cur.u1()):
+                    minor, major = cur.take(2)
+                    imports.append(
+                        ImportInfo(cur.take(cur.u1()), (major, minor)))
+            self.__imports = tuple(imports)
+        return self.__imports
+
+    @property
+    def methods(self):
+        """
+        Methods with bytecode, in the order of the Method component. Their
+        sizes are taken from the Descriptor component, so the list is empty
+        if the CAP file has none.
+        """
+        if self.__methods is None:
+            method = self.component('Method')
+            methods = []
+            for offset, size in self.__method_sizes():
+                # offset is relative to the info of the component
+                pos = offset + 3
+                if pos + 2 > len(method):
+                    raise CapError(f"method offset {offset} out of Method "
+                                   "component.")
+                flags = method[pos] >> 4
+                if flags & _METHOD_ACC_EXTENDED:
+                    max_stack, nargs, max_locals = method[pos + 1:pos + 4]
+                else:
+                    max_stack = method[pos] & 0x0f
+                    nargs, max_locals = method[pos + 1] >> 4, method[
+                        pos + 1] & 0x0f
+                methods.append(
+                    MethodInfo(offset, flags, max_stack, nargs, max_locals,
+                               size))
+            methods.sort()
+            self.__methods = tuple(methods)
+        return self.__methods
+
+    def __method_sizes(self):
+        data = self.component('Descriptor')
+        if not data:
+            return
+        cur = _Reader('Descriptor', data)
+        for i in range(cur.u1()):
+            # token, access_flags, this_class_ref
+            cur.take(4)
+            interface_count = cur.u1()
+            field_count = cur.u2()
+            method_count = cur.u2()
+            cur.take(2 * interface_count + 7 * field_count)
+            for j in range(method_count):
+                token, access_flags, offset, type_offset, size, \
+                    handler_count, handler_index = struct.unpack(
+                        ">BBHHHHH", cur.take(12))
+                # abstract and interface methods have no bytecode
+                if offset:
+                    yield offset, size
 
     @property
     def pkg_name(self):
@@ -58,23 +251,55 @@ class CapFile:
 
     @property
     def pkg_aid(self):
-        return self.__pkg_aid
+        return self.header.pkg_aid
 
     @property
     def app_aids(self):
-        return self.__app_aids
+        return tuple(applet.aid for applet in self.applets)
 
     def __getattr__(self, name):
-        if name in self.__content:
-            return self.__content[name]
+        if name in COMPONENTS:
+            return self.component(name)
         else:
             raise AttributeError('class CapFile has no attr: %s' % name)
 
     def getattr(self, name):
-        if name in self.__content:
-            return self.__content[name]
+        if name in COMPONENTS:
+            return self.component(name)
         else:
             raise AttributeError('class CapFile has no attr: %s' % name)
 
 
-__all__ = ["CapFile"]
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 64
+
+
+def open_cap(cap_path):
+    """
+    Open a CAP file through a cache keyed on its path, size and mtime, so a
+    CAP loaded by the setup of every case is read and validated once.
+    """
+    path = os.path.abspath(cap_path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == stamp:
+            _cache.move_to_end(path)
+            return entry[1]
+    cap = CapFile(path)
+    cap.validate()
+    with _cache_lock:
+        _cache[path] = (stamp, cap)
+        _cache.move_to_end(path)
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return cap
+
+
+__all__ = [
+    "CapFile",
+    "CapError",
+    "open_cap",
+]
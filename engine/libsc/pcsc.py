@@ -0,0 +1,365 @@
+#coding:utf-8
+"""
+PC/SC smart card reader, backed by winscard.dll on Windows and pcsc-lite on
+Linux and macOS. The native library is bound on first use.
+"""
+
+import sys
+import ctypes as ct
+import ctypes.util
+import time
+import logging
+log = logging.getLogger("libsc")
+
+from .base import *
+from .reader import Reader, ReaderError, auto_get_rsp
+
+
+class _PCSCLib:
+    """
+    Native PC/SC library with the types and functions of the platform.
+    """
+
+    def __init__(self):
+        if sys.platform == "win32":
+            self.mod = ct.windll.winscard
+            self.dword = ct.c_ulong
+            self.handle = ct.c_size_t  # ULONG_PTR
+            self.long = ct.c_long
+            self.wide = True
+            suffix = "W"
+            max_atr = 36
+            pack = 0
+        else:
+            if sys.platform == "darwin":
+                path = ctypes.util.find_library("PCSC")
+                # DWORD and SCARDHANDLE are 32-bit in PCSC.framework
+                self.dword = ct.c_uint32
+                self.handle = ct.c_int32
+                self.long = ct.c_int32
+                pack = 1
+            else:
+                path = ctypes.util.find_library(
+                    "pcsclite") or "libpcsclite.so.1"
+                self.dword = ct.c_ulong
+                self.handle = ct.c_long
+                self.long = ct.c_long
+                pack = 0
+            try:
+                self.mod = ct.CDLL(path)
+            except OSError as e:
+                raise ReaderError(f"PC/SC library not found: {e}")
+            self.wide = False
+            suffix = ""
+            max_atr = 33
+
+        class SCARD_IO_REQUEST(ct.Structure):
+            _fields_ = [
+                ("dwProtocol", self.dword),
+                ("cbPciLength", self.dword),
+            ]
+
+        class SCARD_READERSTATE(ct.Structure):
+            _pack_ = pack
+            _fields_ = [
+                ("szReader", ct.c_wchar_p if self.wide else ct.c_char_p),
+                ("pvUserData", ct.c_void_p),
+                ("dwCurrentState", self.dword),
+                ("dwEventState", self.dword),
+                ("cbAtr", self.dword),
+                ("rgbAtr", ct.c_ubyte * max_atr),
+            ]
+
+        self.READERSTATE = SCARD_READERSTATE
+        self.t0_pci = ct.pointer(SCARD_IO_REQUEST.in_dll(
+            self.mod, "g_rgSCardT0Pci"))
+        self.t1_pci = ct.pointer(SCARD_IO_REQUEST.in_dll(
+            self.mod, "g_rgSCardT1Pci"))
+
+        self.SCardEstablishContext = self.__func("SCardEstablishContext")
+        self.SCardReleaseContext = self.__func("SCardReleaseContext")
+        self.SCardListReaders = self.__func("SCardListReaders" + suffix)
+        self.SCardConnect = self.__func("SCardConnect" + suffix)
+        self.SCardStatus = self.__func("SCardStatus" + suffix)
+        self.SCardDisconnect = self.__func("SCardDisconnect")
+        self.SCardTransmit = self.__func("SCardTransmit")
+        self.SCardTransmit.argtypes = [
+            self.handle, ct.c_void_p, ct.c_char_p, self.dword, ct.c_void_p,
+            ct.c_void_p,
+            ct.POINTER(self.dword)
+        ]
+        self.SCardReconnect = self.__func("SCardReconnect")
+        self.SCardGetStatusChange = self.__func(
+            "SCardGetStatusChange" + suffix, check=False)
+
+        if not self.wide:
+            self.__stringify = getattr(self.mod, "pcsc_stringify_error", None)
+            if self.__stringify is not None:
+                self.__stringify.restype = ct.c_char_p
+                self.__stringify.argtypes = [self.long]
+
+    def __func(self, name, check=True):
+        func = getattr(self.mod, name)
+        func.restype = self.long
+        if check:
+            func.errcheck = self.__check_ret
+        return func
+
+    def __check_ret(self, ret, func, args):
+        if ret != 0:
+            raise ReaderError(self.format_error(ret))
+        return ret
+
+    def format_error(self, ret):
+        if self.wide:
+            return ct.FormatError(ret & 0xffffffff)
+        if self.__stringify is not None:
+            return self.__stringify(ret).decode(errors="replace")
+        return f"PC/SC error 0x{ret & 0xffffffff:08X}"
+
+    def encode(self, name):
+        return name if self.wide else name.encode()
+
+    def decode(self, name):
+        return name if self.wide else name.decode(errors="replace")
+
+    def create_buffer(self, size):
+        if self.wide:
+            return ct.create_unicode_buffer(size)
+        return ct.create_string_buffer(size)
+
+
+_lib_instance = None
+
+
+def _lib():
+    global _lib_instance
+    if _lib_instance is None:
+        _lib_instance = _PCSCLib()
+    return _lib_instance
+
+
+def _protocol_value(protocol):
+    if isinstance(protocol, str):
+        pro = protocol.lower()
+        if pro in ("t0", "t=0"):
+            return 1  # T=0
+        elif pro in ("t1", "t=1"):
+            return 2  # T=1
+        elif pro == "auto":
+            return 3  # T=0 | T=1
+    raise ValueError(f"Protocol {protocol} not supported.")
+
+
+class PCSCReader(Reader):
+    """
+    PC/SC smart card reader.
+    """
+
+    def __init__(self, name=None, shared=False):
+        if name is None:
+            # get the reader name
+            first = None
+            for name, card_inside in list_pcsc_readers():
+                if not first:
+                    first = name
+                if card_inside:
+                    self.__reader = name
+                    break
+            else:
+                if first:
+                    self.__reader = first
+                else:
+                    raise ValueError("No PCSC reader found")
+        else:
+            self.__reader = str(name)
+
+        lib = _lib()
+        self.__context = lib.handle(0)
+        self.__handle = lib.handle(0)
+        self.__pro = None
+        self.__shared = bool(shared)
+
+        # transmit state, prepared once per connection
+        self.__recv = None
+        self.__recv_len = lib.dword(0)
+        self.__recv_len_p = ct.pointer(self.__recv_len)
+        self.__pci = None
+
+    def __repr__(self):
+        return f"PCSCReader(name='{self.__reader}', shared={self.__shared})"
+
+    @property
+    def name(self):
+        return self.__reader
+
+    def open(self, protocol="auto"):
+        pro_val = _protocol_value(protocol)
+
+        if self.is_open():
+            raise ReaderError("Smart card already connected.")
+
+        lib = _lib()
+        lib.SCardEstablishContext(
+            lib.dword(0), None, None, ct.byref(self.__context))
+
+        dwActivePro = lib.dword(0)
+        # connect to the card
+        try:
+            lib.SCardConnect(self.__context, lib.encode(self.__reader),
+                             lib.dword(2 if self.__shared else 1),
+                             lib.dword(pro_val), ct.byref(self.__handle),
+                             ct.byref(dwActivePro))
+        except ReaderError:
+            lib.SCardReleaseContext(self.__context)
+            self.__context = lib.handle(0)
+            raise
+
+        if dwActivePro.value == 1:
+            self.__pro = "T=0"
+        else:
+            self.__pro = "T=1"
+        self.__prepare_transmit()
+        log.info(
+            f"{self} open, protocol: {self.get_protocol()}, ATR: {self.get_atr().hex()}"
+        )
+
+    def is_open(self):
+        return self.__handle.value != 0
+
+    def __prepare_transmit(self):
+        lib = _lib()
+        if self.__recv is None:
+            self.__recv = ct.create_string_buffer(65538)
+        self.__pci = lib.t0_pci if self.__pro == "T=0" else lib.t1_pci
+
+    def close(self):
+        """
+        Close connection.
+        """
+        # define SCARD_LEAVE_CARD      0 // Don't do anything special on close
+        # define SCARD_RESET_CARD      1 // Reset the card on close
+        # define SCARD_UNPOWER_CARD    2 // Power down the card on close
+        # define SCARD_EJECT_CARD      3 // Eject the card on close
+        if self.is_open():
+            lib = _lib()
+            lib.SCardDisconnect(self.__handle, lib.dword(2))
+            self.__handle = lib.handle(0)
+            lib.SCardReleaseContext(self.__context)
+            self.__context = lib.handle(0)
+            self.__pro = None
+            self.__pci = None
+            log.info(f"{self} close")
+
+    def reset(self, protocol=None, cold=True):
+        if not self.is_open():
+            raise ReaderError("Smart card is already disconnected.")
+
+        if protocol is None:
+            protocol = self.__pro
+        pro_val = _protocol_value(protocol)
+
+        lib = _lib()
+        dwActivePro = lib.dword(0)
+        lib.SCardReconnect(self.__handle,
+                           lib.dword(2 if self.__shared else 1),
+                           lib.dword(pro_val), lib.dword(2 if cold else 1),
+                           ct.byref(dwActivePro))
+
+        if dwActivePro.value == 1:
+            self.__pro = "T=0"
+        else:
+            self.__pro = "T=1"
+        self.__prepare_transmit()
+        log.info(
+            f"{self} reset, protocol: {self.get_protocol()}, ATR: {self.get_atr().hex()}"
+        )
+
+    def get_protocol(self):
+        if not self.is_open():
+            raise ReaderError("Smart card is not connected.")
+        return self.__pro
+
+    def get_atr(self):
+        if not self.is_open():
+            raise ReaderError("Smart card is not connected.")
+
+        lib = _lib()
+        atr = ct.create_string_buffer(40)
+        atrlen = lib.dword(40)
+        lib.SCardStatus(self.__handle, None, None, None, None, atr,
+                        ct.byref(atrlen))
+        return atr[:atrlen.value]
+
+    @auto_get_rsp
+    def transmit(self, apdu):
+        # everything up to the timer only touches state prepared on open, so
+        # host overhead between consecutive APDUs stays small
+        pci = self.__pci
+        if pci is None:
+            raise ReaderError("Smart card is not connected.")
+
+        if isinstance(apdu, bytes):
+            apdu_data = apdu
+        elif isinstance(apdu, CmdAPDU):
+            apdu_data = bytes(apdu)
+        elif isinstance(apdu, str):
+            apdu_data = bytes.fromhex(apdu)
+        else:
+            raise TypeError(apdu)
+
+        recv = self.__recv
+        recv_len = self.__recv_len
+        recv_len.value = 65538
+        verbose = log.isEnabledFor(logging.INFO)
+        if verbose:
+            log.info(f"send: {apdu_data.hex()}")
+
+        transmit = _lib_instance.SCardTransmit
+        handle = self.__handle
+        recv_len_p = self.__recv_len_p
+        length = len(apdu_data)
+
+        # integer nanoseconds, converted once so no rounding adds up
+        t1 = time.perf_counter_ns()
+        transmit(handle, pci, apdu_data, length, None, recv, recv_len_p)
+        t2 = time.perf_counter_ns()
+        rsp = RspAPDU(recv[:recv_len.value], (t2 - t1) * 1e-9)
+        if verbose:
+            log.info(f"recv: {rsp} in {rsp.time*1000:.02f} ms")
+        return rsp
+
+
+def list_pcsc_readers():
+    """
+    A generator to list all PCSC readers. yield (reader_name, is_card_in_reader) for each loop, for example: ("Reader 1", True), ("Reader 2", False) ...
+    """
+    lib = _lib()
+    context = lib.handle(0)
+    try:
+        lib.SCardEstablishContext(lib.dword(0), None, None, ct.byref(context))
+        buff = lib.create_buffer(2048)
+        cch = lib.dword(2048)
+        lib.SCardListReaders(context, None, buff, ct.byref(cch))
+        nul = "\x00" if lib.wide else b"\x00"
+        readers = buff[:cch.value].rstrip(nul).split(nul)
+        for reader in readers:
+            state = lib.READERSTATE()
+            state.szReader = reader
+            state.pvUserData = None
+            state.dwCurrentState = 0
+            state.dwEventState = 0
+            state.cbAtr = 0
+            ret = lib.SCardGetStatusChange(context, lib.dword(0),
+                                           ct.byref(state), lib.dword(1))
+            yield (lib.decode(reader), ret == 0 and
+                   (state.dwEventState & 0x0020) != 0)
+    finally:
+        if context.value:
+            lib.SCardReleaseContext(context)
+
+
+__all__ = [
+    "PCSCReader",
+    "list_pcsc_readers",
+]
@@ -0,0 +1,172 @@
+#coding:utf-8
+"""
+Simulated smart card reader, replays scripted responses and latencies.
+"""
+
+import json
+import time
+import logging
+log = logging.getLogger("libsc")
+
+from .base import *
+from .reader import Reader, ReaderError, auto_get_rsp
+
+
+class _Rule:
+    def __init__(self, prefix, rsps, latencies):
+        self.prefix = prefix
+        self.rsps = rsps
+        self.latencies = latencies
+        self.count = 0
+
+    def next(self):
+        # the last response and latency of a sequence repeat forever
+        i = self.count
+        self.count += 1
+        rsp = self.rsps[min(i, len(self.rsps) - 1)]
+        latency = self.latencies[min(i, len(self.latencies) - 1)]
+        return rsp, latency
+
+
+def _as_list(val):
+    return list(val) if isinstance(val, (list, tuple)) else [val]
+
+
+class SimulatedReader(Reader):
+    """
+    In-process virtual card. A command APDU is answered by the first rule whose
+    hex prefix matches it, or by the default response. A rule may give a list
+    of responses and latencies which are replayed in order.
+
+    The latency is reported as the elapsed time of the response, and the reader
+    also sleeps for it when `realtime` is true.
+    """
+
+    def __init__(self,
+                 script=None,
+                 name="Simulated Reader",
+                 atr="3b8080010101",
+                 protocol="T=1",
+                 default="9000",
+                 latency=0.0,
+                 realtime=False):
+        self.__name = name
+        self.__atr = bytes.fromhex(atr)
+        self.__default_pro = protocol
+        self.__default = RspAPDU(default)
+        self.__latency = float(latency)
+        self.__realtime = bool(realtime)
+        self.__rules = []
+        self.__pro = None
+        self.history = []
+
+        if isinstance(script, str):
+            with open(script) as f:
+                script = json.load(f)
+        if isinstance(script, dict):
+            self.__name = script.get("name", self.__name)
+            self.__atr = bytes.fromhex(script.get("atr", self.__atr.hex()))
+            self.__default_pro = script.get("protocol", self.__default_pro)
+            self.__default = RspAPDU(script.get("default", str(self.__default)))
+            self.__latency = float(script.get("latency", self.__latency))
+            self.__realtime = bool(script.get("realtime", self.__realtime))
+            script = script.get("responses", [])
+        for rule in script or []:
+            self.add_response(rule["apdu"], rule.get("rsp", "9000"),
+                              rule.get("latency"))
+
+    def __repr__(self):
+        return f"SimulatedReader(name='{self.__name}')"
+
+    @property
+    def name(self):
+        return self.__name
+
+    def add_response(self, apdu, rsp="9000", latency=None):
+        """
+        Answer command APDUs starting with `apdu` (hex string or bytes) with
+        `rsp` after `latency` seconds.
+        """
+        if isinstance(apdu, str):
+            apdu = bytes.fromhex(apdu)
+        rsps = [RspAPDU(val) for val in _as_list(rsp)]
+        if latency is None:
+            latency = self.__latency
+        latencies = [float(val) for val in _as_list(latency)]
+        self.__rules.append(_Rule(bytes(apdu), rsps, latencies))
+
+    def open(self, protocol="auto"):
+        if self.is_open():
+            raise ReaderError("Smart card already connected.")
+        self.reset(protocol)
+
+    def is_open(self):
+        return self.__pro is not None
+
+    def close(self):
+        if self.is_open():
+            self.__pro = None
+            log.info(f"{self} close")
+
+    def reset(self, protocol=None, cold=True):
+        if protocol is None:
+            protocol = self.__pro or "auto"
+        pro = protocol.lower()
+        if pro in ("t0", "t=0"):
+            self.__pro = "T=0"
+        elif pro in ("t1", "t=1"):
+            self.__pro = "T=1"
+        elif pro == "auto":
+            self.__pro = self.__default_pro
+        else:
+            raise ValueError(f"Protocol {protocol} not supported.")
+        for rule in self.__rules:
+            rule.count = 0
+        log.info(f"{self} reset, protocol: {self.__pro}, ATR: {self.__atr.hex()}")
+
+    def get_protocol(self):
+        if not self.is_open():
+            raise ReaderError("Smart card is not connected.")
+        return self.__pro
+
+    def get_atr(self):
+        if not self.is_open():
+            raise ReaderError("Smart card is not connected.")
+        return self.__atr
+
+    @auto_get_rsp
+    def transmit(self, apdu):
+        if not self.is_open():
+            raise ReaderError("Smart card is not connected.")
+
+        if isinstance(apdu, str):
+            apdu_data = bytes.fromhex(apdu)
+        elif isinstance(apdu, CmdAPDU):
+            apdu_data = bytes(apdu)
+        elif isinstance(apdu, bytes):
+            apdu_data = apdu
+        else:
+            raise TypeError(apdu)
+
+        # the messages are not formatted when nobody reads them
+        verbose = log.isEnabledFor(logging.INFO)
+        if verbose:
+            log.info(f"send: {apdu_data.hex()}")
+        self.history.append(apdu_data)
+
+        for rule in self.__rules:
+            if apdu_data.startswith(rule.prefix):
+                rsp, latency = rule.next()
+                break
+        else:
+            rsp, latency = self.__default, self.__latency
+
+        if self.__realtime and latency > 0:
+            time.sleep(latency)
+        rsp = RspAPDU(bytes(rsp), latency)
+        if verbose:
+            log.info(f"recv: {rsp} in {rsp.time*1000:.02f} ms")
+        return rsp
+
+
+__all__ = ["SimulatedReader"]
@@ -4,11 +4,17 @@ Test case and group.
 """
 
 import json
+import time
 import logging
 log = logging.getLogger("jcmeasure")
 
 from .context import Context
 from .action import build_action, Action
+from .estimator import get_estimator, paired_diff
+from .scheduler import RoundScheduler
+from .sampling import get_order, ADJUST
+from .warmup import WarmUp, warmup_cost
+from .timing import calibrate
 
 
 class MeasureCase:
@@ -16,20 +22,72 @@ class MeasureCase:
     Test case.
     """
 
-    def __init__(self, name: str, description: str, round: int, result_func,
-                 unit: str, setup: Action, teardown: Action, adjust: Action,
-                 test: Action):
+    def __init__(self,
+                 name: str,
+                 description: str,
+                 round: int,
+                 result_func,
+                 unit: str,
+                 setup: Action,
+                 teardown: Action,
+                 adjust: Action,
+                 test: Action,
+                 estimator="min",
+                 confidence=0.95,
+                 scheduler=None,
+                 batch=None,
+                 order="blocked",
+                 warmup=None,
+                 calibration=None):
 
         self.name = name
         self.description = description
         self.round = round
         self.result_func = eval(result_func)
         self.unit = unit
+        self.estimator = get_estimator(estimator)
+        self.confidence = confidence
+        if scheduler is None:
+            scheduler = RoundScheduler(round, round)
+        self.scheduler = scheduler
+        self.order = get_order(order)
+        if not isinstance(warmup, WarmUp):
+            warmup = WarmUp.from_spec(warmup)
+        # "blocked:N" is the same fixed warm-up as "warmup": N
+        blocked = getattr(self.order, "warmup", 0)
+        if blocked:
+            if warmup.auto or warmup.rounds not in (0, blocked):
+                raise ValueError(
+                    f"{name}: warm-up given by both order {order} and "
+                    f"warmup {warmup}.")
+            warmup = WarmUp(blocked)
+        self.warmup = warmup
+        # a command of the selected applet which does nothing, the overhead
+        # of the reader is calibrated with it instead of an unknown INS
+        self.calibration = calibration
+        self.__action = None
+        # (name, setup, teardown) of the batch sharing the installed applets
+        self.batch = batch
         self.__setup = setup
         self.__teardown = teardown
         self.__adjust = adjust
         self.__test = test
 
+        # raw samples, estimate and start/finish time of the last test, the
+        # "overhead" samples are the T=0 GET RESPONSE time of each test sample
+        # and the "paired" ones the test less the adjust sample of each round,
+        # the samples of the warm-up rounds are apart
+        self.samples = {"adjust": [], "test": [], "overhead": []}
+        self.__raw = self.samples
+        self.estimate = None
+        # median paired difference, for the interleaved and random orders
+        self.paired = None
+        # count of warm-up rounds and the extra time they took
+        self.warmup_rounds = 0
+        self.warmup_cost = 0.0
+        self.started = None
+        self.finished = None
+
     @classmethod
     def from_json(cls, json_file):
         val = json.loads(open(json_file).read())
@@ -42,44 +100,170 @@ class MeasureCase:
         result_func = val.get("result", "lambda t: 1.0/t")
         unit = val.get("unit", "INS/S")
 
-        setup = build_action(json_file, val["setup"])
-        teardown = build_action(json_file, val["teardown"])
+        rel_error = val.get("rel_error")
+        ci_width = val.get("ci_width")
+        time_budget = val.get("time_budget")
+        adaptive = any(x is not None
+                       for x in (rel_error, ci_width, time_budget))
+        scheduler = RoundScheduler(
+            pilot=val.get("pilot", min(round, 5) if adaptive else round),
+            max_round=val.get("max_round", round * 10),
+            rel_error=rel_error,
+            ci_width=ci_width,
+            time_budget=time_budget)
+
+        batch = val.get("batch")
+        if batch is not None:
+            batch = (batch["name"],
+                     build_action(json_file, batch.get("setup", [])),
+                     build_action(json_file, batch.get("teardown", [])))
+
+        setup = build_action(json_file, val.get("setup", []))
+        teardown = build_action(json_file, val.get("teardown", []))
         adjust = build_action(json_file, val["adjust"])
         test = build_action(json_file, val["test"])
 
-        return cls(name, description, round, result_func, unit, setup,
-                   teardown, adjust, test)
+        return cls(
+            name,
+            description,
+            round,
+            result_func,
+            unit,
+            setup,
+            teardown,
+            adjust,
+            test,
+            estimator=val.get("estimator", "min"),
+            confidence=val.get("confidence", 0.95),
+            scheduler=scheduler,
+            batch=batch,
+            order=val.get("order", "blocked"),
+            warmup=WarmUp.from_spec(
+                val.get("warmup", 0), val.get("max_warmup")),
+            calibration=val.get("calibrate"))
 
-    def test(self, ctx: Context):
-        log.debug(f"run MeasureCase {self.name}")
+    def __sample(self, ctx, n):
+        """
+        Run `n` more rounds of adjust and test in the sampling order.
+        """
+        samples = self.__raw
+        for action in self.order.sequence(n):
+            self.__action = action
+            if action == ADJUST:
+                samples["adjust"].append(self.__adjust.run(ctx))
+            else:
+                samples["test"].append(self.__test.run(ctx))
+                samples["overhead"].append(self.__test.overhead)
 
+    def __split_warmup(self):
+        """
+        Take the warm-up rounds out of the samples.
+        """
+        raw = self.__raw
+        k = self.warmup.detect(raw["adjust"], raw["test"])
+        self.warmup_rounds = k
+        self.samples = {
+            "adjust": raw["adjust"][k:],
+            "test": raw["test"][k:],
+            "overhead": raw["overhead"][k:],
+            "warmup_adjust": raw["adjust"][:k],
+            "warmup_test": raw["test"][:k],
+        }
+
+    def __calibrate(self, ctx):
+        """
+        Calibration of the case, by its no-op command if it has one and the
+        reader is calibrated.
+        """
+        cal = ctx.calibration
+        if self.calibration is None or not cal.rounds:
+            return cal
         try:
-            self.__setup.run(ctx)
+            return calibrate(ctx.reader, cal.rounds, self.calibration,
+                             cal.resolution)
         except Exception as e:
-            log.error(f"setup failed. {e}")
-            log.exception(e)
+            log.error(f"{self.name}: calibration failed, the overhead of "
+                      f"the reader is used. {e}")
+            return cal
+
+    def test(self, ctx: Context, time_budget=None):
+        log.debug(f"run MeasureCase {self.name}")
+        self.started = time.time()
 
         try:
-            t1 = [self.__adjust.run(ctx) for i in range(self.round)]
+            self.__setup.run(ctx)
         except Exception as e:
-            log.error(f"adjust failed. {e}")
+            log.error(f"setup failed. {e}")
             log.exception(e)
-            t1 = None
 
-        t2 = None
-        if t1 is not None:
+        reader_calibration = ctx.calibration
+        ctx.calibration = self.__calibrate(ctx)
+        self.__raw = {"adjust": [], "test": [], "overhead": []}
+        self.samples = self.__raw
+        self.estimate = None
+        self.paired = None
+        self.warmup_rounds = 0
+        self.warmup_cost = 0.0
+        failed = False
+        # a fixed warm-up is run on top of the rounds
+        n = self.scheduler.start(time_budget) + self.warmup.rounds
+        while n > 0:
             try:
-                t2 = [self.__test.run(ctx) for i in range(self.round)]
+                with ctx.timed():
+                    self.__sample(ctx, n)
             except Exception as e:
-                log.error(f"test failed. {e}")
+                log.error(f"{self.__action} failed. {e}")
                 log.exception(e)
+                failed = True
+                break
+
+            self.__split_warmup()
+            self.estimate = ctx.calibration.bound(
+                self.estimator.difference(self.samples["adjust"],
+                                          self.samples["test"],
+                                          self.confidence))
+            n = self.scheduler.next_rounds(
+                len(self.samples["test"]), self.estimate)
 
-        if t1 is not None and t2 is not None:
-            result = self.result_func(min(t2) - min(t1))
-            ctx.reporter.report_case(self, result)
+        self.finished = time.time()
+        if not failed:
+            log.debug(f"{self.name}: {self.estimate} "
+                      f"after {len(self.samples['test'])} rounds")
+            negative = sum(t < 0 for key in ("adjust", "test")
+                           for t in self.__raw[key])
+            if negative:
+                log.warning(f"{self.name}: {negative} samples below 0 after "
+                            "the overhead is taken out, the calibration "
+                            "command is slower than those of the case.")
+            if abs(self.estimate.value) < 10 * ctx.calibration.resolution:
+                log.warning(f"{self.name}: {self.estimate.value * 1e9:.0f} ns"
+                            " is within 10 steps of the clock resolution.")
+            if self.warmup_rounds:
+                self.warmup_cost = warmup_cost(self.__raw["adjust"],
+                                               self.__raw["test"],
+                                               self.warmup_rounds)
+                log.info(f"{self.name}: {self.warmup_rounds} warm-up rounds, "
+                         f"{self.warmup_cost * 1000:.02f} ms extra")
+            adjust, test = self.samples["adjust"], self.samples["test"]
+            self.samples["paired"] = [t - a for a, t in zip(adjust, test)]
+            if self.order.name != "blocked":
+                self.paired = paired_diff(adjust, test, self.confidence)
+                log.debug(f"{self.name}: paired difference {self.paired}")
+            overhead = self.samples["overhead"]
+            if any(overhead):
+                log.debug(f"{self.name}: T=0 overhead "
+                          f"{min(overhead) * 1000:.02f} ms per round")
+            if self.result_func.__code__.co_argcount == 2:
+                # e.g. "lambda t, size: size / t" for load throughput
+                result = self.result_func(self.estimate.value,
+                                          self.__test.size)
+            else:
+                result = self.result_func(self.estimate.value)
+            ctx.reporter.report_case(self, result, ctx.card)
         else:
-            ctx.reporter.report_failure(self)
+            ctx.reporter.report_failure(self, ctx.card)
 
+        ctx.calibration = reader_calibration
         try:
             self.__teardown.run(ctx)
         except Exception as e:
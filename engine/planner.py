@@ -0,0 +1,78 @@
+#coding:utf-8
+"""
+Plan a suite into batches of cases sharing installed applets.
+"""
+
+from .measurecase import MeasureCase
+import logging
+log = logging.getLogger("jcmeasure")
+
+
+class Batch:
+    """
+    Cases run between one setup and one teardown, usually loading and
+    removing the package holding the applets of all of them.
+    """
+
+    def __init__(self, name=None, setup=None, teardown=None):
+        self.name = name
+        self.setup = setup
+        self.teardown = teardown
+        self.cases = []
+
+    def __len__(self):
+        return len(self.cases)
+
+    def __repr__(self):
+        return f"Batch({self.name!r}, {len(self.cases)} cases)"
+
+    def run(self, ctx, test):
+        """
+        Run the setup, `test(case, left)` for each case, then the teardown.
+        `left` counts the cases of the batch from this one on.
+        """
+        if self.setup is not None:
+            log.debug(f"setup batch {self.name}")
+            try:
+                self.setup.run(ctx)
+            except Exception as e:
+                log.error(f"setup of batch {self.name} failed. {e}")
+                log.exception(e)
+
+        try:
+            for i, case in enumerate(self.cases):
+                test(case, len(self.cases) - i)
+        finally:
+            if self.teardown is not None:
+                log.debug(f"teardown batch {self.name}")
+                try:
+                    self.teardown.run(ctx)
+                except Exception as e:
+                    log.error(f"teardown of batch {self.name} failed. {e}")
+                    log.exception(e)
+
+
+def plan(cases):
+    """
+    Group `cases` by batch in order of first appearance. A case without batch
+    is a batch by itself, the setup and teardown of a batch are those of its
+    first case.
+    """
+    batches = []
+    named = {}
+    for case in cases:
+        assert isinstance(case, MeasureCase)
+        if case.batch is None:
+            batch = Batch()
+            batches.append(batch)
+        else:
+            name, setup, teardown = case.batch
+            batch = named.get(name)
+            if batch is None:
+                batch = named[name] = Batch(name, setup, teardown)
+                batches.append(batch)
+        batch.cases.append(case)
+    return batches
+
+
+__all__ = ["Batch", "plan"]
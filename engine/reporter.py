@@ -1,28 +1,283 @@
 #coding:utf-8
 
+import math
 import time
+import threading
+from pathlib import Path
+from . import __version__
 from .measurecase import MeasureCase
+from .estimator import Estimate
 import logging
 log = logging.getLogger("jcmeasure")
 
 
+class CaseResult:
+    """
+    Result of a measure case on a card, `result` is None if the case failed.
+    """
+
+    def __init__(self, case: MeasureCase, result=None, card=None):
+        self.name = case.name
+        self.description = case.description
+        self.unit = case.unit
+        self.result = result
+        self.card = card
+        self.samples = {key: list(val) for key, val in case.samples.items()}
+        self.estimate = case.estimate
+        self.paired = case.paired
+        self.warmup_rounds = case.warmup_rounds
+        self.warmup_cost = case.warmup_cost
+        self.started = case.started
+        self.finished = case.finished
+
+    @classmethod
+    def from_dict(cls, record):
+        """
+        Result restored from a record of a result store.
+        """
+        from .context import CardInfo
+
+        res = cls.__new__(cls)
+        res.name = record["name"]
+        res.description = record["description"]
+        res.unit = record["unit"]
+        res.result = None if record["failed"] else record["result"]
+        res.card = None
+        if record["reader"] is not None:
+            res.card = CardInfo(record["reader"], record["atr"],
+                                record["protocol"])
+        res.samples = {
+            "adjust": record["adjust"],
+            "test": record["test"],
+            "overhead": record.get("overhead") or [],
+            "paired": record.get("paired") or [],
+        }
+        res.estimate = None
+        if record["time"] is not None:
+            res.estimate = Estimate(
+                record["time"],
+                record["ci_low"] if record["ci_low"] is not None else
+                -math.inf,
+                record["ci_high"] if record["ci_high"] is not None else
+                math.inf, record["estimator"])
+        res.paired = None
+        if record.get("paired_time") is not None:
+            res.paired = Estimate(
+                record["paired_time"],
+                record["paired_low"] if record["paired_low"] is not None
+                else -math.inf,
+                record["paired_high"] if record["paired_high"] is not None
+                else math.inf, "paired")
+        res.warmup_rounds = record.get("warmup_rounds") or 0
+        res.warmup_cost = record.get("warmup_cost") or 0.0
+        res.started = record["started"]
+        res.finished = record["finished"]
+        return res
+
+    @property
+    def failed(self):
+        return self.result is None
+
+    @property
+    def overhead(self):
+        """
+        Median T=0 GET RESPONSE time of a test round, 0 if none.
+        """
+        overhead = sorted(self.samples.get("overhead", []))
+        return overhead[len(overhead) // 2] if overhead else 0.0
+
+    def to_dict(self):
+        """
+        Flat record of the result, with the raw samples of every round.
+        """
+        def finite(val):
+            return val if val is not None and math.isfinite(val) else None
+
+        card = self.card
+        est = self.estimate
+        paired = self.paired
+        return {
+            "version": __version__,
+            "name": self.name,
+            "description": self.description,
+            "unit": self.unit,
+            "result": self.result,
+            "failed": self.failed,
+            "reader": card.reader if card else None,
+            "atr": card.atr if card else None,
+            "protocol": card.protocol if card else None,
+            "started": self.started,
+            "finished": self.finished,
+            "estimator": est.method if est else None,
+            "time": est.value if est else None,
+            "ci_low": finite(est.low) if est else None,
+            "ci_high": finite(est.high) if est else None,
+            "rounds": len(self.samples.get("test", [])),
+            "adjust": self.samples.get("adjust", []),
+            "test": self.samples.get("test", []),
+            "overhead": self.samples.get("overhead", []),
+            "paired": self.samples.get("paired", []),
+            "paired_time": paired.value if paired else None,
+            "paired_low": finite(paired.low) if paired else None,
+            "paired_high": finite(paired.high) if paired else None,
+            "warmup_rounds": self.warmup_rounds,
+            "warmup_cost": self.warmup_cost,
+        }
+
+
 class Reporter:
     """
-    A simple text reporter.
+    A simple text reporter, cases may be reported from several threads and
+    several cards.
+
+    Every result is streamed to the text `report_file` and the structured
+    `stores` as soon as it is reported, so the results survive a crash. The
+    reporter must be closed after the run.
     """
-    def __init__(self):
-        self.__infos = [('Name', 'Result', "Description")]
+    def __init__(self, stores=(), report_file=None, run=None, tag_card=False):
+        self.__results = []
+        self.__lock = threading.Lock()
+        self.__stores = list(stores)
+        self.__tag_card = tag_card
+        self.run = run or time.strftime('%Y%m%d%H%M%S')
 
-    def report_case(self, case: MeasureCase, result: float):
+        for store in self.__stores:
+            store.open()
+        self.__report = None
+        if report_file is not None:
+            new = not Path(report_file).exists()
+            self.__report = open(report_file, "a")
+            if new:
+                print(self.__text_line(None, False), file=self.__report)
+                self.__report.flush()
+
+    @property
+    def results(self):
+        with self.__lock:
+            return list(self.__results)
+
+    @property
+    def cards(self):
+        cards = []
+        for res in self.results:
+            if res.card not in cards:
+                cards.append(res.card)
+        return cards
+
+    def restore(self, records):
+        """
+        Add results of an earlier, interrupted run without reporting them
+        again.
+        """
+        with self.__lock:
+            self.__results += [CaseResult.from_dict(rec) for rec in records]
+
+    def __report_result(self, res):
+        with self.__lock:
+            self.__results.append(res)
+            record = res.to_dict()
+            for store in self.__stores:
+                try:
+                    store.append(self.run, record)
+                except Exception as e:
+                    log.error(f"write result to {store.file_name} failed. {e}")
+            if self.__report is not None:
+                print(self.__text_line(res, self.__tag_card), file=self.__report)
+                self.__report.flush()
+
+    def report_result(self, res: CaseResult):
+        """
+        Report a result made by another process.
+        """
+        log.debug(f"{res.name}: {res.result} {res.unit}")
+        self.__report_result(res)
+
+    def report_case(self, case: MeasureCase, result: float, card=None):
         log.debug(f"{case.name}: {result} {case.unit}")
-        self.__infos.append((case.name, f"{result:.02f} {case.unit}",
-                             case.description))
+        self.__report_result(CaseResult(case, result, card))
 
-    def report_failure(self, case: MeasureCase):
-        self.__infos.append((case.name, "failed", case.description))
+    def report_failure(self, case: MeasureCase, card=None):
+        self.__report_result(CaseResult(case, None, card))
         log.debug(f"{case.name} failed")
 
+    def close(self):
+        with self.__lock:
+            for store in self.__stores:
+                store.close()
+            if self.__report is not None:
+                self.__report.close()
+                self.__report = None
+
+    @staticmethod
+    def __text_line(res, tag_card):
+        if res is None:
+            info = ('Name', 'Result', "Description")
+        else:
+            if res.failed:
+                text = "failed"
+            else:
+                text = f"{res.result:.02f} {res.unit}"
+            desc = res.description
+            if not res.failed and res.overhead:
+                desc = f"{desc} (T=0 overhead " \
+                    f"{res.overhead * 1000:.02f} ms)".lstrip()
+            if not res.failed and res.paired is not None:
+                desc = f"{desc} (paired {res.paired.value * 1000:.03f} ms, " \
+                    f"{res.paired.low * 1000:.03f} ~ " \
+                    f"{res.paired.high * 1000:.03f})".lstrip()
+            if tag_card and res.card is not None:
+                desc = f"[{res.card.reader}] {desc}"
+            info = (res.name, text, desc)
+        return f"{info[0]:<20s}    {info[1]:<30s}    {info[2]}"
+
     def gen_report(self, file_name):
+        """
+        Write the text report of all results at once.
+        """
+        tag_card = self.__tag_card or len(self.cards) > 1
+        with open(file_name, "w") as f:
+            print(self.__text_line(None, False), file=f)
+            for res in self.results:
+                print(self.__text_line(res, tag_card), file=f)
+
+    def gen_matrix(self, file_name):
+        """
+        Write a case x card matrix of results. The speedup of each card is
+        relative to the first card reported, computed from the measured times
+        so it does not depend on the unit of the result.
+        """
+        cards = self.cards
+        table = {}
+        names = []
+        for res in self.results:
+            if res.name not in names:
+                names.append(res.name)
+            table[res.name, res.card] = res
+
+        def cell(res, base):
+            if res is None or res.failed:
+                return "failed" if res is not None else "-"
+            text = f"{res.result:.02f} {res.unit}"
+            if base is not None and not base.failed and res is not base:
+                try:
+                    speedup = base.estimate.value / res.estimate.value
+                    text += f" (x{speedup:.02f})"
+                except (AttributeError, ZeroDivisionError):
+                    pass
+            return text
+
         with open(file_name, "w") as f:
-            for info in self.__infos:
-                print(f"{info[0]:<20s}    {info[1]:<30s}    {info[2]}", file=f)
\ No newline at end of file
+            header = [f"{'Name':<20s}"]
+            header += [f"{f'[{i}]':<30s}" for i in range(len(cards))]
+            print("    ".join(header).rstrip(), file=f)
+            for name in names:
+                base = table.get((name, cards[0]))
+                row = [f"{name:<20s}"]
+                row += [
+                    f"{cell(table.get((name, card)), base):<30s}"
+                    for card in cards
+                ]
+                print("    ".join(row).rstrip(), file=f)
+            print("", file=f)
+            for i, card in enumerate(cards):
+                print(f"[{i}] {card.reader}, ATR: {card.atr}", file=f)
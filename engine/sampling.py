@@ -0,0 +1,111 @@
+#coding:utf-8
+"""
+Orders in which the adjust and test rounds of a measure case are run.
+
+Running all adjust rounds before all test rounds lets a slow drift of the
+card or the reader, such as the card heating up, bias the difference. The
+interleaved and random orders put each test round next to an adjust round,
+so the drift cancels in the paired differences.
+"""
+
+from abc import ABC, abstractmethod
+import random
+
+ADJUST = "adjust"
+TEST = "test"
+
+
+class SamplingOrder(ABC):
+    """
+    Base class of sampling order. `sequence(n)` gives the actions of the
+    rounds to run to get `n` more samples of each action.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def sequence(self, n):
+        pass
+
+
+class BlockedOrder(SamplingOrder):
+    """
+    All the adjust rounds, then all the test rounds. The `warmup` of
+    "blocked:N" is a fixed warm-up of the case, see `WarmUp`: the first N
+    rounds of each action are run once and left out of the estimate.
+    """
+
+    name = "blocked"
+
+    def __init__(self, warmup=0):
+        warmup = int(warmup)
+        if warmup < 0:
+            raise ValueError(f"warmup {warmup} should not be negative.")
+        self.warmup = warmup
+
+    def sequence(self, n):
+        return [ADJUST] * n + [TEST] * n
+
+
+class InterleavedOrder(SamplingOrder):
+    """
+    Adjust and test rounds alternate, ABAB.
+    """
+
+    name = "interleaved"
+
+    def sequence(self, n):
+        return [action for i in range(n) for action in (ADJUST, TEST)]
+
+
+class RandomOrder(SamplingOrder):
+    """
+    Rounds in pairs of an adjust and a test round, in a random order within
+    each pair, so neither action always runs first. The order is the same
+    for the same `seed`.
+    """
+
+    name = "random"
+
+    def __init__(self, seed=0):
+        self.__rnd = random.Random(int(seed))
+
+    def sequence(self, n):
+        seq = []
+        for i in range(n):
+            pair = [ADJUST, TEST]
+            self.__rnd.shuffle(pair)
+            seq += pair
+        return seq
+
+
+ORDERS = {
+    "blocked": BlockedOrder,
+    "interleaved": InterleavedOrder,
+    "random": RandomOrder,
+}
+
+
+def get_order(spec="blocked"):
+    """
+    Get sampling order by spec string `name[:argument]`, for example
+    "interleaved", "blocked:3" (3 warm-up rounds) or "random:42" (seed).
+    """
+    name, _, arg = str(spec).partition(":")
+    try:
+        cls = ORDERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"sampling order {name} not supported.")
+    return cls(arg) if arg else cls()
+
+
+__all__ = [
+    "ADJUST",
+    "TEST",
+    "SamplingOrder",
+    "BlockedOrder",
+    "InterleavedOrder",
+    "RandomOrder",
+    "ORDERS",
+    "get_order",
+]
@@ -0,0 +1,111 @@
+#coding:utf-8
+"""
+Decide how many rounds a measure case runs.
+"""
+
+import math
+import time
+
+
+class RoundScheduler:
+    """
+    Adaptive round scheduler. A case first runs `pilot` rounds, then more
+    rounds are scheduled until the confidence interval of the estimate meets
+    `ci_width` (seconds) or `rel_error` (half width relative to the estimate),
+    the time budget is spent or `max_round` rounds are done.
+
+    Without any target or budget the case runs exactly `pilot` rounds.
+    """
+
+    def __init__(self,
+                 pilot=10,
+                 max_round=100,
+                 rel_error=None,
+                 ci_width=None,
+                 time_budget=None,
+                 growth=2.0):
+        if pilot < 1:
+            raise ValueError(f"pilot {pilot} should be positive.")
+        self.pilot = int(pilot)
+        self.max_round = max(int(max_round), self.pilot)
+        self.rel_error = rel_error
+        self.ci_width = ci_width
+        self.time_budget = time_budget
+        self.growth = float(growth)
+        self.__start = None
+        self.__budget = None
+
+    def start(self, time_budget=None):
+        """
+        Start scheduling a run, `time_budget` is the share of a global budget
+        given to the case. Return the rounds of the pilot sample.
+        """
+        budgets = [b for b in (self.time_budget, time_budget) if b is not None]
+        self.__budget = min(budgets) if budgets else None
+        self.__start = time.perf_counter()
+        return self.pilot
+
+    def __target(self, estimate):
+        targets = []
+        if self.ci_width is not None:
+            targets.append(self.ci_width)
+        if self.rel_error is not None:
+            targets.append(2 * self.rel_error * abs(estimate.value))
+        # any of the targets is good enough
+        return max(targets) if targets else None
+
+    def next_rounds(self, done, estimate):
+        """
+        Return how many more rounds to run after `done` rounds with
+        `estimate`, 0 to stop.
+        """
+        if done >= self.max_round:
+            return 0
+
+        target = self.__target(estimate)
+        if target is None and self.__budget is None:
+            return 0
+
+        growth = max(1, int(done * (self.growth - 1)))
+        if target is None:
+            n = growth
+        elif estimate.width <= target:
+            return 0
+        elif math.isinf(estimate.width):
+            n = growth
+        else:
+            # width of the interval shrinks with 1 / sqrt(rounds)
+            needed = done * (estimate.width / target)**2
+            n = min(growth, max(1, math.ceil(needed - done)))
+
+        if self.__budget is not None:
+            elapsed = time.perf_counter() - self.__start
+            n = min(n, int((self.__budget - elapsed) / (elapsed / done)))
+
+        return max(0, min(n, self.max_round - done))
+
+
+class TimeBudget:
+    """
+    Global wall-clock budget spread across measure cases. Each case gets an
+    even share of what is left when it starts, so time not used by fast cases
+    goes to the later ones.
+    """
+
+    def __init__(self, total):
+        self.total = float(total)
+        self.__start = time.perf_counter()
+
+    @property
+    def remaining(self):
+        return max(0.0, self.total - (time.perf_counter() - self.__start))
+
+    def share(self, cases_left, workers=1):
+        """
+        Budget of the next case when `cases_left` cases, including it, are run
+        by `workers` readers at once.
+        """
+        return self.remaining / max(1, math.ceil(cases_left / workers))
+
+
+__all__ = ["RoundScheduler", "TimeBudget"]
@@ -0,0 +1,333 @@
+#coding:utf-8
+"""
+Structured result stores, for tools which ingest the results of many runs.
+"""
+
+from abc import ABC, abstractmethod
+import os
+import csv
+import json
+import time
+import sqlite3
+from pathlib import Path
+import logging
+log = logging.getLogger("jcmeasure")
+
+# columns of a result record, see `CaseResult.to_dict`
+FIELDS = [
+    "run",
+    "version",
+    "name",
+    "description",
+    "unit",
+    "result",
+    "failed",
+    "reader",
+    "atr",
+    "protocol",
+    "started",
+    "finished",
+    "estimator",
+    "time",
+    "ci_low",
+    "ci_high",
+    "rounds",
+    "adjust",
+    "test",
+    "overhead",
+    "paired",
+    "paired_time",
+    "paired_low",
+    "paired_high",
+    "warmup_rounds",
+    "warmup_cost",
+]
+
+# fields kept as JSON arrays in CSV and SQLite
+_LISTS = ("adjust", "test", "overhead", "paired")
+# fields parsed back as numbers from CSV
+_FLOATS = ("result", "started", "finished", "time", "ci_low", "ci_high",
+           "paired_time", "paired_low", "paired_high", "warmup_cost")
+_INTS = ("rounds", "warmup_rounds")
+
+
+def _encode(record):
+    row = dict(record)
+    for key in _LISTS:
+        row[key] = json.dumps(row.get(key, []))
+    return row
+
+
+def _decode_lists(record):
+    for key in _LISTS:
+        # records written before the field was added have none
+        val = record.get(key)
+        record[key] = json.loads(val) if val else []
+    return record
+
+
+class ResultStore(ABC):
+    """
+    Base class of result store. Records are appended, results of earlier runs
+    in the same file are kept.
+
+    A store is a streaming sink: each appended record is flushed to the OS at
+    once so it survives the process being killed, and synced to disk after
+    `sync_every` records or `sync_interval` seconds.
+    """
+
+    def __init__(self, file_name, sync_every=10, sync_interval=5.0):
+        self.file_name = str(file_name)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.__pending = 0
+        self.__synced = time.monotonic()
+
+    def exists(self):
+        return Path(self.file_name).exists()
+
+    def write(self, run, records):
+        """
+        Append `records` of `run` at once.
+        """
+        self.open()
+        try:
+            for record in records:
+                self.append(run, record)
+        finally:
+            self.close()
+
+    def append(self, run, record):
+        self._append(run, record)
+        self.__pending += 1
+        sync = (self.__pending >= self.sync_every or
+                time.monotonic() - self.__synced >= self.sync_interval)
+        self._flush(sync)
+        if sync:
+            self.__pending = 0
+            self.__synced = time.monotonic()
+
+    def close(self):
+        self._flush(True)
+        self._close()
+        self.__pending = 0
+
+    @abstractmethod
+    def open(self):
+        pass
+
+    @abstractmethod
+    def _append(self, run, record):
+        pass
+
+    @abstractmethod
+    def _flush(self, sync):
+        pass
+
+    @abstractmethod
+    def _close(self):
+        pass
+
+    @abstractmethod
+    def read(self):
+        pass
+
+
+class _FileStore(ResultStore):
+    """
+    Store in a text file opened for appending.
+    """
+
+    def __init__(self, file_name, sync_every=10, sync_interval=5.0):
+        super().__init__(file_name, sync_every, sync_interval)
+        self._file = None
+
+    def open(self):
+        if self._file is None:
+            self._file = open(self.file_name, "a", newline="")
+
+    def _flush(self, sync):
+        if self._file is not None:
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonLinesStore(_FileStore):
+    """
+    One JSON object per line.
+    """
+
+    def _append(self, run, record):
+        print(json.dumps(dict(run=run, **record)), file=self._file)
+
+    def read(self):
+        with open(self.file_name) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class CsvStore(_FileStore):
+    """
+    Comma separated values, raw samples are JSON arrays.
+    """
+
+    def open(self):
+        new = not self.exists() or Path(self.file_name).stat().st_size == 0
+        columns = FIELDS
+        if not new:
+            with open(self.file_name, newline="") as f:
+                header = next(csv.reader(f), [])
+            columns = header + [key for key in FIELDS if key not in header]
+            if columns != header:
+                self.__add_columns(header, columns)
+        super().open()
+        self.__writer = csv.DictWriter(self._file, columns, restval="")
+        if new:
+            self.__writer.writeheader()
+
+    def __add_columns(self, header, columns):
+        """
+        Rewrite the file with its `header` and the columns added to FIELDS
+        since it was created, which the rows written before leave empty.
+        """
+        log.info(f"{self.file_name}: add columns "
+                 f"{', '.join(columns[len(header):])}")
+        tmp = f"{self.file_name}.tmp"
+        with open(self.file_name, newline="") as src, \
+                open(tmp, "w", newline="") as dst:
+            writer = csv.DictWriter(dst, columns, restval="")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, self.file_name)
+
+    def _append(self, run, record):
+        self.__writer.writerow(_encode(dict(record, run=run)))
+
+    def read(self):
+        records = []
+        with open(self.file_name, newline="") as f:
+            for row in csv.DictReader(f):
+                for key in _FLOATS:
+                    val = row.get(key)
+                    row[key] = float(val) if val else None
+                for key in _INTS:
+                    val = row.get(key)
+                    row[key] = int(val) if val else 0
+                row["failed"] = row["failed"] == "True"
+                records.append(_decode_lists(row))
+        return records
+
+
+class SqliteStore(ResultStore):
+    """
+    Append-only SQLite database with one `results` table. Every record is
+    committed to the write-ahead log, which is checkpointed on sync.
+    """
+
+    _TYPES = {
+        "result": "REAL",
+        "failed": "INTEGER",
+        "started": "REAL",
+        "finished": "REAL",
+        "time": "REAL",
+        "ci_low": "REAL",
+        "ci_high": "REAL",
+        "rounds": "INTEGER",
+        "paired_time": "REAL",
+        "paired_low": "REAL",
+        "paired_high": "REAL",
+        "warmup_rounds": "INTEGER",
+        "warmup_cost": "REAL",
+    }
+
+    def __init__(self, file_name, sync_every=10, sync_interval=5.0):
+        super().__init__(file_name, sync_every, sync_interval)
+        self.__db = None
+
+    def __connect(self):
+        db = sqlite3.connect(self.file_name, check_same_thread=False)
+        columns = ", ".join(f"{key} {self._TYPES.get(key, 'TEXT')}"
+                            for key in FIELDS)
+        db.execute("CREATE TABLE IF NOT EXISTS results "
+                   f"(id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+        # columns added to FIELDS after the table was created
+        known = {row[1] for row in db.execute("PRAGMA table_info(results)")}
+        for key in FIELDS:
+            if key not in known:
+                db.execute(f"ALTER TABLE results ADD COLUMN {key} "
+                           f"{self._TYPES.get(key, 'TEXT')}")
+        return db
+
+    def open(self):
+        if self.__db is None:
+            self.__db = self.__connect()
+            self.__db.execute("PRAGMA journal_mode=WAL")
+            self.__db.execute("PRAGMA synchronous=NORMAL")
+
+    def _append(self, run, record):
+        row = _encode(dict(record, run=run))
+        with self.__db:
+            self.__db.execute(
+                f"INSERT INTO results ({', '.join(FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(FIELDS))})",
+                [row[key] for key in FIELDS])
+
+    def _flush(self, sync):
+        if self.__db is not None and sync:
+            self.__db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def _close(self):
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+
+    def read(self):
+        db = self.__connect()
+        try:
+            rows = db.execute(
+                f"SELECT {', '.join(FIELDS)} FROM results ORDER BY id")
+            records = []
+            for row in rows:
+                record = dict(zip(FIELDS, row))
+                record["failed"] = bool(record["failed"])
+                records.append(_decode_lists(record))
+            return records
+        finally:
+            db.close()
+
+
+STORES = {
+    ".jsonl": JsonLinesStore,
+    ".json": JsonLinesStore,
+    ".csv": CsvStore,
+    ".db": SqliteStore,
+    ".sqlite": SqliteStore,
+    ".sqlite3": SqliteStore,
+}
+
+
+def open_store(file_name):
+    """
+    Open the result store of `file_name` by its suffix.
+    """
+    suffix = Path(file_name).suffix.lower()
+    try:
+        return STORES[suffix](file_name)
+    except KeyError:
+        raise ValueError(f"result store {suffix} not supported.")
+
+
+__all__ = [
+    "ResultStore",
+    "JsonLinesStore",
+    "CsvStore",
+    "SqliteStore",
+    "open_store",
+]
@@ -0,0 +1,74 @@
+#coding:utf-8
+"""
+Tests of the comparison of runs.
+"""
+
+import pytest
+
+from engine.compare import *
+from engine.compare import FAILED, MISSING, REGRESSION, SAME
+
+
+def test_mann_whitney_reference():
+    # scipy.stats.mannwhitneyu(males, females, method="asymptotic")
+    males = [19, 22, 16, 29, 24]
+    females = [20, 11, 17, 12]
+    u, p = mann_whitney(males, females)
+    assert u == 17.0
+    assert p == pytest.approx(0.11134688653314041, rel=1e-9)
+
+
+def test_mann_whitney_ties():
+    u, p = mann_whitney([1.0] * 5, [1.0] * 5)
+    assert (u, p) == (12.5, 1.0)
+    assert mann_whitney([], [1.0]) == (0.0, 1.0)
+
+
+def test_mann_whitney_shift():
+    xs = [float(i) for i in range(30)]
+    ys = [x + 20 for x in xs]
+    u, p = mann_whitney(xs, ys)
+    assert u < 450
+    assert p < 0.001
+
+
+def _record(name, failed=False, time=1.0, run="run1", reader="sim"):
+    return dict(run=run, name=name, reader=reader, failed=failed,
+                time=None if failed else time,
+                adjust=[] if failed else [0.0] * 10,
+                test=[] if failed else [time + i * 0.01 for i in range(10)])
+
+
+def test_compare_rerun():
+    # a case failed, then passed when the run was resumed
+    baseline = [_record("a"), _record("b")]
+    current = [_record("a", failed=True, run="run2"), _record("b", run="run2"),
+               _record("a", run="run2")]
+    comparisons = compare(baseline, current)
+    assert [(cmp.name, cmp.status) for cmp in comparisons] == [("a", SAME),
+                                                             ("b", SAME)]
+    assert check_regressions(comparisons) == 0
+
+
+def test_compare_failed_and_missing():
+    baseline = [_record("a"), _record("b"), _record("c", reader="other")]
+    current = [_record("a", run="run2"), _record("b", failed=True,
+                                                  run="run2"),
+               _record("c", run="run2")]
+    status = {(cmp.name, cmp.reader): cmp.status
+              for cmp in compare(baseline, current)}
+    assert status == {
+        ("a", "sim"): SAME,
+        ("b", "sim"): FAILED,
+        ("c", "sim"): MISSING,
+        ("c", "other"): MISSING,
+    }
+    assert check_regressions(compare(baseline, current)) == 1
+
+
+def test_compare_regression():
+    baseline = [_record("a")]
+    current = [_record("a", time=2.0, run="run2")]
+    [cmp] = compare(baseline, current)
+    assert cmp.status == REGRESSION
+    assert cmp.change == 1.0
@@ -0,0 +1,107 @@
+#coding:utf-8
+"""
+Tests of the estimators and the warm-up detection on synthetic samples.
+"""
+
+import math
+import random
+
+import pytest
+
+from engine.estimator import *
+from engine.warmup import change_point, warmup_cost
+
+
+def _normal(rnd, mean, sd, n):
+    return [rnd.gauss(mean, sd) for i in range(n)]
+
+
+def test_estimate_values():
+    adjust = [3.0, 1.0, 2.0, 5.0, 4.0]
+    test = [13.0, 12.0, 11.0, 30.0, 14.0]
+    assert MinEstimator().difference(adjust, test).value == 10.0
+    assert MedianEstimator().difference(adjust, test).value == 10.0
+    # 10% of 5 samples trims none, 20% one at each end
+    assert get_estimator("trimmed").difference(adjust, test).value == 13.0
+    assert get_estimator("trimmed:0.2").difference(adjust,
+                                                   test).value == 10.0
+
+
+def test_welch_known_answer():
+    # means 2 and 5, variances 1 and 4, 5 samples each: se = 1, dof 5.88,
+    # the 97.5% quantile of t is 2.459
+    est = welch_diff([1.0, 1.0, 2.0, 3.0, 3.0], [3.0, 3.0, 5.0, 7.0, 7.0])
+    assert est.value == 3.0
+    assert est.high - est.value == pytest.approx(2.459, abs=2e-3)
+    assert est.value - est.low == pytest.approx(est.high - est.value)
+
+
+@pytest.mark.parametrize("spec", ["median", "trimmed", "welch"])
+def test_ci_coverage(spec):
+    # the 95% interval should hold the true difference of 2 in about 95%
+    # of the trials
+    estimator = get_estimator(spec)
+    rnd = random.Random(1)
+    trials = 100
+    hits = 0
+    for i in range(trials):
+        adjust = _normal(rnd, 10.0, 1.0, 20)
+        test = _normal(rnd, 12.0, 1.0, 20)
+        est = estimator.difference(adjust, test)
+        hits += est.low <= 2.0 <= est.high
+    assert 0.85 <= hits / trials <= 0.99
+
+
+def test_bootstrap_ci_few_samples():
+    assert bootstrap_ci([1.0], [2.0, 3.0], min) == (-math.inf, math.inf)
+
+
+def test_paired_diff():
+    adjust = [10.0, 20.0, 30.0, 40.0, 50.0]
+    test = [12.0, 21.0, 33.0, 42.0, 52.0]
+    est = paired_diff(adjust, test)
+    assert est.method == "paired"
+    assert est.value == 2.0
+    assert 1.0 <= est.low <= est.value <= est.high <= 3.0
+    assert get_estimator("paired").difference(adjust, test).value == 2.0
+
+
+def test_paired_diff_drift():
+    # a drift of the card shared by both samples of a round cancels
+    rnd = random.Random(2)
+    drift = [i * 0.5 for i in range(50)]
+    adjust = [d + x for d, x in zip(drift, _normal(rnd, 10.0, 0.1, 50))]
+    test = [d + x for d, x in zip(drift, _normal(rnd, 13.0, 0.1, 50))]
+    est = paired_diff(adjust, test)
+    assert est.low <= 3.0 <= est.high
+    assert est.width < 0.2
+
+
+def test_paired_diff_few_samples():
+    est = paired_diff([1.0], [4.0])
+    assert est.value == 3.0
+    assert (est.low, est.high) == (-math.inf, math.inf)
+    with pytest.raises(ValueError):
+        paired_diff([], [])
+
+
+def test_change_point_step():
+    rnd = random.Random(3)
+    samples = _normal(rnd, 20.0, 0.5, 5) + _normal(rnd, 10.0, 0.5, 45)
+    assert change_point(samples) == 5
+    assert change_point(samples, max_rounds=3) == 3
+
+
+@pytest.mark.parametrize("samples", [
+    [10.0] * 50,
+    _normal(random.Random(4), 10.0, 0.5, 50),
+])
+def test_change_point_flat(samples):
+    assert change_point(samples) == 0
+
+
+def test_warmup_cost():
+    adjust = [5.0, 1.0, 1.0, 1.0]
+    test = [9.0, 2.0, 2.0, 2.0]
+    assert warmup_cost(adjust, test, 1) == 3.0
+    assert warmup_cost(adjust, test, 0) == 0.0
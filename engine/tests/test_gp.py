@@ -0,0 +1,108 @@
+#coding:utf-8
+"""
+Known-answer tests of the secure channels. The card side of each exchange
+and the expected values were computed apart from libsc, with the AES-CMAC
+and DES primitives of `cryptography`, following GP Card Specification
+E.4 (SCP02) and Amendment D 6.2 (SCP03), for the default keyset
+404142...4F, host challenge 1122334455667788 and the card challenges below.
+"""
+
+import pytest
+
+from engine.libsc import CmdAPDU, RspAPDU
+from engine.libsc.gp import *
+
+HOST_CHALLENGE = bytes.fromhex("1122334455667788")
+GET_STATUS = "80F21000024F00"
+
+
+class _Card:
+    """
+    Card side of EXTERNAL AUTHENTICATE, keeps the commands it got.
+    """
+
+    def __init__(self):
+        self.apdus = []
+
+    def transmit(self, apdu):
+        self.apdus.append(bytes(apdu))
+        return RspAPDU("9000")
+
+
+def _open(scp, init_rsp):
+    card = _Card()
+    apdu = CmdAPDU("8050FF0000")
+    apdu.data = HOST_CHALLENGE
+    scp.external_auth(card, apdu, RspAPDU(init_rsp))
+    return card.apdus[0]
+
+
+# SCP03, card challenge 0102030405060708
+SCP03_INIT = ("00000000000000000000" "ff0300" "0102030405060708"
+              "04dd0c404842a3be" "9000")
+
+
+@pytest.mark.parametrize("level, auth, wrapped", [
+    (C_MAC,
+     "8482010010cd325555a002132f8b8a0ba6268e4192",
+     "84f210000a4f0075aac3f1400673d0"),
+    (C_ENCRYPT_MAC,
+     "8482030010cd325555a002132f872b9a939fd3ade7",
+     "84f2100018075fdb1ff367e27ea0dbd2cf3b378e561ed4bd710de64998"),
+])
+def test_scp03(level, auth, wrapped):
+    scp = SCP03(level)
+    assert _open(scp, SCP03_INIT).hex() == auth
+    assert scp.is_secure()
+    assert bytes(scp.wrap(CmdAPDU(GET_STATUS))).hex() == wrapped
+
+
+def test_scp03_card_cryptogram():
+    rsp = SCP03_INIT[:-20] + "04dd0c404842a3bf" + "9000"
+    with pytest.raises(SecureChannelError):
+        _open(SCP03(C_MAC), rsp)
+
+
+# SCP02 i=55, sequence counter 0007, card challenge 010203040506
+SCP02_INIT = ("00000000000000000000" "ff02" "0007" "010203040506"
+              "384605ebcbc46f77" "9000")
+
+
+@pytest.mark.parametrize("level, auth, wrapped", [
+    (C_MAC,
+     "8482010010df3a3cd989e9ee98653680efbae72967",
+     "84f210000a4f00c041c36407abfe31"),
+    (C_ENCRYPT_MAC,
+     "8482030010df3a3cd989e9ee9879c615d256fdcc6d",
+     "84f210001072af18397787f554706cbde8445f19bb"),
+])
+def test_scp02(level, auth, wrapped):
+    scp = SCP02I55(level)
+    assert _open(scp, SCP02_INIT).hex() == auth
+    assert scp.is_secure()
+    assert bytes(scp.wrap(CmdAPDU(GET_STATUS))).hex() == wrapped
+
+
+def test_scp02_data_key():
+    scp = SCP02I55(C_MAC)
+    _open(scp, SCP02_INIT)
+    # DEK session key f39fcfb2383b09578723b8c2e03b2729
+    assert scp.encrypt_data(bytes(8)).hex() == "ed3e4dbcfd767c1c"
+
+
+def test_scp02_card_cryptogram():
+    rsp = SCP02_INIT[:-20] + "384605ebcbc46f78" + "9000"
+    with pytest.raises(SecureChannelError):
+        _open(SCP02I55(C_MAC), rsp)
+
+
+@pytest.mark.parametrize("scp, init_rsp", [
+    (SCP02I55, SCP02_INIT),
+    (SCP03, SCP03_INIT),
+])
+def test_init_update_command(scp, init_rsp):
+    # only the response of INITIALIZE UPDATE is accepted
+    apdu = CmdAPDU("80CA00CF08")
+    apdu.data = HOST_CHALLENGE
+    with pytest.raises(SecureChannelError):
+        scp(C_MAC).external_auth(_Card(), apdu, RspAPDU(init_rsp))
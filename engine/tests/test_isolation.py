@@ -0,0 +1,53 @@
+#coding:utf-8
+"""
+Tests of the quiet blocks of isolated mode.
+"""
+
+import gc
+import logging
+import threading
+
+from engine.isolation import quiet
+
+
+class _Handler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_quiet_threads():
+    log = logging.getLogger("jcmeasure")
+    handler = _Handler()
+    log.addHandler(handler)
+    level = log.level
+    log.setLevel(logging.INFO)
+    first_in = threading.Event()
+    second_out = threading.Event()
+
+    def second():
+        first_in.wait()
+        with quiet():
+            log.info("second")
+        second_out.set()
+
+    try:
+        thread = threading.Thread(target=second)
+        thread.start()
+        with quiet():
+            first_in.set()
+            second_out.wait()
+            # the other block ended while this one runs
+            assert not gc.isenabled()
+            log.info("first")
+            assert handler.messages == []
+        thread.join()
+        assert gc.isenabled()
+        assert handler.messages == ["second", "first"]
+        assert log.handlers[-1] is handler
+    finally:
+        log.removeHandler(handler)
+        log.setLevel(level)
@@ -0,0 +1,37 @@
+#coding:utf-8
+"""
+Tests of the sampling orders and the warm-up they leave to the case.
+"""
+
+import pytest
+
+from engine.sampling import *
+from engine.measurecase import MeasureCase
+from engine.warmup import WarmUp
+
+
+def test_orders():
+    assert get_order("blocked:3").sequence(2) == [ADJUST, ADJUST, TEST, TEST]
+    assert get_order("interleaved").sequence(2) == [ADJUST, TEST] * 2
+    seq = get_order("random:1").sequence(50)
+    assert all(set(seq[i:i + 2]) == {ADJUST, TEST}
+               for i in range(0, 100, 2))
+    assert seq != [ADJUST, TEST] * 50
+    with pytest.raises(ValueError):
+        get_order("sorted")
+
+
+def _case(order, warmup=None):
+    return MeasureCase("c", "", 10, "lambda t: t", "s", None, None, None,
+                       None, order=order, warmup=warmup)
+
+
+def test_blocked_warmup():
+    # the rounds of "blocked:N" are the fixed warm-up of the case
+    assert _case("blocked:3").warmup.rounds == 3
+    assert _case("blocked:3", 3).warmup.rounds == 3
+    assert _case("blocked", 2).warmup.rounds == 2
+    with pytest.raises(ValueError):
+        _case("blocked:3", 2)
+    with pytest.raises(ValueError):
+        _case("blocked:3", WarmUp(auto=True))
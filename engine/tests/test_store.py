@@ -0,0 +1,79 @@
+#coding:utf-8
+"""
+Round trip of the records of every result store.
+"""
+
+import pytest
+
+from engine.store import FIELDS, open_store
+
+RECORD = {
+    "version": "1.0",
+    "name": "aaload",
+    "description": "load of a byte array element",
+    "unit": "ms",
+    "result": 0.125,
+    "failed": False,
+    "reader": "sim",
+    "atr": "3b8f8001",
+    "protocol": "T=1",
+    "started": 1700000000.5,
+    "finished": 1700000001.25,
+    "estimator": "median",
+    "time": 0.00125,
+    "ci_low": 0.001,
+    "ci_high": 0.0015,
+    "rounds": 3,
+    "adjust": [0.01, 0.011, 0.0105],
+    "test": [0.0112, 0.0123, 0.0118],
+    "overhead": [0.0002, 0.0002, 0.0003],
+    "paired": [0.0012, 0.0013, 0.0013],
+    "paired_time": 0.0013,
+    "paired_low": 0.0012,
+    "paired_high": 0.0013,
+    "warmup_rounds": 2,
+    "warmup_cost": 0.004,
+}
+
+FAILED = dict(
+    RECORD, result=None, failed=True, estimator="", time=None, ci_low=None,
+    ci_high=None, rounds=0, adjust=[], test=[], overhead=[], paired=[],
+    paired_time=None, paired_low=None, paired_high=None, warmup_rounds=0,
+    warmup_cost=None)
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".csv", ".db"])
+def test_round_trip(tmp_path, suffix):
+    store = open_store(tmp_path / f"results{suffix}")
+    store.write("run1", [RECORD, FAILED])
+    store.write("run2", [RECORD])
+    records = store.read()
+    assert records == [
+        dict(RECORD, run="run1"),
+        dict(FAILED, run="run1"),
+        dict(RECORD, run="run2"),
+    ]
+    assert set(records[0]) == set(FIELDS)
+
+
+def test_csv_columns(tmp_path):
+    # a file written before columns were added to FIELDS
+    file_name = tmp_path / "results.csv"
+    file_name.write_text("run,name,failed,time,adjust\n"
+                         "run0,old,False,0.5,[1.0]\n")
+    store = open_store(file_name)
+    store.write("run1", [RECORD])
+    old, new = store.read()
+    assert new == dict(RECORD, run="run1")
+    assert (old["run"], old["name"], old["time"]) == ("run0", "old", 0.5)
+    assert old["adjust"] == [1.0] and old["test"] == []
+    assert old["rounds"] == 0 and old["paired_time"] is None
+    assert file_name.read_text().splitlines()[0] == ",".join(
+        ["run", "name", "failed", "time", "adjust"] +
+        [key for key in FIELDS
+         if key not in ("run", "name", "failed", "time", "adjust")])
+
+
+def test_unknown_store():
+    with pytest.raises(ValueError):
+        open_store("results.txt")
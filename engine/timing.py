@@ -0,0 +1,98 @@
+#coding:utf-8
+"""
+Calibration of the times measured through a reader.
+
+Every command is timed around the PC/SC call, so its time includes the
+round trip through the PC/SC daemon, the driver and the USB bus. The
+calibration sends a command the card rejects at once, and takes the
+shortest of its times as the overhead of one exchange.
+"""
+
+import time
+import logging
+log = logging.getLogger("jcmeasure")
+
+# INS 00 is not defined, the card answers 6D00 without running any applet
+CALIBRATION_APDU = "00000000"
+
+
+class Calibration:
+    """
+    Reader overhead of one command exchange and the resolution of the clock,
+    in seconds.
+    """
+
+    def __init__(self, overhead=0.0, resolution=0.0, rounds=0):
+        self.overhead = overhead
+        self.resolution = resolution
+        self.rounds = rounds
+
+    def net(self, elapsed, exchanges=1):
+        """
+        Time of `exchanges` commands taking `elapsed` less the overhead of
+        the reader. It may be negative for a command as fast as the
+        calibration one; it is not clamped, so that adjust and test samples
+        are corrected alike and their difference is unbiased.
+        """
+        return elapsed - exchanges * self.overhead
+
+    def bound(self, estimate):
+        """
+        Widen the confidence interval of `estimate` to at least one clock
+        step on each side, a difference of two timed intervals is not known
+        closer than that.
+        """
+        res = self.resolution
+        estimate.low = min(estimate.low, estimate.value - res)
+        estimate.high = max(estimate.high, estimate.value + res)
+        return estimate
+
+    def __repr__(self):
+        return (f"Calibration(overhead {self.overhead * 1e6:.01f} us, "
+                f"resolution {self.resolution * 1e9:.0f} ns, "
+                f"{self.rounds} rounds)")
+
+
+def clock_resolution(samples=1000) -> float:
+    """
+    Smallest step of `time.perf_counter_ns` seen in `samples` reads, not
+    below the resolution the clock announces.
+    """
+    step = None
+    clock = time.perf_counter_ns
+    last = clock()
+    for i in range(samples):
+        now = clock()
+        while now == last:
+            now = clock()
+        if step is None or now - last < step:
+            step = now - last
+        last = now
+    declared = time.get_clock_info("perf_counter").resolution
+    return max(step * 1e-9, declared)
+
+
+def calibrate(reader, rounds=50, apdu=CALIBRATION_APDU,
+              resolution=None) -> Calibration:
+    """
+    Measure the overhead of `reader`, which must be open, with `rounds`
+    exchanges of `apdu`. `CALIBRATION_APDU` is the fallback, a command of
+    the selected applet which does nothing goes through the same dispatch
+    in the card as the commands measured. The clock resolution is measured
+    unless given.
+    """
+    from .libsc import compile_apdu
+
+    if resolution is None:
+        resolution = clock_resolution()
+    apdu = compile_apdu(apdu)
+    # the first exchanges warm up the reader driver
+    for i in range(3):
+        reader.transmit(apdu)
+    times = [reader.transmit(apdu).time for i in range(rounds)]
+    cal = Calibration(min(times), resolution, rounds)
+    log.info(f"{reader.name}: {cal} with {apdu.hex()}")
+    return cal
+
+
+__all__ = ["Calibration", "CALIBRATION_APDU", "calibrate", "clock_resolution"]
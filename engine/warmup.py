@@ -0,0 +1,103 @@
+#coding:utf-8
+"""
+Warm-up detection. The first rounds after a Select may be slower while the
+card allocates applet objects, writes EEPROM or fills its caches; those
+rounds are taken out of the samples the time of a case is estimated from.
+"""
+
+import math
+
+from .estimator import _mean, _percentile, _var, _norm_ppf
+
+# a shift found among many split points must be very unlikely by chance
+_CONFIDENCE = 0.999
+
+
+def _sse(samples):
+    if not samples:
+        return 0.0
+    m = _mean(samples)
+    return sum((x - m)**2 for x in samples)
+
+
+def change_point(samples, max_rounds=None, confidence=_CONFIDENCE):
+    """
+    Count of the first `samples` before a shift of their mean to a steady
+    state, 0 if there is none. The split point minimizes the squared error
+    of both parts, it is taken if the mean of the first part is off the
+    mean of the steady part by more than the steady spread allows.
+    """
+    n = len(samples)
+    if max_rounds is None:
+        max_rounds = n // 2
+    # the steady part keeps at least half of the samples and 2 of them
+    max_rounds = min(max_rounds, n // 2, n - 2)
+    best, best_sse = 0, _sse(samples)
+    for k in range(1, max_rounds + 1):
+        sse = _sse(samples[:k]) + _sse(samples[k:])
+        if sse < best_sse:
+            best, best_sse = k, sse
+    if best == 0:
+        return 0
+
+    head, tail = samples[:best], samples[best:]
+    shift = abs(_mean(head) - _mean(tail))
+    sd = math.sqrt(_var(tail))
+    if sd == 0:
+        return best if shift > 0 else 0
+    z = _norm_ppf(1 - (1 - confidence) / 2)
+    return best if shift > z * sd / math.sqrt(best) else 0
+
+
+class WarmUp:
+    """
+    Warm-up rounds of a case, a fixed count or, when `auto`, found by
+    `change_point` in the adjust and test samples, at most `max_rounds`.
+    The same count is dropped from both, so the rounds stay paired.
+    """
+
+    def __init__(self, rounds=0, auto=False, max_rounds=None):
+        rounds = int(rounds)
+        if rounds < 0:
+            raise ValueError(f"warm-up {rounds} should not be negative.")
+        self.rounds = rounds
+        self.auto = auto
+        self.max_rounds = max_rounds
+
+    @classmethod
+    def from_spec(cls, val=0, max_rounds=None):
+        """
+        Warm-up of the `warmup` field of a case, a count of rounds or
+        "auto".
+        """
+        if isinstance(val, str) and val.lower() == "auto":
+            return cls(auto=True, max_rounds=max_rounds)
+        return cls(val or 0)
+
+    def detect(self, adjust, test):
+        if not self.auto:
+            return min(self.rounds, len(adjust), len(test))
+        return max(change_point(adjust, self.max_rounds),
+                   change_point(test, self.max_rounds))
+
+    def __repr__(self):
+        if self.auto:
+            return f"WarmUp(auto, max {self.max_rounds})"
+        return f"WarmUp({self.rounds})"
+
+
+def warmup_cost(adjust, test, rounds):
+    """
+    Time the first `rounds` test rounds took beyond the steady test time,
+    less the same for the adjust rounds, in total.
+    """
+    def excess(samples):
+        if rounds == 0 or len(samples) <= rounds:
+            return 0.0
+        steady = _percentile(sorted(samples[rounds:]), 0.5)
+        return sum(x - steady for x in samples[:rounds])
+
+    return excess(test) - excess(adjust)
+
+
+__all__ = ["WarmUp", "change_point", "warmup_cost"]
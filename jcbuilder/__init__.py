@@ -22,6 +22,30 @@ def gen_caps(packages,
                             enableint, more_apis, more_exps, map_exp)
 
 
-def convert_jca(cap_file, jca_file, jcver="222", gpver="211"):
+def convert_jca(cap_file, jca_file, jcver="222", gpver="211", base_cap=None):
+    """
+    Assemble an edited JCA file into `cap_file`. With `base_cap`, the CAP file
+    the converter wrote along with the original JCA file, it is assembled in
+    process when only method bodies were edited, see `capasm`.
+    """
     from . import jcscons
-    return jcscons.convert_jca(cap_file, jca_file, jcver, gpver)
+    return jcscons.convert_jca(cap_file, jca_file, jcver, gpver, base_cap)
+
+def gen_opcode_cases(cases=None, gendir="gen", jcver="222", gpver="211",
+                     max_cases=40, max_size=8192):
+    """
+    Build measure cases of single bytecodes, see `opgen`. `cases` are
+    OpcodeCase or names of `opgen.OPCODE_CASES`, all of them by default. They
+    are packed into applets of at most `max_cases` cases and about `max_size`
+    bytes of bytecode, each applet is installed once for all its cases. The
+    AIDs of an applet follow from its index. Return the CAP and json files to
+    install.
+    """
+    from . import jcscons
+    from . import opgen
+    table = {case.name: case for case in opgen.OPCODE_CASES}
+    if cases is None:
+        cases = opgen.OPCODE_CASES
+    cases = [table[case] if isinstance(case, str) else case for case in cases]
+    return jcscons.gen_opcode_cases(cases, gendir, jcver, gpver, max_cases,
+                                    max_size)
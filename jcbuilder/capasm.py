@@ -0,0 +1,738 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+In-process JCA assembler.
+
+A measure case edits the JCA file the converter writes along with a CAP file,
+inserting or removing bytecodes in method bodies, and assembles it back into a
+CAP file. Instead of running jcasm in a JVM, the methods of the edited JCA file
+are assembled here and relinked into the converter's CAP file: the Method,
+RefLocation, Descriptor, Class, ConstantPool, Applet, Export and Directory
+components are rewritten, the other components are copied. Like jcasm, no
+Debug component is written.
+
+The base CAP file is checked first: assembling the original JCA file must
+give back its components byte for byte. `JcaError` is raised for anything not
+handled, for example an edited constant pool or remote classes, so the caller
+can fall back to jcasm.
+'''
+
+import io
+import os
+import re
+import struct
+import zipfile
+import functools
+
+# tag of a component is its index + 1
+COMPONENTS = [
+    "Header", "Directory", "Applet", "Import", "ConstantPool", "Class",
+    "Method", "StaticField", "RefLocation", "Export", "Descriptor", "Debug"
+]
+
+_ACC_INTERFACE = 0x8
+_ACC_REMOTE = 0x2
+_METHOD_ACC_EXTENDED = 0x8
+_METHOD_ACC_ABSTRACT = 0x4
+
+# bytecodes of the Java Card virtual machine, by opcode
+_MNEMONICS = """
+nop aconst_null sconst_m1 sconst_0 sconst_1 sconst_2 sconst_3 sconst_4 sconst_5
+iconst_m1 iconst_0 iconst_1 iconst_2 iconst_3 iconst_4 iconst_5
+bspush sspush bipush sipush iipush aload sload iload
+aload_0 aload_1 aload_2 aload_3 sload_0 sload_1 sload_2 sload_3
+iload_0 iload_1 iload_2 iload_3 aaload baload saload iaload
+astore sstore istore astore_0 astore_1 astore_2 astore_3
+sstore_0 sstore_1 sstore_2 sstore_3 istore_0 istore_1 istore_2 istore_3
+aastore bastore sastore iastore pop pop2 dup dup2 dup_x swap_x
+sadd iadd ssub isub smul imul sdiv idiv srem irem sneg ineg
+sshl ishl sshr ishr sushr iushr sand iand sor ior sxor ixor
+sinc iinc s2b s2i i2b i2s icmp
+ifeq ifne iflt ifge ifgt ifle ifnull ifnonnull
+if_acmpeq if_acmpne if_scmpeq if_scmpne if_scmplt if_scmpge if_scmpgt if_scmple
+goto jsr ret stableswitch itableswitch slookupswitch ilookupswitch
+areturn sreturn ireturn return
+getstatic_a getstatic_b getstatic_s getstatic_i
+putstatic_a putstatic_b putstatic_s putstatic_i
+getfield_a getfield_b getfield_s getfield_i
+putfield_a putfield_b putfield_s putfield_i
+invokevirtual invokespecial invokestatic invokeinterface
+new newarray anewarray arraylength athrow checkcast instanceof sinc_w iinc_w
+ifeq_w ifne_w iflt_w ifge_w ifgt_w ifle_w ifnull_w ifnonnull_w
+if_acmpeq_w if_acmpne_w if_scmpeq_w if_scmpne_w
+if_scmplt_w if_scmpge_w if_scmpgt_w if_scmple_w goto_w
+getfield_a_w getfield_b_w getfield_s_w getfield_i_w
+getfield_a_this getfield_b_this getfield_s_this getfield_i_this
+putfield_a_w putfield_b_w putfield_s_w putfield_i_w
+putfield_a_this putfield_b_this putfield_s_this putfield_i_this
+""".split()
+
+OPCODES = {name: code for code, name in enumerate(_MNEMONICS)}
+OPCODES.update(impdep1=0xFE, impdep2=0xFF)
+
+# operand kinds: b/B signed/unsigned byte, s/S signed/unsigned short, i int,
+# l/L short/wide branch, c/C constant pool index of 1/2 bytes, t array type,
+# K constant pool index used only if the array type is 0
+_WIDTHS = dict(b=1, B=1, s=2, S=2, i=4, l=1, L=2, c=1, C=2, t=1, K=2)
+_RANGES = dict(b=(-128, 255), B=(0, 255), s=(-32768, 65535), S=(0, 65535),
+               i=(-2**31, 2**32 - 1), l=(-128, 127), L=(-32768, 32767),
+               c=(0, 255), C=(0, 65535), t=(0, 255), K=(0, 65535))
+_FORMATS = dict(bspush="b", sspush="s", bipush="b", sipush="s", iipush="i",
+                dup_x="B", swap_x="B", sinc="Bb", iinc="Bb", sinc_w="Bs",
+                iinc_w="Bs", ret="B", jsr="L", invokeinterface="BCB",
+                newarray="t", checkcast="tK", instanceof="tK")
+for _name in _MNEMONICS:
+    if _name in ("aload", "sload", "iload", "astore", "sstore", "istore"):
+        _FORMATS[_name] = "B"
+    elif _name.startswith(("if", "goto")):
+        _FORMATS[_name] = "L" if _name.endswith("_w") else "l"
+    elif _name.startswith(("getstatic", "putstatic", "invoke")) or \
+            _name in ("new", "anewarray"):
+        _FORMATS.setdefault(_name, "C")
+    elif _name.startswith(("getfield", "putfield")):
+        _FORMATS[_name] = "C" if _name.endswith("_w") else "c"
+
+_ATYPES = {"boolean": 10, "byte": 11, "short": 12, "int": 13}
+
+_METHOD = re.compile(
+    r"\.method\s+((?:\w+\s+)*?)([\w<>$]+)\s*(\([^)]*\)\S+?)(?:\s+\d+)?\s*([{;])$")
+_LABEL = re.compile(r"([A-Za-z_$][\w$]*):\s*")
+
+
+class JcaError(Exception):
+    pass
+
+
+class _Method:
+    """
+    A method of a class in a JCA file.
+    """
+
+    def __init__(self, name, sig, modifiers):
+        self.name = name
+        self.sig = sig
+        self.modifiers = modifiers
+        self.stack = 0
+        self.locals = 0
+        # (labels, mnemonic, operands), mnemonic is None for trailing labels
+        self.code = []
+        # (start, end, handler, catch_type_index)
+        self.handlers = []
+        # normalized lines of the body, to reuse assembled methods
+        self.body = []
+
+
+def _parse_jca(text):
+    """
+    Return (skeleton, methods): the methods of the classes of a JCA file in
+    order, and every line outside of the method bodies.
+    """
+    skeleton = []
+    methods = []
+    blocks = []
+    method = None
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = " ".join(line.split("//", 1)[0].split())
+        if not line:
+            continue
+        kind = blocks[-1] if blocks else None
+        try:
+            if kind == ".exceptionTable":
+                method.body.append(line)
+                if line == "}":
+                    blocks.pop()
+                else:
+                    method.handlers.append(line.rstrip(";").split())
+                continue
+            if kind == ".method" and line != "}":
+                method.body.append(line)
+                if line.endswith("{"):
+                    blocks.append(line.split()[0])
+                else:
+                    _parse_statement(method, line)
+                continue
+            if line == "}":
+                if not blocks:
+                    raise JcaError("unbalanced '}'")
+                blocks.pop()
+            elif line.startswith(".method"):
+                m = _METHOD.match(line)
+                if m is None:
+                    raise JcaError("bad method declaration")
+                method = _Method(m.group(2), m.group(3), m.group(1).split())
+                if ".class" in blocks:
+                    methods.append(method)
+                if m.group(4) == "{":
+                    blocks.append(".method")
+            elif line.endswith("{"):
+                blocks.append(line.split()[0])
+            skeleton.append(line)
+        except (JcaError, ValueError, IndexError) as e:
+            raise JcaError(f"line {lineno}: {e or 'syntax error'}: {line}")
+    if blocks:
+        raise JcaError(f"unclosed block {blocks[-1]}")
+    return skeleton, methods
+
+
+def _parse_statement(method, line):
+    if line.startswith("."):
+        words = line.rstrip(";").split()
+        if words[0] == ".stack":
+            method.stack = _number(words[1])
+        elif words[0] == ".locals":
+            method.locals = _number(words[1])
+        # other directives, as .descriptor, are not in the Method component
+        return
+    labels = []
+    m = _LABEL.match(line)
+    while m is not None:
+        labels.append(m.group(1))
+        line = line[m.end():]
+        m = _LABEL.match(line)
+    words = line.rstrip(";").split()
+    if words:
+        method.code.append((labels, words[0], words[1:]))
+    elif labels:
+        method.code.append((labels, None, []))
+
+
+def _number(word):
+    try:
+        return int(word, 0)
+    except ValueError:
+        return int(word, 10)
+
+
+def _atype(word):
+    name = word.lower().replace("[]", "")
+    if name.startswith("t_"):
+        name = name[2:]
+    if name in _ATYPES:
+        return _ATYPES[name]
+    return _number(word)
+
+
+def _nargs(method):
+    """
+    Words of the arguments, including `this` of instance methods.
+    """
+    params = method.sig[1:method.sig.index(")")]
+    nargs = 0 if "static" in method.modifiers else 1
+    i = 0
+    while i < len(params):
+        while params[i] == "[":
+            i += 1
+        if params[i] == "L":
+            i = params.index(";", i)
+            nargs += 1
+        elif params[i] == "I" and params[i - 1:i] != "[":
+            nargs += 2
+        else:
+            nargs += 1
+        i += 1
+    return nargs
+
+
+def _header(method):
+    flags = _METHOD_ACC_ABSTRACT if "abstract" in method.modifiers else 0
+    nargs = _nargs(method)
+    values = (method.stack, nargs, method.locals)
+    if any(not 0 <= val <= 255 for val in values):
+        raise JcaError(f"{method.name}: stack, nargs or locals out of range")
+    if any(val > 15 for val in values):
+        return bytes([(flags | _METHOD_ACC_EXTENDED) << 4]) + bytes(values)
+    return bytes([flags << 4 | method.stack, nargs << 4 | method.locals])
+
+
+def _size(mnemonic, operands):
+    n = len(operands)
+    if mnemonic == "stableswitch":
+        return 7 + 2 * (n - 3)
+    if mnemonic == "itableswitch":
+        return 11 + 2 * (n - 3)
+    if mnemonic == "slookupswitch":
+        return 5 + 4 * _number(operands[1])
+    if mnemonic == "ilookupswitch":
+        return 5 + 6 * _number(operands[1])
+    return 1 + sum(_WIDTHS[kind] for kind in _FORMATS.get(mnemonic, ""))
+
+
+def _pack(kind, value):
+    low, high = _RANGES[kind]
+    if not low <= value <= high:
+        if kind == "l":
+            raise JcaError(f"branch offset {value} out of range, "
+                           "use the _w instruction")
+        raise JcaError(f"operand {value} out of range")
+    width = _WIDTHS[kind]
+    return (value & ((1 << 8 * width) - 1)).to_bytes(width, "big")
+
+
+def _encode(code, mnemonic, operands, labels, refs):
+    """
+    Append an instruction to `code`, and the offsets and sizes of its
+    constant pool indices to `refs`.
+    """
+    pc = len(code)
+    try:
+        code.append(OPCODES[mnemonic])
+    except KeyError:
+        raise JcaError(f"unknown instruction {mnemonic}")
+
+    def target(word):
+        if word in labels:
+            return labels[word] - pc
+        return _number(word)
+
+    if mnemonic.endswith("switch"):
+        wide = "i" if mnemonic[0] == "i" else "s"
+        code += _pack("L", target(operands[0]))
+        if mnemonic.endswith("tableswitch"):
+            low, high = _number(operands[1]), _number(operands[2])
+            if high - low + 1 != len(operands) - 3:
+                raise JcaError(f"{mnemonic} needs {high - low + 1} offsets")
+            code += _pack(wide, low) + _pack(wide, high)
+            for word in operands[3:]:
+                code += _pack("L", target(word))
+        else:
+            npairs = _number(operands[1])
+            if len(operands) != 2 + 2 * npairs:
+                raise JcaError(f"{mnemonic} needs {npairs} pairs")
+            code += _pack("S", npairs)
+            for match, word in zip(operands[2::2], operands[3::2]):
+                code += _pack(wide, _number(match)) + _pack("L", target(word))
+        return
+
+    kinds = _FORMATS.get(mnemonic, "")
+    if len(operands) != len(kinds):
+        raise JcaError(f"{mnemonic} needs {len(kinds)} operands")
+    atype = None
+    for kind, word in zip(kinds, operands):
+        if kind in "lL":
+            value = target(word)
+        elif kind == "t":
+            value = atype = _atype(word)
+        else:
+            value = _number(word)
+        if kind in "cC" or (kind == "K" and atype == 0):
+            refs.append((len(code), _WIDTHS[kind]))
+        code += _pack(kind, value)
+
+
+class _Assembled:
+    """
+    The method_info of a method. Offsets are relative to the method_info.
+    """
+
+    def __init__(self, method):
+        header = _header(method)
+        labels = {}
+        pc = len(header)
+        for labs, mnemonic, operands in method.code:
+            for label in labs:
+                if label in labels:
+                    raise JcaError(f"{method.name}: duplicate label {label}")
+                labels[label] = pc
+            if mnemonic is not None:
+                pc += _size(mnemonic, operands)
+
+        code = bytearray(header)
+        self.refs = []
+        for labs, mnemonic, operands in method.code:
+            if mnemonic is not None:
+                # branches are relative to the opcode, not the method_info
+                _encode(code, mnemonic, operands, labels, self.refs)
+        if len(code) != pc:
+            raise JcaError(f"{method.name}: bad operands")
+
+        self.info = bytes(code)
+        self.code_start = len(header)
+        self.handlers = []
+        for words in method.handlers:
+            if len(words) != 4:
+                raise JcaError(f"{method.name}: bad exception handler")
+            start, end, handler = [
+                self.__label(labels, word, method) for word in words[:3]
+            ]
+            self.handlers.append((start, end, handler, _number(words[3])))
+
+    @staticmethod
+    def __label(labels, word, method):
+        for name in (word, "L" + word):
+            if name in labels:
+                return labels[name]
+        raise JcaError(f"{method.name}: unknown label {word}")
+
+
+class _Cursor:
+    """
+    Read a component, checking it is parsed to the end.
+    """
+
+    def __init__(self, data, tag):
+        if len(data) < 3 or data[0] != tag or \
+                struct.unpack_from(">H", data, 1)[0] + 3 != len(data):
+            raise JcaError(f"bad {COMPONENTS[tag - 1]} component")
+        self.data = data
+        self.pos = 3
+        self.tag = tag
+
+    def u1(self):
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def u2(self):
+        self.pos += 2
+        return struct.unpack_from(">H", self.data, self.pos - 2)[0]
+
+    def skip(self, n):
+        self.pos += n
+
+    @property
+    def more(self):
+        return self.pos < len(self.data)
+
+    def end(self):
+        if self.pos != len(self.data):
+            raise JcaError(f"bad {COMPONENTS[self.tag - 1]} component")
+
+
+def _applet_fields(data):
+    cur = _Cursor(data, 3)
+    fields = []
+    for _ in range(cur.u1()):
+        cur.skip(cur.u1())
+        fields.append(cur.pos)
+        cur.skip(2)
+    cur.end()
+    return fields
+
+
+def _constant_pool_fields(data):
+    cur = _Cursor(data, 5)
+    fields = []
+    for _ in range(cur.u2()):
+        tag = cur.u1()
+        # internal CONSTANT_StaticMethodref: padding, offset
+        if tag == 6 and not data[cur.pos] & 0x80:
+            fields.append(cur.pos + 1)
+        cur.skip(3)
+    cur.end()
+    return fields
+
+
+def _class_fields(data, signature_pool):
+    cur = _Cursor(data, 6)
+    fields = []
+    if signature_pool:
+        cur.skip(cur.u2())
+    while cur.more:
+        bitfield = cur.u1()
+        flags, count = bitfield >> 4, bitfield & 0xF
+        if flags & _ACC_REMOTE:
+            raise JcaError("remote classes are not supported")
+        if flags & _ACC_INTERFACE:
+            cur.skip(2 * count)
+            continue
+        # super_class_ref, declared_instance_size, first_reference_token,
+        # reference_count, public_method_table_base
+        cur.skip(6)
+        public_count = cur.u1()
+        cur.skip(1)
+        package_count = cur.u1()
+        for _ in range(public_count + package_count):
+            fields.append(cur.pos)
+            cur.skip(2)
+        for _ in range(count):
+            cur.skip(2)
+            cur.skip(cur.u1())
+    cur.end()
+    return fields
+
+
+def _export_fields(data):
+    cur = _Cursor(data, 10)
+    fields = []
+    for _ in range(cur.u1()):
+        cur.skip(2)
+        field_count = cur.u1()
+        method_count = cur.u1()
+        cur.skip(2 * field_count)
+        for _ in range(method_count):
+            fields.append(cur.pos)
+            cur.skip(2)
+    cur.end()
+    return fields
+
+
+def _descriptor_methods(data):
+    """
+    Offsets of the method_descriptor_info items.
+    """
+    cur = _Cursor(data, 11)
+    methods = []
+    for _ in range(cur.u1()):
+        # token, access_flags, this_class_ref
+        cur.skip(4)
+        interface_count = cur.u1()
+        field_count = cur.u2()
+        method_count = cur.u2()
+        cur.skip(2 * interface_count + 7 * field_count)
+        for _ in range(method_count):
+            methods.append(cur.pos)
+            cur.skip(12)
+    cur.skip(2 * cur.u2())
+    while cur.more:
+        cur.skip((cur.u1() + 1) // 2)
+    cur.end()
+    return methods
+
+
+def _directory_count(data, counts):
+    """
+    Number of entries of component_sizes, 12 since CAP format 2.2.
+    """
+    for count in counts:
+        cur = _Cursor(data, 2)
+        # component_sizes, static_field_size, import_count, applet_count
+        cur.skip(2 * count + 6 + 2)
+        if cur.pos >= len(data):
+            continue
+        for _ in range(cur.u1()):
+            cur.skip(3)
+            if cur.pos >= len(data):
+                break
+            cur.skip(cur.u1())
+        if cur.pos == len(data):
+            return count
+    raise JcaError("bad Directory component")
+
+
+def _component(tag, info):
+    return bytes([tag]) + struct.pack(">H", len(info)) + info
+
+
+def _ref_location(refs):
+    """
+    RefLocation component: offsets of the constant pool indices of 1 and 2
+    bytes, each relative to the previous one, 255 meaning 255 bytes further.
+    """
+    info = bytearray()
+    for size in (1, 2):
+        deltas = bytearray()
+        last = 0
+        for offset in sorted(off for off, s in refs if s == size):
+            delta = offset - last
+            last = offset
+            while delta >= 255:
+                deltas.append(255)
+                delta -= 255
+            deltas.append(delta)
+        info += struct.pack(">H", len(deltas)) + deltas
+    return _component(9, bytes(info))
+
+
+class Assembler:
+    """
+    Assemble edited copies of the JCA file written by the converter along
+    with `base_cap`, by default the JCA file next to it.
+    """
+
+    def __init__(self, base_cap, base_jca=None):
+        self.base_cap = str(base_cap)
+        base_jca = base_jca or os.path.splitext(self.base_cap)[0] + ".jca"
+        with zipfile.ZipFile(self.base_cap) as zf:
+            self.__entries = [(info, zf.read(info)) for info in zf.infolist()]
+        self.__components = {}
+        for info, data in self.__entries:
+            name = info.filename.rsplit("/", 1)[-1]
+            if "/javacard/" in info.filename and name.endswith(".cap"):
+                self.__components[name[:-4]] = data
+        for name in ("Header", "Directory", "Method", "RefLocation",
+                     "Descriptor"):
+            if name not in self.__components:
+                raise JcaError(f"{self.base_cap} has no {name} component")
+
+        comps = self.__components
+        major, minor = comps["Header"][8], comps["Header"][7]
+        counts = (12, 11) if (major, minor) >= (2, 2) else (11, 12)
+        self.__dir_count = _directory_count(comps["Directory"], counts)
+        # offsets of the fields holding method offsets, by component
+        parsers = {
+            "Applet": _applet_fields,
+            "ConstantPool": _constant_pool_fields,
+            "Class": functools.partial(
+                _class_fields, signature_pool=(major, minor) >= (2, 2)),
+            "Export": _export_fields,
+        }
+        self.__fields = {
+            name: parse(comps[name])
+            for name, parse in parsers.items() if name in comps
+        }
+        self.__descriptor = _descriptor_methods(comps["Descriptor"])
+
+        with open(base_jca) as f:
+            self.__skeleton, methods = _parse_jca(f.read())
+        self.__cache = {}
+        self.__base = [self.__assemble(method) for method in methods]
+        self.__offsets = self.__layout(self.__base)[0]
+
+        # relinking the original methods must give the converter's components
+        linked = self.__link(self.__base)
+        for name, data in linked.items():
+            if name != "Directory" and data != comps.get(name):
+                raise JcaError(f"{base_jca} does not assemble to the {name} "
+                               f"component of {self.base_cap}")
+
+    def __assemble(self, method):
+        key = (method.name, method.sig, tuple(method.modifiers),
+               tuple(method.body))
+        asm = self.__cache.get(key)
+        if asm is None:
+            asm = self.__cache[key] = _Assembled(method)
+        return asm
+
+    @staticmethod
+    def __layout(methods):
+        """
+        Return the offsets of the methods in the Method component and the
+        index of their first exception handler.
+        """
+        offset = 1 + 8 * sum(len(asm.handlers) for asm in methods)
+        offsets, first = [], []
+        index = 0
+        for asm in methods:
+            offsets.append(offset)
+            first.append(index)
+            offset += len(asm.info)
+            index += len(asm.handlers)
+        return offsets, first
+
+    def __link(self, methods):
+        """
+        Return the components changed by linking `methods`.
+        """
+        offsets, first = self.__layout(methods)
+        if offsets and offsets[-1] + len(methods[-1].info) > 0x7FFF:
+            raise JcaError("Method component too large")
+        moved = dict(zip(self.__offsets, offsets))
+
+        handlers = []
+        refs = []
+        for asm, offset in zip(methods, offsets):
+            refs += [(offset + off, size) for off, size in asm.refs]
+            handlers += [(offset + start, end - start, offset + handler, catch)
+                         for start, end, handler, catch in asm.handlers]
+        if len(handlers) > 255:
+            raise JcaError("too many exception handlers")
+        info = bytearray([len(handlers)])
+        for i, (start, length, handler, catch) in enumerate(handlers):
+            # the stop bit is set if no succeeding handler contains this one
+            stop = not any(s <= start and start + length <= s + n
+                           for s, n, _, _ in handlers[i + 1:])
+            info += struct.pack(">HHHH", start, stop << 15 | length, handler,
+                                catch)
+            if catch:
+                refs.append((1 + 8 * i + 6, 2))
+        for asm in methods:
+            info += asm.info
+
+        comps = self.__components
+        linked = {
+            "Method": _component(7, bytes(info)),
+            "RefLocation": _ref_location(refs),
+        }
+
+        def relocate(offset):
+            try:
+                return moved[offset]
+            except KeyError:
+                raise JcaError(f"no method at offset {offset}")
+
+        for name, fields in self.__fields.items():
+            data = bytearray(comps[name])
+            for pos in fields:
+                offset = struct.unpack_from(">H", data, pos)[0]
+                if name != "Class" or offset != 0xFFFF:
+                    struct.pack_into(">H", data, pos, relocate(offset))
+            linked[name] = bytes(data)
+
+        data = bytearray(comps["Descriptor"])
+        index = {offset: i for i, offset in enumerate(self.__offsets)}
+        for pos in self.__descriptor:
+            offset, _, _, count, handler_index = struct.unpack_from(
+                ">HHHHH", data, pos + 2)
+            # methods of interfaces are not in the Method component
+            if offset == 0:
+                continue
+            i = index.get(offset)
+            if i is None:
+                raise JcaError(f"no method at offset {offset}")
+            asm = methods[i]
+            if asm.handlers:
+                handler_index = first[i]
+            elif count:
+                handler_index = 0
+            struct.pack_into(">H", data, pos + 2, offsets[i])
+            struct.pack_into(">HHH", data, pos + 6,
+                             len(asm.info) - asm.code_start,
+                             len(asm.handlers), handler_index)
+        linked["Descriptor"] = bytes(data)
+
+        data = bytearray(comps["Directory"])
+        sizes = {"Method": len(linked["Method"]) - 3,
+                 "RefLocation": len(linked["RefLocation"]) - 3,
+                 "Debug": 0}
+        for name, size in sizes.items():
+            tag = COMPONENTS.index(name) + 1
+            if tag <= self.__dir_count:
+                struct.pack_into(">H", data, 1 + 2 * tag, size)
+        linked["Directory"] = bytes(data)
+        return linked
+
+    def assemble(self, jca_text):
+        """
+        Assemble the text of an edited JCA file, return the CAP file content.
+        """
+        skeleton, methods = _parse_jca(jca_text)
+        if skeleton != self.__skeleton:
+            raise JcaError("only edits of method bodies are supported")
+        linked = self.__link([self.__assemble(method) for method in methods])
+
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as zf:
+            for info, data in self.__entries:
+                name = info.filename.rsplit("/", 1)[-1][:-4]
+                if "/javacard/" in info.filename and name == "Debug":
+                    continue
+                if "/javacard/" in info.filename and name in linked:
+                    data = linked[name]
+                zf.writestr(info, data)
+        return out.getvalue()
+
+    def assemble_file(self, cap_file, jca_file):
+        with open(jca_file) as f:
+            data = self.assemble(f.read())
+        with open(cap_file, "wb") as f:
+            f.write(data)
+
+
+@functools.lru_cache(maxsize=32)
+def _assembler(base_cap, base_jca, mtimes):
+    return Assembler(base_cap, base_jca)
+
+
+def assemble(cap_file, jca_file, base_cap, base_jca=None):
+    """
+    Assemble `jca_file`, an edited copy of the JCA file written by the
+    converter along with `base_cap`, into `cap_file`. The base is parsed once
+    while its files are unchanged.
+    """
+    base_cap = os.path.abspath(str(base_cap))
+    base_jca = os.path.abspath(
+        str(base_jca or os.path.splitext(base_cap)[0] + ".jca"))
+    mtimes = (os.stat(base_cap).st_mtime_ns, os.stat(base_jca).st_mtime_ns)
+    _assembler(base_cap, base_jca, mtimes).assemble_file(cap_file, jca_file)
+
+
+__all__ = ["JcaError", "Assembler", "assemble"]
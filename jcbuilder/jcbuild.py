@@ -2,6 +2,9 @@
 # -*- coding:utf-8 -*-
 
 import os
+import glob
+from . import jcworker
+
 def bytes_to_str(bytes, lower=True, prefix='', suffix='', sep=' '):
     if not isinstance(bytes, str):
         raise TypeError("bytes must be a str.")
@@ -29,54 +32,60 @@ def str_to_bytes(s):
     else:
         raise ValueError("cannot convert to bytes from \"%s\"" % s)
 
+def _abspath(path):
+    # the worker JVM resolves relative paths against its own working directory
+    return os.path.abspath(os.path.normpath(path))
+
 def compile_package(package_name, srcdir, outdir, jcver, gpver, debug, more_apis):
     if not os.path.exists(outdir):
         os.makedirs(outdir)
     javaver = "1.5" if jcver != "221" else "1.2"
     libpath = os.path.join(os.path.dirname(__file__), "jclib")
-    classpath = os.pathsep.join([libpath + "/jc" + jcver + "/api.jar",
+    classpath = os.pathsep.join([_abspath(p) for p in [libpath + "/jc" + jcver + "/api.jar",
                                  libpath + "/gp" + gpver + "/api.jar",
-                                ] + (list(more_apis) if more_apis else []) + [outdir])
+                                ] + (list(more_apis) if more_apis else []) + [outdir]])
     sourcepath = os.path.join(srcdir, package_name.replace(".", os.sep))
-    dbgflag = "-g" if debug else ""
-    cmd = "javac -Xlint:-options -classpath {classpath} -target {javaver} -source {javaver} -d {outdir} {dbgflag} {sourcepath}/*.java".format(**locals())
-    cmd = os.path.normpath(cmd)
-    print(cmd)
-    ret = os.system(cmd)
+    args = ["-Xlint:-options", "-classpath", classpath, "-target", javaver, "-source", javaver, "-d", _abspath(outdir)]
+    if debug:
+        args.append("-g")
+    args += sorted(_abspath(f) for f in glob.glob(os.path.join(sourcepath, "*.java")))
+    ret = jcworker.run_javac(args)
     if ret != 0:
         raise Exception("Compile package failed.")
 
+def _tool_classpath(jcver):
+    libpath = os.path.join(os.path.dirname(__file__), "jclib")
+    return os.pathsep.join([_abspath(libpath + "/jc" + jcver + "/converter.jar"),
+                            _abspath(libpath + "/jc" + jcver + "/offcardverifier.jar")])
+
 def convert_package(package_info, classdir, outdir, jcver, gpver, debug, enableint, more_exps, map_exp):
     if not os.path.exists(outdir):
         os.makedirs(outdir)
     libpath = os.path.join(os.path.dirname(__file__), "jclib")
-    dbgflag = "-debug" if debug else ""
-    intflag = "-i" if enableint else ""
-    mapflag = "-exportmap" if map_exp else ""
-    exppath = os.pathsep.join([libpath + "/jc" + jcver + "/api_export_files",
+    exppath = os.pathsep.join([_abspath(p) for p in [libpath + "/jc" + jcver + "/api_export_files",
                                libpath + "/gp" + gpver + "/api_export_files",
-                              ] + (list(more_exps) if more_exps else []) + [outdir])
+                              ] + (list(more_exps) if more_exps else []) + [outdir]])
     pkgname = package_info["name"]
     pkgaid = bytes_to_str(str_to_bytes(package_info["aid"]), prefix="0x", sep=":")
     pkgver = package_info["version"]
-    appcmds = []
+    args = ["-exportpath", exppath, "-out", "JCA", "CAP", "EXP", "-classdir", _abspath(classdir), "-d", _abspath(outdir)]
+    if map_exp:
+        args.append("-exportmap")
+    if enableint:
+        args.append("-i")
+    if debug:
+        args.append("-debug")
     for app in package_info.get("applets", []):
-        appcmds.append("-applet %s %s" % (bytes_to_str(str_to_bytes(app["aid"]), prefix="0x", sep=":"), app["name"]))
-    appcmds = " ".join(appcmds)
+        args += ["-applet", bytes_to_str(str_to_bytes(app["aid"]), prefix="0x", sep=":"), app["name"]]
+    args += [pkgname, pkgaid, pkgver]
     cvtclass = "com.sun.javacard.converter.Converter"
 
-    convert = "java -classpath {libpath}/jc{jcver}/converter.jar;{libpath}/jc{jcver}/offcardverifier.jar {cvtclass} -exportpath {exppath} -out JCA CAP EXP -classdir {classdir} -d {outdir} {mapflag} {intflag} {dbgflag} {appcmds} {pkgname} {pkgaid} {pkgver}".format(**locals())
-    convert = os.path.normpath(convert)
-    print(convert)
-    ret = os.system(convert)
+    ret = jcworker.run_java(_tool_classpath(jcver), cvtclass, args)
     if ret != 0:
         raise Exception("Convert package failed.")
 
 def convert_jca(out_file, jca_file, jcver, gpver):
     cvtclass = "com.sun.javacard.jcasm.cap.Main"
-    libpath = os.path.join(os.path.dirname(__file__), "jclib")
-    convert = f"java -classpath {libpath}/jc{jcver}/converter.jar;{libpath}/jc{jcver}/offcardverifier.jar {cvtclass} -o {out_file} {jca_file}"
-    print(convert)
-    ret = os.system(convert)
+    ret = jcworker.run_java(_tool_classpath(jcver), cvtclass, ["-o", _abspath(out_file), _abspath(jca_file)])
     if ret != 0:
         raise Exception(("Convert jca failed."))
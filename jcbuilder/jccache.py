@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Content-addressed cache of built CAP, EXP, JCA and class files.
+
+An entry is keyed on the hash of everything the build reads: source files,
+export files and jars, tool versions and flags. The cache directory is
+JCBUILDER_CACHE, default ~/.cache/jcbuilder; it may be shared by several
+machines over NFS. Set JCBUILDER_CACHE=off to disable it.
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+# bump to invalidate all entries when the build itself changes
+_VERSION = 1
+
+
+def cache_dir():
+    path = os.environ.get("JCBUILDER_CACHE")
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache", "jcbuilder")
+    elif path.lower() in ("", "0", "off", "none"):
+        return None
+    return path
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tree_hash(path, suffix):
+    """
+    Hash of the files ending with `suffix` under `path`, by relative path.
+    """
+    files = {}
+    if os.path.isfile(path):
+        return file_hash(path)
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            if name.endswith(suffix):
+                full = os.path.join(root, name)
+                files[os.path.relpath(full, path).replace(os.sep, "/")] = \
+                    file_hash(full)
+    return files
+
+
+def make_key(**parts):
+    """
+    Key of an entry, `parts` must be JSON serializable.
+    """
+    data = json.dumps(
+        dict(parts, _version=_VERSION), sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _entry(key):
+    root = cache_dir()
+    if root is None:
+        return None
+    return os.path.join(root, key[:2], key)
+
+
+def fetch(key, outdir):
+    """
+    Copy the files of entry `key` into `outdir`, return False on a miss.
+    """
+    entry = _entry(key)
+    if entry is None or not os.path.isdir(entry):
+        return False
+    try:
+        with open(os.path.join(entry, "MANIFEST")) as f:
+            names = json.load(f)
+        for name in names:
+            dst = os.path.join(outdir, name)
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+            shutil.copyfile(os.path.join(entry, name), dst)
+    except (OSError, ValueError) as e:
+        print(f"jccache: broken entry {key}: {e}")
+        return False
+    print(f"jccache: fetched {key[:12]} into {outdir}")
+    return True
+
+
+def store(key, outdir, names):
+    """
+    Store `names`, paths relative to `outdir`, as entry `key`. The entry is
+    written aside and renamed into place, so readers never see it half done.
+    """
+    entry = _entry(key)
+    if entry is None or os.path.isdir(entry):
+        return
+    parent = os.path.dirname(entry)
+    tmp = None
+    try:
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+        for name in names:
+            dst = os.path.join(tmp, name)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(os.path.join(outdir, name), dst)
+        with open(os.path.join(tmp, "MANIFEST"), "w") as f:
+            json.dump([name.replace(os.sep, "/") for name in names], f)
+        try:
+            os.rename(tmp, entry)
+            tmp = None
+        except OSError:
+            # stored by another build meanwhile
+            pass
+    except OSError as e:
+        print(f"jccache: cannot store {key}: {e}")
+    finally:
+        # a failed or interrupted store leaves no half written entry behind
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -3,9 +3,65 @@
 
 import os
 import re
+import json
+import functools
+import subprocess
 import SCons.Builder
 import SCons.Environment
 from . import jcbuild
+from . import jccache
+from . import capasm
+from . import opgen
+
+_LIBPATH = os.path.join(os.path.dirname(__file__), "jclib")
+
+@functools.lru_cache()
+def _jclib_hash(name):
+    return jccache.tree_hash(os.path.join(_LIBPATH, name), "")
+
+@functools.lru_cache()
+def _tool_version(tool):
+    # javac 8 and java print the version to stderr
+    try:
+        return subprocess.run([tool, "-version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True).stdout.strip()
+    except OSError:
+        return None
+
+def _find_imports(sources):
+    importpkgs = []
+    for srcname in sources:
+        importpkgs += re.findall(r"import ([^;]+)\.(?:\*|\w+);", open(srcname).read())
+    return list(set(importpkgs))
+
+def _package_key(pkg, packages, srcdir, outdir, jcver, gpver, debug, enableint, more_apis, more_exps, map_exp):
+    pkgdir = os.path.join(srcdir, pkg["name"].replace(".", os.sep))
+    sources = [os.path.join(pkgdir, fname) for fname in os.listdir(pkgdir) if fname.endswith(".java")]
+    importpkgs = _find_imports(sources)
+    imports = {}
+    for _pkg in packages:
+        if _pkg["name"] in importpkgs and _pkg != pkg:
+            # export file of a package built before this one
+            exp = os.path.join(outdir, _pkg["name"].replace(".", os.sep), "javacard", _pkg["name"].split(".")[-1] + ".exp")
+            imports[_pkg["name"]] = jccache.file_hash(exp) if os.path.exists(exp) else None
+    return jccache.make_key(
+        tool="gen_caps",
+        package=pkg,
+        sources={os.path.basename(f): jccache.file_hash(f) for f in sources},
+        imports=imports,
+        jclib=[_jclib_hash("jc" + jcver), _jclib_hash("gp" + gpver)],
+        # the class files depend on the compiler, which is the one of the
+        # java of the worker JVMs unless they are disabled
+        jdk=[_tool_version("javac"), _tool_version("java")],
+        more_apis=[jccache.tree_hash(p, ".jar") for p in more_apis or []],
+        more_exps=[jccache.tree_hash(p, ".exp") for p in more_exps or []],
+        flags=[debug, enableint, map_exp])
+
+def _package_outputs(pkg, outdir):
+    pkgdir = pkg["name"].replace(".", os.sep)
+    names = [os.path.join(pkgdir, fname) for fname in os.listdir(os.path.join(outdir, pkgdir)) if fname.endswith(".class")]
+    cvtdir = os.path.join(pkgdir, "javacard")
+    names += [os.path.join(cvtdir, fname) for fname in os.listdir(os.path.join(outdir, cvtdir))]
+    return names
 
 def build_cap(target, source, env):
     packages, srcdir, outdir, jcver, gpver, debug, enableint, more_apis, more_exps, map_exp = env["JCARGS"]
@@ -16,8 +72,12 @@ def build_cap(target, source, env):
             if not _srcdir.endswith(os.path.normcase(srcdir)):
                 continue
             _outdir = os.path.dirname(os.path.dirname(str(target[0])))[:-len(pkg["name"])-1]
+            key = _package_key(pkg, packages, _srcdir, _outdir, jcver, gpver, debug, enableint, more_apis, more_exps, map_exp)
+            if jccache.fetch(key, _outdir):
+                continue
             jcbuild.compile_package(pkg["name"], _srcdir, _outdir, jcver, gpver, debug, more_apis)
             jcbuild.convert_package(pkg, _outdir,_outdir, jcver, gpver, debug, enableint, more_exps, map_exp)
+            jccache.store(key, _outdir, _package_outputs(pkg, _outdir))
 
 def gen_caps(packages, srcdir, outdir, jcver, gpver, debug, enableint, more_apis, more_exps, map_exp):
     env = SCons.Environment.Environment(
@@ -39,25 +99,72 @@ def gen_caps(packages, srcdir, outdir, jcver, gpver, debug, enableint, more_apis
         allcaps += cap
 
         # find dependencies
-        importpkgs = []
-        for srcname in sources:
-            importpkgs += re.findall(r"import ([^;]+)\.(?:\*|\w+);", open(srcname).read())
-        importpkgs = list(set(importpkgs))
+        importpkgs = _find_imports(sources)
         for _pkg in packages:
             if _pkg["name"] in importpkgs and _pkg != pkg:
                 env.Depends(cap, os.path.join(outdir, _pkg["name"].replace(".", os.path.sep), "javacard", _pkg["name"].split(".")[-1] + ".cap"))
     env.Clean(allcaps, outdir)
     return allcaps
 
+def _assemble(out_file, jca_file, base_cap):
+    try:
+        capasm.assemble(out_file, jca_file, base_cap)
+    except (capasm.JcaError, OSError) as e:
+        print(f"capasm: {e}, fall back to jcasm")
+        return False
+    print(f"capasm: {jca_file} -> {out_file}")
+    return True
+
 def do_convert_jca(target, source, env):
     jcver, gpver = env["JCARGS"]
-    jcbuild.convert_jca(str(target[0]), str(source[0]), jcver, gpver)
+    out_file, jca_file = str(target[0]), str(source[0])
+    base_cap = str(source[1]) if len(source) > 1 else None
+    # the JCA file holds the result of any edit script, so its content is
+    # enough to identify the CAP file
+    key = jccache.make_key(
+        tool="jcasm",
+        jca=jccache.file_hash(jca_file),
+        out=os.path.basename(out_file),
+        jclib=_jclib_hash("jc" + jcver))
+    outdir = os.path.dirname(os.path.abspath(out_file))
+    if jccache.fetch(key, outdir):
+        return
+    if base_cap is None or not _assemble(out_file, jca_file, base_cap):
+        jcbuild.convert_jca(out_file, jca_file, jcver, gpver)
+    jccache.store(key, outdir, [os.path.basename(out_file)])
 
-def convert_jca(cap_file, jca_file, jcver, gpver):
+def convert_jca(cap_file, jca_file, jcver, gpver, base_cap=None):
     env = SCons.Environment.Environment(
         ENV = os.environ,
         BUILDERS = {"ConvertJca" : SCons.Builder.Builder(action = do_convert_jca)}
         )
     env["JCARGS"] = [jcver, gpver]
-    cap = env.ConvertJca(cap_file, jca_file)
+    sources = [jca_file] if base_cap is None else [jca_file, base_cap]
+    cap = env.ConvertJca(cap_file, sources)
     return cap
+
+def do_patch_jca(target, source, env):
+    with open(str(source[0])) as f:
+        text = f.read()
+    with open(str(source[1])) as f:
+        patch = json.load(f)
+    with open(str(target[0]), "w") as f:
+        f.write(opgen.patch_jca(text, patch))
+
+def gen_opcode_cases(cases, gendir, jcver, gpver, max_cases, max_size):
+    batches = opgen.pack(cases, max_cases, max_size)
+    opgen.write_batches(batches, gendir)
+    packages = [batch.package_info() for batch in batches]
+    caps = gen_caps(packages, os.path.join(gendir, "src"), os.path.join(gendir, "bin"), jcver, gpver, 1, 1, None, None, 0)
+    env = SCons.Environment.Environment(
+        ENV = os.environ,
+        BUILDERS = {"PatchJca" : SCons.Builder.Builder(action = do_patch_jca)}
+        )
+    outs = []
+    for batch, cap in zip(batches, caps):
+        base = os.path.join(gendir, batch.name)
+        jca = env.PatchJca(base + ".jca", [os.path.splitext(str(cap))[0] + ".jca", base + ".patch.json"])
+        env.Depends(jca, cap)
+        outs += convert_jca(base + ".cap", jca, jcver, gpver, cap)
+        outs += [os.path.join(gendir, case.file_name + ".json") for case in batch.cases]
+    return outs
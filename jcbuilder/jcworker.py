@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Persistent JVM workers for javac, the converter and jcasm.
+
+Starting a JVM dominates the time to build a measure case, so the tools are
+run by long running `JcWorker` JVMs fed with jobs over a pipe. SCons runs the
+builders of `scons -j N` in N threads, each job takes an idle worker from the
+pool, so at most N workers are started.
+
+Set the environment variable JCBUILDER_NO_WORKER to run every tool in its own
+JVM as before. The workers trap the System.exit() of the converter and jcasm
+with a security manager. Java 18 to 23 only allow one when asked on the
+command line, which the workers do; Java 24 removed it, so there the
+converter and jcasm run in their own JVM.
+'''
+
+import os
+import re
+import sys
+import atexit
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jcworker",
+                    "JcWorker.java")
+_DONE = "#jcworker-done "
+_UNAVAILABLE = 255
+# Java versions which need -Djava.security.manager=allow to trap System.exit()
+_ALLOW_SECURITY_MANAGER = range(18, 24)
+
+
+class WorkerError(Exception):
+    pass
+
+
+def _worker_classdir():
+    """
+    Compile JcWorker.java once into a directory named by its hash.
+    """
+    with open(_SRC, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    classdir = os.path.join(tempfile.gettempdir(), "jcworker-" + digest)
+    if not os.path.exists(os.path.join(classdir, "JcWorker.class")):
+        tmpdir = tempfile.mkdtemp(prefix="jcworker-")
+        ret = subprocess.call(["javac", "-nowarn", "-d", tmpdir, _SRC])
+        if ret != 0:
+            raise WorkerError("Compile JcWorker failed.")
+        try:
+            os.rename(tmpdir, classdir)
+        except OSError:
+            # compiled by another process meanwhile
+            pass
+    return classdir
+
+
+def _java_version():
+    """
+    Major version of the java on PATH, None if unknown.
+    """
+    try:
+        output = subprocess.run(["java", "-version"],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True).stdout
+    except OSError:
+        return None
+    # "1.8.0_392" up to Java 8, "17.0.9" since
+    m = re.search(r'version "(\d+)(?:\.(\d+))?', output)
+    if m is None:
+        return None
+    major = int(m.group(1))
+    if major == 1 and m.group(2):
+        major = int(m.group(2))
+    return major
+
+
+class JcWorker:
+    """
+    One JVM running jobs one by one.
+    """
+
+    def __init__(self, classdir, options=()):
+        self.__proc = subprocess.Popen(
+            ["java"] + list(options) + ["-classpath", classdir, "JcWorker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            encoding="utf-8")
+
+    def run(self, tool, classpath, main_class, args):
+        """
+        Run a job, return (status, output).
+        """
+        fields = [tool, classpath, main_class] + [str(arg) for arg in args]
+        if any("\t" in field or "\n" in field for field in fields):
+            raise ValueError(f"job field contains tab or newline: {fields}")
+        try:
+            self.__proc.stdin.write("\t".join(fields) + "\n")
+            self.__proc.stdin.flush()
+            lines = []
+            for line in self.__proc.stdout:
+                if line.startswith(_DONE):
+                    # the worker ends the output with a newline
+                    if lines and lines[-1] == "\n":
+                        lines.pop()
+                    return int(line[len(_DONE):]), "".join(lines)
+                lines.append(line)
+        except (OSError, ValueError) as e:
+            raise WorkerError(f"JcWorker failed: {e}")
+        raise WorkerError("JcWorker exited.")
+
+    def close(self):
+        if self.__proc.poll() is None:
+            self.__proc.stdin.close()
+            self.__proc.wait()
+
+
+class _Pool:
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__idle = []
+        self.__all = []
+        self.__classdir = None
+        self.__options = []
+        # False if System.exit() cannot be trapped, only javac runs in the
+        # workers then
+        self.__trap_exit = True
+        self.__disabled = bool(os.environ.get("JCBUILDER_NO_WORKER"))
+
+    def run(self, tool, classpath, main_class, args):
+        """
+        Run a job on an idle worker, return (status, output), or None if the
+        workers are not available.
+        """
+        worker = self.__acquire(tool)
+        if worker is None:
+            return None
+        try:
+            status, output = worker.run(tool, classpath, main_class, args)
+        except WorkerError as e:
+            print(e, file=sys.stderr)
+            worker.close()
+            with self.__lock:
+                self.__all.remove(worker)
+            return None
+        self.__release(worker)
+        if status == _UNAVAILABLE:
+            return None
+        return status, output
+
+    def __acquire(self, tool):
+        with self.__lock:
+            if self.__disabled:
+                return None
+            try:
+                if self.__classdir is None:
+                    self.__classdir = _worker_classdir()
+                    version = _java_version()
+                    if version in _ALLOW_SECURITY_MANAGER:
+                        self.__options = ["-Djava.security.manager=allow"]
+                    elif version is not None and version >= 24:
+                        self.__trap_exit = False
+                if tool != "javac" and not self.__trap_exit:
+                    return None
+                if self.__idle:
+                    return self.__idle.pop()
+                worker = JcWorker(self.__classdir, self.__options)
+            except (OSError, WorkerError) as e:
+                print(f"JcWorker not available, fall back to java: {e}",
+                      file=sys.stderr)
+                self.__disabled = True
+                return None
+            self.__all.append(worker)
+            return worker
+
+    def __release(self, worker):
+        with self.__lock:
+            self.__idle.append(worker)
+
+    def close(self):
+        with self.__lock:
+            for worker in self.__all:
+                worker.close()
+            self.__all = []
+            self.__idle = []
+
+
+_pool = _Pool()
+atexit.register(_pool.close)
+
+
+def _call(cmd):
+    try:
+        return subprocess.call(cmd)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 127
+
+
+def run_javac(args):
+    """
+    Run javac with `args`, return the exit status.
+    """
+    print(" ".join(["javac"] + list(args)))
+    ret = _pool.run("javac", "", "", args)
+    if ret is None:
+        return _call(["javac"] + list(args))
+    status, output = ret
+    if output:
+        print(output)
+    return status
+
+
+def run_java(classpath, main_class, args):
+    """
+    Run `main_class` of `classpath` with `args`, return the exit status.
+    """
+    cmd = ["java", "-classpath", classpath, main_class] + list(args)
+    print(" ".join(cmd))
+    ret = _pool.run("main", classpath, main_class, args)
+    if ret is None:
+        return _call(cmd)
+    status, output = ret
+    if output:
+        print(output)
+    return status
@@ -0,0 +1,150 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.security.Permission;
+import java.util.Arrays;
+import javax.tools.JavaCompiler;
+import javax.tools.ToolProvider;
+
+/**
+ * Long running JVM which runs javac, the Java Card converter and jcasm jobs
+ * read from stdin, so each job does not pay for a JVM startup.
+ *
+ * A job is one line of tab separated fields: tool, class path, main class and
+ * the arguments of the tool. Tool is "javac" or "main". The output of the job
+ * is written to stdout followed by a line "#jcworker-done STATUS".
+ */
+public class JcWorker
+{
+    public static final int UNAVAILABLE = 255;
+
+    private static boolean trapExit;
+
+    private static class ExitTrap extends SecurityException
+    {
+        final int status;
+
+        ExitTrap(int status)
+        {
+            this.status = status;
+        }
+    }
+
+    public static void main(String[] args) throws Exception
+    {
+        PrintStream out = System.out;
+        PrintStream err = System.err;
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+
+        // the tools call System.exit() when they finish, which is trapped by a
+        // security manager where the JVM still allows one: up to Java 17, up
+        // to Java 23 with -Djava.security.manager=allow
+        try
+        {
+            System.setSecurityManager(new SecurityManager()
+            {
+                public void checkPermission(Permission perm)
+                {
+                }
+
+                public void checkPermission(Permission perm, Object context)
+                {
+                }
+
+                public void checkExit(int status)
+                {
+                    throw new ExitTrap(status);
+                }
+            });
+            trapExit = true;
+        }
+        catch (RuntimeException e)
+        {
+            trapExit = false;
+        }
+
+        String line;
+        while ((line = in.readLine()) != null)
+        {
+            if (line.length() == 0)
+            {
+                continue;
+            }
+            ByteArrayOutputStream buf = new ByteArrayOutputStream();
+            PrintStream ps = new PrintStream(buf, true, "UTF-8");
+            int status;
+            System.setOut(ps);
+            System.setErr(ps);
+            try
+            {
+                status = run(line.split("\t", -1), ps);
+            }
+            catch (ExitTrap e)
+            {
+                status = e.status;
+            }
+            catch (Throwable e)
+            {
+                e.printStackTrace(ps);
+                status = 1;
+            }
+            finally
+            {
+                System.setOut(out);
+                System.setErr(err);
+            }
+            ps.flush();
+            out.write(buf.toByteArray());
+            out.println();
+            out.println("#jcworker-done " + status);
+            out.flush();
+        }
+    }
+
+    private static int run(String[] fields, PrintStream ps) throws Throwable
+    {
+        String tool = fields[0];
+        String[] args = Arrays.copyOfRange(fields, 3, fields.length);
+
+        if (tool.equals("javac"))
+        {
+            JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+            if (compiler == null)
+            {
+                return UNAVAILABLE;
+            }
+            return compiler.run(null, ps, ps, args);
+        }
+
+        if (!trapExit)
+        {
+            return UNAVAILABLE;
+        }
+
+        // a fresh class loader per job, the converter keeps static state
+        String[] paths = fields[1].split(File.pathSeparator);
+        URL[] urls = new URL[paths.length];
+        for (int i = 0; i < paths.length; ++i)
+        {
+            urls[i] = new File(paths[i]).toURI().toURL();
+        }
+        URLClassLoader loader = new URLClassLoader(urls, ClassLoader.getSystemClassLoader().getParent());
+        Thread.currentThread().setContextClassLoader(loader);
+        try
+        {
+            Method main = Class.forName(fields[2], true, loader).getMethod("main", String[].class);
+            main.invoke(null, (Object) args);
+            return 0;
+        }
+        catch (InvocationTargetException e)
+        {
+            throw e.getCause();
+        }
+    }
+}
@@ -0,0 +1,640 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Generator of measure cases for single bytecodes.
+
+Cases are packed into batches, each batch is one applet, so a suite loads and
+installs a package per batch instead of per case. Case k of a batch has two
+methods, `empty_single<k>` and `test_single<k>`, called `rounds` times by the
+APDUs of its two INS. The JCA file of the applet is patched so
+`test_single<k>` runs `setup`, the bytecodes `op` and `cleanup` `repeat`
+times, and `empty_single<k>` runs `setup` and `empty` as many times. The time
+of a case is so the time of `op` and `cleanup` less the time of `empty`, which
+keeps the operand stack balanced.
+
+When a method is called, its arguments are in these locals:
+
+    0 this, 1 short 1, 2 Object[1], 3 byte[1], 4 short[1], 5 Object
+    6 int[1], 7 int 1 (batches of cases using int only)
+
+`{tmp}` in an instruction is the first free local, `{next}` the label of the
+next instruction and `{cp:regex}` the index of the first constant pool entry
+of the JCA file matching the regular expression, after `{class}` is replaced
+by the class name. The applet has the fields `ref`, `bfield`, `sfield`,
+`ifield`, the static fields `sref`, `sbyte`, `sshort`, `sint`, and the methods
+`callee()` (private), `vcallee()` (public) and `scallee()` (static) to be
+referenced so.
+'''
+
+import os
+import re
+import json
+
+from . import capasm
+
+_JAVA = """package {package};
+
+import javacard.framework.*;
+
+public class {cls} extends Applet
+{{
+    static Object sref;
+    static byte sbyte;
+    static short sshort;
+{int_static}
+    Object ref;
+    byte bfield;
+    short sfield;
+{int_field}
+    private Object[] refs;
+    private byte[] bytes;
+    private short[] shorts;
+{int_array}
+    protected {cls}()
+    {{
+        refs = new Object[1];
+        refs[0] = this;
+        bytes = new byte[1];
+        shorts = new short[1];
+{int_init}
+        sref = refs;
+        sbyte = 1;
+        sshort = 1;
+        ref = refs;
+        bfield = 1;
+        sfield = 1;
+        callee();
+        vcallee();
+        scallee();
+    }}
+
+    public static void install(byte[] bArray, short bOffset, byte bLength)
+    {{
+        new {cls}().register(bArray, (short)(bOffset + 1), bArray[bOffset]);
+    }}
+
+    private void callee()
+    {{
+    }}
+
+    public void vcallee()
+    {{
+    }}
+
+    static void scallee()
+    {{
+    }}
+{methods}
+    public void process(APDU apdu)
+    {{
+        if (selectingApplet())
+        {{
+            return;
+        }}
+        byte[] buffer = apdu.getBuffer();
+        short round = Util.getShort(buffer, ISO7816.OFFSET_P1);
+        switch (buffer[ISO7816.OFFSET_INS])
+        {{
+{cases}
+        default:
+            ISOException.throwIt(ISO7816.SW_INS_NOT_SUPPORTED);
+            break;
+        }}
+    }}
+}}
+"""
+
+_JAVA_METHOD = """
+    private void {name}({params})
+    {{
+    }}
+"""
+
+_JAVA_CASE = """        case (byte)0x{ins:02X}:
+            for (short i = 0; i < round; ++i)
+            {{
+                {name}({args});
+            }}
+            break;"""
+
+_INT_JAVA = {
+    "int_static": "    static int sint;",
+    "int_field": "    int ifield;",
+    "int_array": "    private int[] ints;",
+    "int_init": "        ints = new int[1];\n        sint = 1;\n        ifield = 1;",
+}
+
+_PARAMS = "short value, Object[] refs, byte[] bytes, short[] shorts, Object obj"
+_ARGS = "(short)1, refs, bytes, shorts, this"
+_INT_PARAMS = ", int[] ints, int ivalue"
+_INT_ARGS = ", ints, 1"
+
+# package AID of batch i is _RID + i on 2 bytes
+_RID = "1122334456"
+
+# INS of the empty and test methods of case k are _INS + 2k and _INS + 2k + 1,
+# up to 0x5F
+_INS = 0x10
+MAX_BATCH = 40
+
+
+def _split(text):
+    return [ins.strip() for ins in text.split(";") if ins.strip()]
+
+
+def _uses_int(instructions):
+    for ins in instructions:
+        mnemonic = ins.split()[0]
+        if mnemonic.startswith("i") and not mnemonic.startswith(
+                ("if", "invoke", "instanceof")):
+            return True
+        if mnemonic == "s2i" or mnemonic.endswith("_i") or "_i_" in mnemonic:
+            return True
+    return False
+
+
+class OpcodeCase:
+    """
+    A measure case of the bytecodes `op`, see the module documentation.
+    """
+
+    def __init__(self, name, op, setup=(), cleanup=(), empty=(), repeat=16,
+                 rounds=0x0100, stack=8, locals=1, description=None):
+        self.name = name
+        self.op = list(op)
+        self.setup = list(setup)
+        self.cleanup = list(cleanup)
+        self.empty = list(empty)
+        self.repeat = repeat
+        self.rounds = rounds
+        self.stack = stack
+        self.locals = locals
+        self.description = description or \
+            f"Measure speed of instruction `{'; '.join(self.op)}`."
+        self.ints = _uses_int(self.setup + self.op + self.cleanup + self.empty)
+
+    @property
+    def file_name(self):
+        return f"op_{self.name}"
+
+    def __expand(self, parts, ints, cls):
+        """
+        Instructions of `parts` repeated, with `{next}` replaced by labels.
+        """
+        tmp = "9" if ints else "6"
+        code = []
+        for i in range(self.repeat):
+            for j, ins in enumerate(parts):
+                ins = ins.replace("{tmp}", tmp).replace("{class}", cls)
+                if "{next}" in ins:
+                    label = f"G{i}_{j}"
+                    code.append(ins.replace("{next}", label))
+                    code.append(label + ":")
+                else:
+                    code.append(ins)
+        return code
+
+    def patch(self, index, ints=None, cls=""):
+        """
+        The JCA patch of the case at `index` of a batch: the code of its empty
+        and test methods.
+        """
+        ints = self.ints if ints is None else ints
+        return [{
+            "method": f"empty_single{index}",
+            "code": self.__expand(self.setup + self.empty, ints, cls),
+            "stack": self.stack,
+            "locals": self.locals,
+        }, {
+            "method": f"test_single{index}",
+            "code": self.__expand(self.setup + self.op + self.cleanup, ints,
+                                  cls),
+            "stack": self.stack,
+            "locals": self.locals,
+        }]
+
+    def code_size(self):
+        """
+        Bytes of bytecode of the two methods, an estimate of the room taken
+        in the package.
+        """
+        size = 0
+        for method in self.patch(0):
+            for ins in method["code"]:
+                if not ins.endswith(":"):
+                    words = ins.split()
+                    size += capasm._size(words[0], words[1:])
+        # method headers and the calls in process()
+        return size + 32
+
+    def result(self):
+        return f"lambda t: {self.rounds:#06x} * {self.repeat} / t"
+
+    def case_json(self, batch, index):
+        """
+        The test json of the case at `index` of `batch`.
+        """
+        ins = _INS + 2 * index
+        return {
+            "name": f"Op_{self.name}",
+            "description": self.description,
+            "round": 10,
+            "result": self.result(),
+            "unit": "INS/S",
+            "batch": {
+                "name": batch.name,
+                "setup": [
+                    "Reset",
+                    f"LoadAndInstall {batch.name}.cap"
+                ],
+                "teardown": ["Reset", f"Remove {batch.pkg_aid}"],
+            },
+            "setup": [f"Select {batch.app_aid}"],
+            "teardown": [],
+            # the empty method run 0 times
+            "calibrate": f"80{ins:02X}000000",
+            "adjust": f"SendAPDU 80{ins:02X}{self.rounds:04X}00",
+            "test": f"SendAPDU 80{ins + 1:02X}{self.rounds:04X}00"
+        }
+
+
+# name | setup | op | cleanup | empty, instructions are separated by ';'
+_TABLE = """
+nop             |                           | nop                       |           |
+aconst_null     |                           | aconst_null               | pop       |
+sconst_m1       |                           | sconst_m1                 | pop       |
+sconst_0        |                           | sconst_0                  | pop       |
+sconst_1        |                           | sconst_1                  | pop       |
+sconst_2        |                           | sconst_2                  | pop       |
+sconst_3        |                           | sconst_3                  | pop       |
+sconst_4        |                           | sconst_4                  | pop       |
+sconst_5        |                           | sconst_5                  | pop       |
+iconst_m1       |                           | iconst_m1                 | pop2      |
+iconst_0        |                           | iconst_0                  | pop2      |
+iconst_1        |                           | iconst_1                  | pop2      |
+iconst_2        |                           | iconst_2                  | pop2      |
+iconst_3        |                           | iconst_3                  | pop2      |
+iconst_4        |                           | iconst_4                  | pop2      |
+iconst_5        |                           | iconst_5                  | pop2      |
+bspush          |                           | bspush 1                  | pop       |
+sspush          |                           | sspush 1000               | pop       |
+bipush          |                           | bipush 1                  | pop2      |
+sipush          |                           | sipush 1000               | pop2      |
+iipush          |                           | iipush 100000             | pop2      |
+aload           |                           | aload 2                   | pop       |
+sload           |                           | sload 1                   | pop       |
+iload           |                           | iload 7                   | pop2      |
+aload_0         |                           | aload_0                   | pop       |
+aload_1         | aload_0; astore_1         | aload_1                   | pop       |
+aload_2         |                           | aload_2                   | pop       |
+aload_3         |                           | aload_3                   | pop       |
+sload_0         | sconst_1; sstore_0        | sload_0                   | pop       |
+sload_1         |                           | sload_1                   | pop       |
+sload_2         | sconst_1; sstore_2        | sload_2                   | pop       |
+sload_3         | sconst_1; sstore_3        | sload_3                   | pop       |
+iload_0         | iconst_1; istore_0        | iload_0                   | pop2      |
+iload_1         | iconst_1; istore_1        | iload_1                   | pop2      |
+iload_2         | iconst_1; istore_2        | iload_2                   | pop2      |
+iload_3         | iconst_1; istore_3        | iload_3                   | pop2      |
+aaload          | aload_2; sconst_0         | aaload                    | pop       | pop2
+baload          | aload_3; sconst_0         | baload                    | pop       | pop2
+saload          | aload 4; sconst_0         | saload                    | pop       | pop2
+iaload          | aload 6; sconst_0         | iaload                    | pop2      | pop2
+astore          | aload_0                   | astore {tmp}              |           | pop
+sstore          | sconst_1                  | sstore {tmp}              |           | pop
+istore          | iconst_1                  | istore {tmp}              |           | pop2
+astore_0        | aload_0                   | astore_0                  |           | pop
+astore_1        | aload_0                   | astore_1                  |           | pop
+astore_2        | aload_0                   | astore_2                  |           | pop
+astore_3        | aload_0                   | astore_3                  |           | pop
+sstore_0        | sconst_1                  | sstore_0                  |           | pop
+sstore_1        | sconst_1                  | sstore_1                  |           | pop
+sstore_2        | sconst_1                  | sstore_2                  |           | pop
+sstore_3        | sconst_1                  | sstore_3                  |           | pop
+istore_0        | iconst_1                  | istore_0                  |           | pop2
+istore_1        | iconst_1                  | istore_1                  |           | pop2
+istore_2        | iconst_1                  | istore_2                  |           | pop2
+istore_3        | iconst_1                  | istore_3                  |           | pop2
+aastore         | aload_2; sconst_0; aload_0 | aastore                  |           | pop; pop2
+bastore         | aload_3; sconst_0; sconst_1 | bastore                 |           | pop; pop2
+sastore         | aload 4; sconst_0; sconst_1 | sastore                 |           | pop; pop2
+iastore         | aload 6; sconst_0; iconst_1 | iastore                 |           | pop2; pop2
+pop             | sconst_1; sconst_1        | pop                       | pop       | pop2
+pop2            | sconst_1; sconst_1        | pop2                      |           | pop; pop
+dup             | sconst_1                  | dup                       | pop2      | pop
+dup2            | sconst_1; sconst_1        | dup2                      | pop2; pop2 | pop2
+dup_x           | sconst_1; sconst_1        | dup_x 0x12                | pop2; pop | pop2
+swap_x          | sconst_1; sconst_2        | swap_x 0x11               | pop2      | pop2
+sadd            | sconst_1; sconst_1        | sadd                      | pop       | pop2
+ssub            | sconst_1; sconst_1        | ssub                      | pop       | pop2
+smul            | sconst_1; sconst_1        | smul                      | pop       | pop2
+sdiv            | sconst_1; sconst_1        | sdiv                      | pop       | pop2
+srem            | sconst_1; sconst_1        | srem                      | pop       | pop2
+sneg            | sconst_1                  | sneg                      | pop       | pop
+sshl            | sconst_1; sconst_1        | sshl                      | pop       | pop2
+sshr            | sconst_1; sconst_1        | sshr                      | pop       | pop2
+sushr           | sconst_1; sconst_1        | sushr                     | pop       | pop2
+sand            | sconst_1; sconst_1        | sand                      | pop       | pop2
+sor             | sconst_1; sconst_1        | sor                       | pop       | pop2
+sxor            | sconst_1; sconst_1        | sxor                      | pop       | pop2
+iadd            | iconst_1; iconst_1        | iadd                      | pop2      | pop2; pop2
+isub            | iconst_1; iconst_1        | isub                      | pop2      | pop2; pop2
+imul            | iconst_1; iconst_1        | imul                      | pop2      | pop2; pop2
+idiv            | iconst_1; iconst_1        | idiv                      | pop2      | pop2; pop2
+irem            | iconst_1; iconst_1        | irem                      | pop2      | pop2; pop2
+ineg            | iconst_1                  | ineg                      | pop2      | pop2
+ishl            | iconst_1; iconst_1        | ishl                      | pop2      | pop2; pop2
+ishr            | iconst_1; iconst_1        | ishr                      | pop2      | pop2; pop2
+iushr           | iconst_1; iconst_1        | iushr                     | pop2      | pop2; pop2
+iand            | iconst_1; iconst_1        | iand                      | pop2      | pop2; pop2
+ior             | iconst_1; iconst_1        | ior                       | pop2      | pop2; pop2
+ixor            | iconst_1; iconst_1        | ixor                      | pop2      | pop2; pop2
+sinc            |                           | sinc 1 1                  |           |
+iinc            |                           | iinc 7 1                  |           |
+sinc_w          |                           | sinc_w 1 1000             |           |
+iinc_w          |                           | iinc_w 7 1000             |           |
+s2b             | sconst_1                  | s2b                       | pop       | pop
+s2i             | sconst_1                  | s2i                       | pop2      | pop
+i2b             | iconst_1                  | i2b                       | pop       | pop2
+i2s             | iconst_1                  | i2s                       | pop       | pop2
+icmp            | iconst_1; iconst_1        | icmp                      | pop       | pop2; pop2
+ifeq            | sconst_0                  | ifeq {next}               |           | pop
+ifne            | sconst_0                  | ifne {next}               |           | pop
+iflt            | sconst_0                  | iflt {next}               |           | pop
+ifge            | sconst_0                  | ifge {next}               |           | pop
+ifgt            | sconst_0                  | ifgt {next}               |           | pop
+ifle            | sconst_0                  | ifle {next}               |           | pop
+ifnull          | aload_0                   | ifnull {next}             |           | pop
+ifnonnull       | aload_0                   | ifnonnull {next}          |           | pop
+if_acmpeq       | aload_0; aload_0          | if_acmpeq {next}          |           | pop2
+if_acmpne       | aload_0; aload_0          | if_acmpne {next}          |           | pop2
+if_scmpeq       | sconst_0; sconst_0        | if_scmpeq {next}          |           | pop2
+if_scmpne       | sconst_0; sconst_0        | if_scmpne {next}          |           | pop2
+if_scmplt       | sconst_0; sconst_0        | if_scmplt {next}          |           | pop2
+if_scmpge       | sconst_0; sconst_0        | if_scmpge {next}          |           | pop2
+if_scmpgt       | sconst_0; sconst_0        | if_scmpgt {next}          |           | pop2
+if_scmple       | sconst_0; sconst_0        | if_scmple {next}          |           | pop2
+goto            |                           | goto {next}               |           |
+ifeq_w          | sconst_0                  | ifeq_w {next}             |           | pop
+ifne_w          | sconst_0                  | ifne_w {next}             |           | pop
+iflt_w          | sconst_0                  | iflt_w {next}             |           | pop
+ifge_w          | sconst_0                  | ifge_w {next}             |           | pop
+ifgt_w          | sconst_0                  | ifgt_w {next}             |           | pop
+ifle_w          | sconst_0                  | ifle_w {next}             |           | pop
+ifnull_w        | aload_0                   | ifnull_w {next}           |           | pop
+ifnonnull_w     | aload_0                   | ifnonnull_w {next}        |           | pop
+if_acmpeq_w     | aload_0; aload_0          | if_acmpeq_w {next}        |           | pop2
+if_acmpne_w     | aload_0; aload_0          | if_acmpne_w {next}        |           | pop2
+if_scmpeq_w     | sconst_0; sconst_0        | if_scmpeq_w {next}        |           | pop2
+if_scmpne_w     | sconst_0; sconst_0        | if_scmpne_w {next}        |           | pop2
+if_scmplt_w     | sconst_0; sconst_0        | if_scmplt_w {next}        |           | pop2
+if_scmpge_w     | sconst_0; sconst_0        | if_scmpge_w {next}        |           | pop2
+if_scmpgt_w     | sconst_0; sconst_0        | if_scmpgt_w {next}        |           | pop2
+if_scmple_w     | sconst_0; sconst_0        | if_scmple_w {next}        |           | pop2
+goto_w          |                           | goto_w {next}             |           |
+stableswitch    | sconst_0                  | stableswitch {next} 0 0 {next} |      | pop
+itableswitch    | iconst_0                  | itableswitch {next} 0 0 {next} |      | pop2
+slookupswitch   | sconst_0                  | slookupswitch {next} 1 0 {next} |     | pop
+ilookupswitch   | iconst_0                  | ilookupswitch {next} 1 0 {next} |     | pop2
+getstatic_a     |                           | getstatic_a {cp:/sref\\b} | pop       |
+getstatic_b     |                           | getstatic_b {cp:/sbyte\\b} | pop      |
+getstatic_s     |                           | getstatic_s {cp:/sshort\\b} | pop     |
+getstatic_i     |                           | getstatic_i {cp:/sint\\b} | pop2      |
+putstatic_a     | aload_0                   | putstatic_a {cp:/sref\\b} |           | pop
+putstatic_b     | sconst_1                  | putstatic_b {cp:/sbyte\\b} |          | pop
+putstatic_s     | sconst_1                  | putstatic_s {cp:/sshort\\b} |         | pop
+putstatic_i     | iconst_1                  | putstatic_i {cp:/sint\\b} |           | pop2
+getfield_a      | aload_0                   | getfield_a {cp:/ref\\b}   | pop       | pop
+getfield_b      | aload_0                   | getfield_b {cp:/bfield\\b} | pop      | pop
+getfield_s      | aload_0                   | getfield_s {cp:/sfield\\b} | pop      | pop
+getfield_i      | aload_0                   | getfield_i {cp:/ifield\\b} | pop2     | pop
+putfield_a      | aload_0; aload_0          | putfield_a {cp:/ref\\b}   |           | pop2
+putfield_b      | aload_0; sconst_1         | putfield_b {cp:/bfield\\b} |          | pop2
+putfield_s      | aload_0; sconst_1         | putfield_s {cp:/sfield\\b} |          | pop2
+putfield_i      | aload_0; iconst_1         | putfield_i {cp:/ifield\\b} |          | pop2; pop
+getfield_a_w    | aload_0                   | getfield_a_w {cp:/ref\\b} | pop       | pop
+getfield_b_w    | aload_0                   | getfield_b_w {cp:/bfield\\b} | pop    | pop
+getfield_s_w    | aload_0                   | getfield_s_w {cp:/sfield\\b} | pop    | pop
+getfield_i_w    | aload_0                   | getfield_i_w {cp:/ifield\\b} | pop2   | pop
+putfield_a_w    | aload_0; aload_0          | putfield_a_w {cp:/ref\\b} |           | pop2
+putfield_b_w    | aload_0; sconst_1         | putfield_b_w {cp:/bfield\\b} |        | pop2
+putfield_s_w    | aload_0; sconst_1         | putfield_s_w {cp:/sfield\\b} |        | pop2
+putfield_i_w    | aload_0; iconst_1         | putfield_i_w {cp:/ifield\\b} |        | pop2; pop
+getfield_a_this |                           | getfield_a_this {cp:/ref\\b} | pop    |
+getfield_b_this |                           | getfield_b_this {cp:/bfield\\b} | pop |
+getfield_s_this |                           | getfield_s_this {cp:/sfield\\b} | pop |
+getfield_i_this |                           | getfield_i_this {cp:/ifield\\b} | pop2 |
+putfield_a_this | aload_0                   | putfield_a_this {cp:/ref\\b} |        | pop
+putfield_b_this | sconst_1                  | putfield_b_this {cp:/bfield\\b} |     | pop
+putfield_s_this | sconst_1                  | putfield_s_this {cp:/sfield\\b} |     | pop
+putfield_i_this | iconst_1                  | putfield_i_this {cp:/ifield\\b} |     | pop2
+invokevirtual   | aload_0                   | invokevirtual {cp:/vcallee\\b} |      | pop
+invokespecial   | aload_0                   | invokespecial {cp:/callee\\b} |       | pop
+invokestatic    |                           | invokestatic {cp:/scallee\\b} |       |
+arraylength     | aload_3                   | arraylength               | pop       | pop
+checkcast       | aload_0                   | checkcast 0 {cp:^classRef .*\\b{class}$} | pop | pop
+instanceof      | aload_0                   | instanceof 0 {cp:^classRef .*\\b{class}$} | pop | pop
+"""
+
+
+def _load_table():
+    cases = []
+    for line in _TABLE.strip().splitlines():
+        name, setup, op, cleanup, empty = [
+            col.strip() for col in line.split("|")
+        ]
+        cases.append(
+            OpcodeCase(name, _split(op), _split(setup), _split(cleanup),
+                       _split(empty)))
+    return cases
+
+
+# one case per bytecode but those allocating memory, throwing or returning
+OPCODE_CASES = _load_table()
+
+
+class Batch:
+    """
+    Cases built into one applet, installed once for all of them.
+    """
+
+    def __init__(self, index, ints):
+        self.index = index
+        self.ints = ints
+        self.cases = []
+        # estimated bytes of bytecode of the cases
+        self.size = 0
+
+    @property
+    def name(self):
+        return f"ops{self.index}"
+
+    @property
+    def package(self):
+        return f"libsc.jcmeasure.{self.name}"
+
+    @property
+    def cls(self):
+        return f"TestOps{self.index}"
+
+    @property
+    def pkg_aid(self):
+        return f"{_RID}{self.index:04X}"
+
+    @property
+    def app_aid(self):
+        return self.pkg_aid + "01"
+
+    def package_info(self):
+        return {
+            "name": self.package,
+            "version": "1.0",
+            "aid": self.pkg_aid,
+            "applets": [{
+                "name": self.cls,
+                "aid": self.app_aid
+            }]
+        }
+
+    def java_source(self):
+        params, args = _PARAMS, _ARGS
+        parts = dict.fromkeys(_INT_JAVA, "")
+        if self.ints:
+            params += _INT_PARAMS
+            args += _INT_ARGS
+            parts = _INT_JAVA
+        methods = []
+        cases = []
+        for k in range(len(self.cases)):
+            for i, name in enumerate((f"empty_single{k}", f"test_single{k}")):
+                methods.append(_JAVA_METHOD.format(name=name, params=params))
+                cases.append(_JAVA_CASE.format(ins=_INS + 2 * k + i,
+                                               name=name, args=args))
+        return _JAVA.format(package=self.package, cls=self.cls,
+                            methods="".join(methods), cases="\n".join(cases),
+                            **parts)
+
+    def patch(self):
+        patch = []
+        for k, case in enumerate(self.cases):
+            patch += case.patch(k, self.ints, self.cls)
+        return patch
+
+
+def pack(cases, max_cases=MAX_BATCH, max_size=8192):
+    """
+    Pack `cases` in order into batches of at most `max_cases` cases and
+    `max_size` bytes of bytecode, so each package fits in the card. Cases
+    using int are packed apart, they fail together on cards without int.
+    """
+    max_cases = min(max_cases, MAX_BATCH)
+    batches = []
+    open_batches = {}
+    for case in cases:
+        batch = open_batches.get(case.ints)
+        size = case.code_size()
+        if batch is None or len(batch.cases) >= max_cases or \
+                batch.size + size > max_size:
+            batch = Batch(len(batches), case.ints)
+            batches.append(batch)
+            open_batches[case.ints] = batch
+        batch.cases.append(case)
+        batch.size += size
+    return batches
+
+
+def _constant_pool(lines):
+    entries = []
+    inside = False
+    for line in lines:
+        line = " ".join(line.split("//", 1)[0].split())
+        if line.startswith(".constantPool"):
+            inside = True
+        elif inside and line == "}":
+            break
+        elif inside and line:
+            entries.append(line.rstrip(";"))
+    return entries
+
+
+def _patch_method(lines, name, code, stack, locals_):
+    """
+    Put `code` before the return of the method `name`, an empty method.
+    """
+    start = next((i for i, line in enumerate(lines)
+                  if line.strip().startswith(".method") and
+                  re.search(rf"\s{name}\(", line)), None)
+    if start is None:
+        raise ValueError(f"method {name} not found.")
+    for i in range(start + 1, len(lines)):
+        words = lines[i].split("//", 1)[0].split()
+        if words[:1] == [".stack"]:
+            lines[i] = f"\t\t\t.stack {max(stack, int(words[1][:-1]))};\n"
+        elif words[:1] == [".locals"]:
+            lines[i] = f"\t\t\t.locals {max(locals_, int(words[1][:-1]))};\n"
+        elif words and words[-1] == "return;":
+            label = " ".join(words[:-1])
+            body = [f"\t\t\t\t{label}\n"] if label else []
+            for ins in code:
+                if ins.endswith(":"):
+                    body.append(f"\t\t\t\t{ins}\n")
+                else:
+                    body.append(f"\t\t\t\t\t{ins};\n")
+            lines[i:i + 1] = body + ["\t\t\t\t\treturn;\n"]
+            return
+        elif words == ["}"]:
+            break
+    raise ValueError(f"return of method {name} not found.")
+
+
+def patch_jca(text, patch):
+    """
+    Apply `patch`, from `Batch.patch`, to the JCA text of the batch.
+    """
+    lines = text.splitlines(True)
+    pool = _constant_pool(lines)
+
+    def resolve(m):
+        for i, entry in enumerate(pool):
+            if re.search(m.group(1), entry):
+                return str(i)
+        raise ValueError(f"no constant pool entry matches {m.group(1)}.")
+
+    for method in patch:
+        code = [re.sub(r"\{cp:([^}]*)\}", resolve, ins)
+                for ins in method["code"]]
+        _patch_method(lines, method["method"], code, method["stack"],
+                      method["locals"])
+    return "".join(lines)
+
+
+def _write(path, text):
+    # unchanged files are not rewritten, so they are not rebuilt
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def write_batches(batches, gendir):
+    """
+    Write the Java source and JCA patch of `batches` and the test json of
+    their cases under `gendir`.
+    """
+    for batch in batches:
+        pkgdir = os.path.join(gendir, "src", batch.package.replace(".", os.sep))
+        _write(os.path.join(pkgdir, batch.cls + ".java"), batch.java_source())
+        _write(os.path.join(gendir, batch.name + ".patch.json"),
+               json.dumps(batch.patch(), indent=4))
+        for k, case in enumerate(batch.cases):
+            _write(os.path.join(gendir, case.file_name + ".json"),
+                   json.dumps(case.case_json(batch, k), indent=4))
+
+
+__all__ = [
+    "OpcodeCase", "OPCODE_CASES", "Batch", "pack", "patch_jca",
+    "write_batches"
+]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Tests of the in-process JCA assembler on the test_nop package of tests_src,
+a CAP file with its JCA file in `data`.
+'''
+
+import io
+import os
+import shutil
+import struct
+import zipfile
+
+import pytest
+
+from jcbuilder import capasm
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+BASE_CAP = os.path.join(DATA, "test_nop.cap")
+BASE_JCA = os.path.join(DATA, "test_nop.jca")
+CONVERTER = os.path.join(
+    os.path.dirname(capasm.__file__), "jclib", "jc222", "converter.jar")
+
+# offset of test_process in the Method component and its bytecode count,
+# see the Descriptor component
+TEST_PROCESS = 0x37
+TEST_PROCESS_SIZE = 0x19
+
+
+def _components(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return {
+            name.rsplit("/", 1)[-1][:-4]: zf.read(name)
+            for name in zf.namelist() if name.endswith(".cap")
+        }
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _jca():
+    with open(BASE_JCA) as f:
+        return f.read()
+
+
+def _add_nops(text, count):
+    # nops at the start of test_process
+    start = text.index("test_process(Ljavacard/framework/APDU;)V {")
+    pos = text.index("L0:", start)
+    return text[:pos] + "nop;\n\t\t\t\t\t" * count + text[pos:]
+
+
+def test_reassemble():
+    base = _components(_read(BASE_CAP))
+    cap = _components(capasm.Assembler(BASE_CAP).assemble(_jca()))
+    # like jcasm, no Debug component is written
+    assert "Debug" not in cap
+    assert set(cap) == set(base) - {"Debug"}
+    for name, data in cap.items():
+        if name != "Directory":
+            assert data == base[name], name
+    debug = 1 + 2 * capasm.COMPONENTS.index("Debug") + 2
+    directory = bytearray(base["Directory"])
+    directory[debug:debug + 2] = b"\x00\x00"
+    assert cap["Directory"] == bytes(directory)
+
+
+def test_edit_method_body():
+    base = _components(_read(BASE_CAP))
+    cap = _components(
+        capasm.Assembler(BASE_CAP).assemble(_add_nops(_jca(), 2)))
+
+    # two nops after the method header, the component is 2 bytes longer
+    method = bytearray(base["Method"])
+    pos = 3 + TEST_PROCESS + 2
+    method[pos:pos] = b"\x00\x00"
+    struct.pack_into(">H", method, 1, len(method) - 3)
+    assert cap["Method"] == bytes(method)
+
+    # process follows test_process, its offset moves
+    assert base["Class"][-2:] == struct.pack(">H", 0x52)
+    assert base["Descriptor"].count(struct.pack(">H", 0x52)) == 1
+    assert cap["Class"] == base["Class"][:-2] + struct.pack(">H", 0x54)
+    assert cap["Descriptor"] == base["Descriptor"].replace(
+        struct.pack(">HHH", TEST_PROCESS, 0, TEST_PROCESS_SIZE),
+        struct.pack(">HHH", TEST_PROCESS, 0, TEST_PROCESS_SIZE + 2)).replace(
+            struct.pack(">H", 0x52), struct.pack(">H", 0x54))
+    for name in ("Header", "Applet", "Import", "ConstantPool",
+                 "StaticField"):
+        assert cap[name] == base[name], name
+
+
+def test_edit_skeleton():
+    # only method bodies may be edited
+    text = _jca().replace("classRef TestNop;", "classRef Foo;")
+    with pytest.raises(capasm.JcaError):
+        capasm.Assembler(BASE_CAP).assemble(text)
+
+
+@pytest.mark.skipif(
+    shutil.which("java") is None or not os.path.exists(CONVERTER),
+    reason="jcasm needs java and the converter of JC 2.2.2")
+def test_edit_jcasm(tmp_path):
+    from jcbuilder import jcbuild
+
+    jca_file = tmp_path / "test_nop.jca"
+    jca_file.write_text(_add_nops(_jca(), 2))
+    jcasm_cap = tmp_path / "jcasm.cap"
+    jcbuild.convert_jca(str(jcasm_cap), str(jca_file), "222", "211")
+    capasm_cap = tmp_path / "capasm.cap"
+    capasm.assemble(str(capasm_cap), str(jca_file), BASE_CAP, BASE_JCA)
+    assert _components(_read(capasm_cap)) == _components(_read(jcasm_cap))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Tests of the build cache.
+'''
+
+import os
+
+import pytest
+
+from jcbuilder import jccache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    path = tmp_path / "cache"
+    monkeypatch.setenv("JCBUILDER_CACHE", str(path))
+    return path
+
+
+def _files(path):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), path)
+        for root, dirs, names in os.walk(path) for name in names + dirs)
+
+
+def test_store_fetch(cache, tmp_path):
+    outdir = tmp_path / "out"
+    (outdir / "pkg").mkdir(parents=True)
+    (outdir / "pkg" / "a.cap").write_bytes(b"cap")
+    key = jccache.make_key(tool="test", n=1)
+    jccache.store(key, str(outdir), [os.path.join("pkg", "a.cap")])
+
+    fetched = tmp_path / "fetched"
+    assert jccache.fetch(key, str(fetched))
+    assert (fetched / "pkg" / "a.cap").read_bytes() == b"cap"
+    assert not jccache.fetch(jccache.make_key(tool="test", n=2),
+                             str(fetched))
+
+
+def test_store_failure(cache, tmp_path):
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    (outdir / "a.cap").write_bytes(b"cap")
+    key = jccache.make_key(tool="test")
+    # the second file is missing, nothing of the entry is left
+    jccache.store(key, str(outdir), ["a.cap", "b.exp"])
+    assert _files(cache) == [key[:2]]
+    assert not jccache.fetch(key, str(tmp_path / "fetched"))
+
+
+def test_disabled(monkeypatch, tmp_path):
+    monkeypatch.setenv("JCBUILDER_CACHE", "off")
+    jccache.store("00", str(tmp_path), [])
+    assert not jccache.fetch("00", str(tmp_path))
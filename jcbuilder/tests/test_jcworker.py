@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Tests of the Java version check of the JVM workers.
+'''
+
+import subprocess
+
+import pytest
+
+from jcbuilder import jcworker
+
+
+@pytest.mark.parametrize("output, version", [
+    ('java version "1.8.0_392"\nJava(TM) SE Runtime Environment', 8),
+    ('openjdk version "11.0.21" 2023-10-17', 11),
+    ('openjdk version "21" 2023-09-19\nOpenJDK Runtime Environment', 21),
+    ('openjdk version "24-ea" 2025-03-18', 24),
+    ('unknown', None),
+])
+def test_java_version(monkeypatch, output, version):
+    def run(cmd, **kwargs):
+        assert cmd == ["java", "-version"]
+        return subprocess.CompletedProcess(cmd, 0, output)
+
+    monkeypatch.setattr(subprocess, "run", run)
+    assert jcworker._java_version() == version
+
+
+def test_allow_security_manager():
+    allowed = jcworker._ALLOW_SECURITY_MANAGER
+    assert 17 not in allowed and 18 in allowed
+    assert 23 in allowed and 24 not in allowed
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Tests of the generator of bytecode measure cases.
+'''
+
+import pytest
+
+from jcbuilder import opgen
+
+_JCA = """\
+.package libsc/jcmeasure/ops0 {
+	.constantPool {
+		// 0
+		staticMethodRef 0.3.0()V;		// javacard/framework/Applet.<init>()V
+		// 1
+		classRef TestOps0;
+		// 2
+		staticFieldRef short TestOps0/sshort;
+		// 3
+		instanceFieldRef byte TestOps0/bfield;
+	}
+
+	.class public TestOps0 0 extends 0.3 {
+		.method private empty_single0(SLjava/lang/Object;)V {
+			.stack 0;
+			.locals 0;
+
+				L0:	return;
+		}
+
+		.method private test_single0(SLjava/lang/Object;)V {
+			.stack 0;
+			.locals 2;
+
+				L0:	return;
+		}
+	}
+}
+"""
+
+
+def _method(text, name):
+    lines = text.splitlines()
+    start = next(i for i, line in enumerate(lines) if f" {name}(" in line)
+    end = lines.index("\t\t}", start)
+    return [line.strip() for line in lines[start + 1:end] if line.strip()]
+
+
+@pytest.mark.parametrize("ins, ints", [
+    (["sload_1", "sadd"], False),
+    (["ifeq L1", "invokevirtual 3", "instanceof 0 1"], False),
+    (["iload 7"], True),
+    (["s2i"], True),
+    (["getfield_i_this 3"], True),
+    (["putfield_i_w 3"], True),
+])
+def test_uses_int(ins, ints):
+    assert opgen._uses_int(ins) == ints
+
+
+def test_pack():
+    batches = opgen.pack(opgen.OPCODE_CASES)
+    cases = [case for batch in batches for case in batch.cases]
+    assert sorted(cases, key=opgen.OPCODE_CASES.index) == opgen.OPCODE_CASES
+    assert [batch.index for batch in batches] == list(range(len(batches)))
+    for batch in batches:
+        assert 0 < len(batch.cases) <= opgen.MAX_BATCH
+        assert batch.size <= 8192
+        assert all(case.ints == batch.ints for case in batch.cases)
+        # the test INS of the last case
+        last = len(batch.cases) - 1
+        assert opgen._INS + 2 * last + 1 <= 0x5F
+        assert batch.cases[last].case_json(batch, last)["test"].startswith(
+            f"SendAPDU 80{opgen._INS + 2 * last + 1:02X}")
+    assert {batch.ints for batch in batches} == {False, True}
+
+
+def test_pack_limits():
+    # nop to sconst_5, none uses int
+    cases = opgen.OPCODE_CASES[:9]
+    assert [len(b.cases) for b in opgen.pack(cases, max_cases=4)] == [4, 4, 1]
+    size = max(case.code_size() for case in cases)
+    for batch in opgen.pack(cases, max_size=2 * size):
+        assert batch.size <= 2 * size
+    assert len(opgen.pack(cases * 10, max_cases=100)[0].cases) == \
+        opgen.MAX_BATCH
+
+
+def test_patch_jca():
+    case = opgen.OpcodeCase(
+        "mixed", ["getstatic_s {cp:/sshort\\b}", "ifeq {next}"],
+        setup=["aload_0", "checkcast 0 {cp:^classRef .*\\b{class}$}"],
+        cleanup=["getfield_b_this {cp:/bfield\\b}", "pop"],
+        empty=["pop"], repeat=2, stack=4, locals=1)
+    text = opgen.patch_jca(_JCA, case.patch(0, cls="TestOps0"))
+
+    assert _method(text, "empty_single0") == [
+        ".stack 4;", ".locals 1;",
+        "L0:",
+        "aload_0;", "checkcast 0 1;", "pop;",
+        "aload_0;", "checkcast 0 1;", "pop;",
+        "return;",
+    ]
+    # .locals is not lowered below the locals of the method
+    assert _method(text, "test_single0") == [
+        ".stack 4;", ".locals 2;",
+        "L0:",
+        "aload_0;", "checkcast 0 1;", "getstatic_s 2;", "ifeq G0_3;",
+        "G0_3:", "getfield_b_this 3;", "pop;",
+        "aload_0;", "checkcast 0 1;", "getstatic_s 2;", "ifeq G1_3;",
+        "G1_3:", "getfield_b_this 3;", "pop;",
+        "return;",
+    ]
+
+
+def test_patch_jca_errors():
+    case = opgen.OpcodeCase("x", ["getstatic_i {cp:/sint\\b}", "pop2"])
+    with pytest.raises(ValueError):
+        opgen.patch_jca(_JCA, case.patch(0))
+    with pytest.raises(ValueError):
+        opgen.patch_jca(_JCA, case.patch(1))
@@ -1,3 +1,4 @@
+import sys
 from engine.driver import main
 
-main()
\ No newline at end of file
+sys.exit(main())
\ No newline at end of file